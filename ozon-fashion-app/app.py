@@ -1,12 +1,19 @@
 from flask import Flask, render_template, request, redirect, url_for, session
 import os
-from db import find_similar_items, get_item_by_id
-from werkzeug.utils import secure_filename
+from db import get_item_by_id, remove_db_session
+from model import jobs, upload_store
+from model.user_photo import prepare as prepare_user_photo
 
 app = Flask(__name__, static_folder="static", static_url_path="/static")
 app.secret_key = "your_secret_key"
-UPLOAD_FOLDER = "static/uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+UPLOAD_FOLDER = upload_store.UPLOAD_FOLDER
+# Фоновая уборка старых фото (model/upload_store.py)
+upload_store.start_gc()
+# Подборки выполняются фоновыми потоками, а не потоком запроса (model/jobs.py)
+jobs.start()
+
+# Сессия БД живёт в рамках запроса и закрывается после него
+app.teardown_appcontext(remove_db_session)
 
 # Отладка: проверяем настройки статических файлов
 print(f"📁 Static folder: {app.static_folder}")
@@ -17,40 +24,79 @@ print(f"📁 Upload folder exists: {os.path.exists(UPLOAD_FOLDER)}")
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    user_photo = None
-    items = None
-    comment = ""
     if request.method == "POST":
         file = request.files["photo"]
         comment = request.form.get("comment", "")
-        if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
-
-            # Убеждаемся, что файл сохранён правильно
-            os.chmod(filepath, 0o644)  # Устанавливаем права доступа
-
-            user_photo = filepath.replace(
-                "\\", "/"
-            )  # Для корректного отображения в HTML
-
-            # Отладочная информация
-            print(f"📁 Загружен файл: {filename}")
-            print(f"📁 Полный путь: {filepath}")
-            print(f"📁 Путь для HTML: {user_photo}")
-            print(f"📁 Файл существует: {os.path.exists(filepath)}")
-            if os.path.exists(filepath):
-                print(f"📁 Размер файла: {os.path.getsize(filepath)} байт")
-
-            items = find_similar_items(filepath, comment=comment)
-            print("items:", items)  # <-- print для отладки
+        if not file:
+            return render_template("index.html", comment=comment)
+        try:
+            # Декодируем прямо из потока запроса и сразу уменьшаем (model/user_photo.py)
+            photo = prepare_user_photo(file.stream)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Не удалось прочитать фото {file.filename}: {e}")
             return render_template(
-                "index.html", user_photo=user_photo, items=items, comment=comment
+                "index.html", comment=comment, error="Не удалось прочитать фото"
+            )
+
+        # На диск — уже уменьшенный JPEG под именем sha256, только для показа
+        user_photo = url_for("uploaded_file", name=upload_store.save(photo))
+        try:
+            job = jobs.submit(photo, comment, user_photo)
+        except jobs.QueueFull:
+            response = app.make_response(
+                render_template(
+                    "index.html",
+                    user_photo=user_photo,
+                    comment=comment,
+                    error="Сейчас много запросов, попробуйте через минуту",
+                )
             )
-    # GET-запрос
+            response.status_code = 503
+            response.headers["Retry-After"] = "30"
+            return response
+        print(f"📁 Загружено фото: {user_photo}, подборка {job.id} в очереди")
+        # Ответ сразу; обновление страницы не отправляет фото повторно
+        return redirect(url_for("index", job=job.id), code=303)
+
+    # GET-запрос: пустая страница или подборка из очереди
+    job_id = request.args.get("job")
+    if not job_id:
+        return render_template("index.html")
+    job = jobs.get(job_id)
+    if job is None:
+        return render_template(
+            "index.html", error="Подборка устарела — загрузите фото ещё раз"
+        )
     return render_template(
-        "index.html", user_photo=user_photo, items=items, comment=comment
+        "index.html",
+        user_photo=job.photo_url,
+        comment=job.comment,
+        items=job.items if job.status == jobs.DONE else None,
+        job_id=job.id if job.status not in jobs.FINISHED else None,
+        error=job.error,
+    )
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Статус подборки для опроса со страницы."""
+    from flask import abort, jsonify
+
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Статус подборки как server-sent events."""
+    from flask import Response, stream_with_context
+
+    return Response(
+        stream_with_context(jobs.event_stream(job_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -69,25 +115,64 @@ def cart():
     return render_template("cart.html", items=items)
 
 
-@app.route("/static/uploads/<filename>")
-def uploaded_file(filename):
-    """Обслуживание загруженных файлов"""
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    abs_file_path = os.path.abspath(file_path)  # Получаем абсолютный путь
+@app.route("/stats")
+def cache_stats():
+    """Счётчики попаданий и промахов кэшей."""
+    from flask import jsonify
+    from model import agent_1_cache, catalog, result_cache, thumbnails
+
+    return jsonify(
+        {
+            "agent_1_cache": agent_1_cache.stats,
+            "thumbnails": thumbnails.stats,
+            "catalog": catalog.stats,
+            "results": result_cache.stats,
+            "uploads": upload_store.stats,
+            "jobs": dict(jobs.stats, queue_depth=jobs.queue_depth()),
+        }
+    )
+
+
+@app.route("/facets")
+def facets():
+    """Счётчики цветов и ценовых корзин по категориям (?category=... можно повторять)."""
+    from flask import jsonify
+    from db import PRICE_BUCKET_EDGES, get_category_ids, get_facet_counts
 
-    print(f"🔍 Запрос файла: {filename}")
-    print(f"🔍 Относительный путь: {file_path}")
-    print(f"🔍 Абсолютный путь: {abs_file_path}")
-    print(f"🔍 Файл существует: {os.path.exists(abs_file_path)}")
+    category_ids = get_category_ids(request.args.getlist("category")).values()
+    return jsonify(
+        {
+            "color": get_facet_counts(category_ids, "color"),
+            "price_bucket": get_facet_counts(category_ids, "price_bucket"),
+            "price_bucket_edges": PRICE_BUCKET_EDGES,
+        }
+    )
 
-    if os.path.exists(abs_file_path):
-        from flask import send_file
 
-        return send_file(abs_file_path)
-    else:
-        from flask import abort
+@app.route("/uploads/<path:name>")
+def uploaded_file(name):
+    """
+    Фото из хранилища загрузок. Имя — хэш содержимого, поэтому ответ
+    неизменяем: сильный ETag, 304 на повтор и Range отдаёт send_file.
+    """
+    from flask import abort, send_file
 
+    resolved = upload_store.resolve(name)
+    if resolved is None:
+        abort(404)
+    path, etag = resolved
+    try:
+        response = send_file(
+            os.path.abspath(path),
+            mimetype="image/jpeg",
+            etag=etag,
+            conditional=True,
+            max_age=365 * 24 * 3600,
+        )
+    except FileNotFoundError:
         abort(404)
+    response.cache_control.immutable = True
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""
+Бенчмарк Агента 2: запрос на категорию (последовательно и параллельно)
+против одного общего запроса (AGENT_2_MODE=batched).
+
+Клиент OpenAI подменяется заглушкой: задержка ответа = базовая + на
+каждое изображение, поэтому сеть и ключ не нужны. Печатает время, число
+запросов и объём отправленных данных, проверяет порядок результата и
+откат на запросы по категориям при неразборчивом общем ответе.
+Запуск: python benchmarks/bench_agent_2.py [задержка, с] [задержка на картинку, с]
+"""
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; для заглушки он не нужен
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from PIL import Image  # noqa: E402
+
+import db  # noqa: E402
+from model import ai_model  # noqa: E402
+
+
+class _FakeCompletions:
+    def __init__(self, latency, per_image):
+        self.latency = latency
+        self.per_image = per_image
+        self.broken_batch = False
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.sent_bytes = 0
+
+    def create(self, messages, **kwargs):
+        content = messages[0]["content"]
+        images = [part for part in content if part["type"] == "image_url"]
+        self.requests += 1
+        self.sent_bytes += len(json.dumps(messages))
+        time.sleep(self.latency + self.per_image * len(images))
+
+        prompt = content[0]["text"]
+        if "КАТЕГОРИЯ" in prompt:
+            categories = len(re.findall(r"^КАТЕГОРИЯ \d+", prompt, re.MULTILINE))
+            answer = "не знаю" if self.broken_batch else json.dumps(
+                {str(n): 1 for n in range(1, categories + 1)}
+            )
+        else:
+            answer = "1"
+        message = types.SimpleNamespace(content=answer)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _run(label, completions, image_path, candidates, search_info):
+    completions.reset()
+    start = time.perf_counter()
+    result = ai_model._agent_2_validate_items(image_path, candidates, "", search_info)
+    elapsed = time.perf_counter() - start
+    return label, elapsed, completions.requests, completions.sent_bytes, result
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    per_image = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    completions = _FakeCompletions(latency, per_image)
+    ai_model.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=completions)
+    )
+
+    session = db.get_db_session()
+    categories = [c for (c,) in session.query(db.ClothingItem.category).distinct()]
+    candidates = []
+    for category in categories:
+        candidates.extend(
+            session.query(db.ClothingItem).filter_by(category=category).limit(30).all()
+        )
+    image_path = os.path.join(_tmp_dir, "upload.jpg")
+    # Фрактал сжимается в JPEG примерно как настоящее фото, в отличие от заливки
+    Image.effect_mandelbrot((1280, 960), (-2.0, -1.2, 1.0, 1.2), 100).convert(
+        "RGB"
+    ).save(image_path)
+    search_info = {"search_type": "complementary", "reasoning": "бенчмарк"}
+
+    # Прогреваем кэш превью, чтобы сравнивать только запросы к модели
+    ai_model._agent_2_validate_items(image_path, candidates, "", search_info)
+
+    runs = []
+    ai_model.AGENT_2_MODE = "per_category"
+    for concurrency in (1, len(categories)):
+        ai_model.AGENT_2_CONCURRENCY = concurrency
+        runs.append(
+            _run(
+                f"per_category, потоков {concurrency}",
+                completions, image_path, candidates, search_info,
+            )
+        )
+    ai_model.AGENT_2_MODE = "batched"
+    runs.append(_run("batched", completions, image_path, candidates, search_info))
+    completions.broken_batch = True
+    runs.append(
+        _run("batched, неразборчивый ответ", completions, image_path, candidates, search_info)
+    )
+
+    print(
+        f"\nКатегорий: {len(categories)}, задержка: {latency:.2f} с "
+        f"+ {per_image:.2f} с на картинку"
+    )
+    reference = [item.id for item in runs[0][4]]
+    for label, elapsed, requests_count, sent_bytes, result in runs:
+        same = [item.id for item in result] == reference
+        print(
+            f"{label:<30} {elapsed:6.2f} с, запросов {requests_count:2d}, "
+            f"отправлено {sent_bytes / 1024:8.1f} КБ, выбор совпадает: {same}"
+        )
+    db.remove_db_session()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
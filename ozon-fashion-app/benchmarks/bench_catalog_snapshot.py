@@ -0,0 +1,192 @@
+"""
+Бенчмарк снимка каталога в памяти (model/catalog.py) против ORM-объектов.
+
+Память: tracemalloc при загрузке всех товаров снимком и session.query(ClothingItem).
+Задержки: get_item_by_id, выборка 30 кандидатов по id, поиск
+_search_items_by_request целиком и дочитывание изменений после записи
+другим соединением (как это делает парсер).
+Каталог растёт синтетическими копиями товаров до 10k/100k строк.
+Запуск: python benchmarks/bench_catalog_snapshot.py [макс. товаров]
+"""
+import contextlib
+import gc
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; OpenAI здесь не вызывается
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from sqlalchemy import text  # noqa: E402
+
+import db  # noqa: E402
+from model import ai_model, catalog  # noqa: E402
+
+REQUEST = {
+    "requested_categories": ["Юбки женские"],
+    "search_keywords": ["черная", "юбка", "миди"],
+    "search_type": "specific",
+    "original_comment": "черную юбку миди до 3000",
+}
+LOOKUPS = 2000
+CHANGED_ROWS = 100
+
+
+def _grow_catalog(target):
+    with db.engine.begin() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT name, price, price_value, description, image_url, image_hash, "
+                "category, category_id, color FROM clothing_items"
+            )
+        ).mappings().all()
+        current = conn.execute(text("SELECT COUNT(*) FROM clothing_items")).scalar()
+        batch = []
+        for i in range(current, target):
+            row = dict(random.choice(rows))
+            row["url"] = f"https://www.ozon.ru/product/synthetic-{i}/"
+            batch.append(row)
+        if batch:
+            conn.execute(
+                text(
+                    "INSERT INTO clothing_items (name, price, price_value, description, "
+                    "url, image_url, image_hash, category, category_id, color) VALUES "
+                    "(:name, :price, :price_value, :description, :url, :image_url, "
+                    ":image_hash, :category, :category_id, :color)"
+                ),
+                batch,
+            )
+        # Журнал изменений от вставок не нужен: снимок загрузится целиком
+        conn.execute(text("DELETE FROM catalog_changes"))
+
+
+def _memory(load):
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        kept = load()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used, kept
+
+
+def _load_orm():
+    session = db.SessionLocal()
+    items = session.query(db.ClothingItem).all()
+    return session, items
+
+
+def _load_snapshot():
+    catalog._snapshot = None
+    return catalog.get_snapshot()
+
+
+def _per_call(func, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e6
+
+
+def _orm_item(item_id):
+    item = db.SessionLocal().get(db.ClothingItem, item_id)
+    db.remove_db_session()
+    return item
+
+
+def _orm_items(item_ids):
+    session = db.SessionLocal()
+    items = session.query(db.ClothingItem).filter(db.ClothingItem.id.in_(item_ids)).all()
+    db.remove_db_session()
+    return items
+
+
+def _search(request_info):
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = ai_model._search_items_by_request(request_info)
+    db.remove_db_session()
+    return result
+
+
+def _write_changes(size):
+    """Правка цен отдельным соединением, как у парсера."""
+    conn = sqlite3.connect(_db_copy)
+    ids = random.sample(range(1, size), CHANGED_ROWS)
+    conn.executemany(
+        "UPDATE clothing_items SET price_value = price_value + 1 WHERE id = ?",
+        [(i,) for i in ids],
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(0)
+    for size in (n for n in (10_000, 100_000) if n <= max_rows):
+        _grow_catalog(size)
+
+        orm_bytes, (session, orm_items) = _memory(_load_orm)
+        count = len(orm_items)
+        session.close()
+        del orm_items
+        snapshot_bytes, _ = _memory(_load_snapshot)
+        print(
+            f"\nТоваров: {count}\n  память на товар: ORM {orm_bytes / count:6.0f} Б | "
+            f"снимок {snapshot_bytes / count:6.0f} Б"
+        )
+
+        ids = [(random.randint(1, size),) for _ in range(LOOKUPS)]
+        orm_us = _per_call(_orm_item, ids)
+        snapshot_us = _per_call(db.get_item_by_id, ids)
+        print(
+            f"  get_item_by_id:       ORM {orm_us:8.1f} мкс | снимок {snapshot_us:8.1f} мкс"
+        )
+
+        batches = [([random.randint(1, size) for _ in range(30)],) for _ in range(200)]
+        orm_us = _per_call(_orm_items, batches)
+        snapshot_us = _per_call(catalog.get_items, batches)
+        print(
+            f"  30 кандидатов по id:  ORM {orm_us:8.1f} мкс | снимок {snapshot_us:8.1f} мкс"
+        )
+
+        search_us = _per_call(_search, [(REQUEST,)] * 20)
+        print(f"  _search_items_by_request: {search_us / 1000:.2f} мс")
+
+        # Проверка PRAGMA data_version на каждом обращении — худший случай
+        catalog.CATALOG_REFRESH_INTERVAL = 0
+        checked_us = _per_call(db.get_item_by_id, ids)
+        _write_changes(size)
+        started = time.perf_counter()
+        catalog.get_snapshot()
+        refresh_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"  дочитывание {CHANGED_ROWS} изменённых товаров: {refresh_ms:.2f} мс, "
+            f"get_item_by_id с проверкой базы {checked_us:.1f} мкс, "
+            f"счётчики {catalog.stats}"
+        )
+        catalog.CATALOG_REFRESH_INTERVAL = 1.0
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Бенчмарк накладных расходов на один запрос к БД.
+
+Сравнивает старую схему (create_engine + create_all на каждый вызов)
+с общим engine и scoped-сессией из db.py.
+
+Запуск: python benchmarks/bench_db_session.py [кол-во запросов]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией БД, чтобы не трогать файл из репозитория
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import db  # noqa: E402
+
+
+def _old_get_item_by_id(item_id):
+    engine = create_engine(db.DATABASE_URL)
+    db.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    item = session.query(db.ClothingItem).filter_by(id=item_id).first()
+    session.close()
+    engine.dispose()
+    return item
+
+
+def _new_get_item_by_id(item_id):
+    item = db.get_item_by_id(item_id)
+    db.remove_db_session()
+    return item
+
+
+def _bench(label, func, n):
+    start = time.perf_counter()
+    for i in range(n):
+        func(i % 100 + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<35} {elapsed / n * 1000:8.3f} мс/запрос  ({n} запросов)")
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    old = _bench("create_engine на каждый запрос", _old_get_item_by_id, n)
+    new = _bench("общий engine + scoped_session", _new_get_item_by_id, n)
+    print(f"Ускорение: x{old / new:.1f}")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Бенчмарк поиска кандидатов: прежние цепочки OR из ilike('%слово%')
+против FTS5-индекса с ранжированием bm25.
+
+Каталог копируется во временную базу и раздувается синтетическими товарами
+(названия из настоящих с перемешанными словами) до 1k, 10k и 100k строк.
+FTS-индекс обновляется триггерами при вставке, как при работе парсера.
+
+ilike с limit(30) останавливается на первых 30 подходящих строках и ничего
+не ранжирует, а bm25 считается по всем совпадениям FTS: на частых словах
+(в синтетическом каталоге «блузка» есть в каждом шестом товаре) FTS медленнее
+и растёт вместе с числом совпадений. Выигрыш по времени — на редких словах
+(запрос rare): ilike просматривает всю таблицу, FTS читает только списки
+документов термов.
+Запуск: python benchmarks/bench_fts_search.py [макс. строк]
+"""
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; OpenAI здесь не вызывается
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from sqlalchemy import or_, text  # noqa: E402
+
+import db  # noqa: E402
+from model import ai_model  # noqa: E402
+
+REQUESTS = [
+    {
+        "requested_categories": ["Блузы и рубашки женские"],
+        "search_keywords": ["льняная", "блузка", "оверсайз"],
+        "search_type": "specific",
+    },
+    {
+        "requested_categories": list(ai_model.intent_classifier.CATEGORY_KEYWORDS),
+        "search_keywords": ["утеплённые", "легинсы", "для", "зимы"],
+        "search_type": "complementary",
+    },
+    {
+        "requested_categories": [],
+        "search_keywords": ["кашемировый", "кардиган"],
+        "search_type": "complementary",
+        "label": "rare",
+    },
+]
+
+
+def _old_search(request_info):
+    """Прежний запрос: категории и ключевые слова через OR из ilike, limit(30)."""
+    session = db.get_db_session()
+    conditions = [
+        db.ClothingItem.category.ilike(f"%{c}%")
+        for c in request_info["requested_categories"]
+    ]
+    if request_info["search_type"] != "specific":
+        for keyword in request_info["search_keywords"]:
+            if len(keyword) > 2:
+                pattern = f"%{keyword}%"
+                conditions.extend(
+                    [
+                        db.ClothingItem.name.ilike(pattern),
+                        db.ClothingItem.description.ilike(pattern),
+                        db.ClothingItem.category.ilike(pattern),
+                    ]
+                )
+    return session.query(db.ClothingItem).filter(or_(*conditions)).limit(30).all()
+
+
+def _grow_catalog(target):
+    with db.engine.begin() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT name, price, price_value, description, category, category_id "
+                "FROM clothing_items"
+            )
+        ).all()
+        current = conn.execute(text("SELECT COUNT(*) FROM clothing_items")).scalar()
+        batch = []
+        for i in range(current, target):
+            name, price, price_value, description, category, category_id = random.choice(
+                rows
+            )
+            words = (name or "").split()
+            random.shuffle(words)
+            batch.append(
+                {
+                    "name": " ".join(words),
+                    "price": price,
+                    "price_value": price_value,
+                    "description": description,
+                    "url": f"https://www.ozon.ru/product/synthetic-{i}/",
+                    "category": category,
+                    "category_id": category_id,
+                }
+            )
+        if batch:
+            conn.execute(
+                text(
+                    "INSERT INTO clothing_items (name, price, price_value, description, "
+                    "url, category, category_id) VALUES (:name, :price, :price_value, "
+                    ":description, :url, :category, :category_id)"
+                ),
+                batch,
+            )
+        indexed = conn.execute(text("SELECT COUNT(*) FROM clothing_items_fts")).scalar()
+        # FTS5 с внешним содержимым: проверяем сам индекс, а не таблицу товаров
+        check = conn.execute(
+            text(
+                "SELECT COUNT(*) FROM clothing_items_fts "
+                "WHERE clothing_items_fts MATCH 'name:блузк*'"
+            )
+        ).scalar()
+    return indexed, check
+
+
+def _time(func, request_info, repeat=5):
+    # Первый вызов не замеряем: после роста каталога он дочитывает снимок
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(request_info)
+    db.remove_db_session()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(request_info)
+        db.remove_db_session()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(0)
+    sizes = [n for n in (1_000, 10_000, 100_000, 300_000) if n <= max_rows]
+    for size in sizes:
+        _, matches = _grow_catalog(size)
+        print(f"\nТоваров: {size}, в индексе по 'блузк*': {matches}")
+        for request_info in REQUESTS:
+            old_ms, _ = _time(_old_search, request_info)
+            new_ms, items = _time(ai_model._search_items_by_request, request_info)
+            top = ", ".join(item.name[:25] for item in items[:3])
+            label = request_info.get("label", request_info["search_type"])
+            print(
+                f"  {label:<13} ilike {old_ms:8.2f} мс | "
+                f"FTS5+bm25 {new_ms:8.2f} мс | топ: {top}"
+            )
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
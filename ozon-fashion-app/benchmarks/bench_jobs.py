@@ -0,0 +1,145 @@
+"""
+Бенчмарк очереди подборок (model/jobs.py) через Flask test client.
+
+Клиент OpenAI подменяется заглушкой с задержкой, как в bench_agent_2.py.
+Печатает время ответа на POST (раньше — вся подборка), время до результата
+по SSE, время ответа на опрос и лёгкие страницы, пока все потоки очереди
+заняты, отказ 503 при переполнении очереди, таймаут задачи и удаление
+старых результатов.
+Запуск: python benchmarks/bench_jobs.py [задержка, с]
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией базы и отдельным каталогом загрузок
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+os.environ["UPLOAD_FOLDER"] = os.path.join(_tmp_dir, "uploads")
+os.environ["JOB_WORKERS"] = "2"
+os.environ["JOB_QUEUE_LIMIT"] = "4"
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; для заглушки он не нужен
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from PIL import Image  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as webapp  # noqa: E402
+from model import ai_model, jobs  # noqa: E402
+
+
+class _FakeCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, messages, **kwargs):
+        time.sleep(self.latency)
+        message = types.SimpleNamespace(content="1")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _photo(seed):
+    buffer = io.BytesIO()
+    # Разные фото, чтобы задачи не брались из кэша подборок
+    Image.effect_mandelbrot((640, 480), (-2.0 + seed / 100, -1.2, 1.0, 1.2), 50).convert(
+        "RGB"
+    ).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _post(client, seed):
+    started = time.perf_counter()
+    response = client.post(
+        "/",
+        data={"photo": (io.BytesIO(_photo(seed)), "IMG_0001.jpg"), "comment": "юбка"},
+        content_type="multipart/form-data",
+    )
+    elapsed = time.perf_counter() - started
+    job_id = response.headers.get("Location", "").rpartition("job=")[2] or None
+    return response.status_code, elapsed, job_id
+
+
+def _sse(client, job_id):
+    """Читает события до завершения задачи: (время, последний статус, товаров)."""
+    started = time.perf_counter()
+    response = client.get(f"/jobs/{job_id}/events")
+    last = None
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("event: status"):
+            last = json.loads(text.split("data: ", 1)[1])
+    response.close()
+    return time.perf_counter() - started, last["status"], len(last["items"])
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    ai_model.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=_FakeCompletions(latency))
+    )
+    client = webapp.app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        status, elapsed, job_id = _post(client, 0)
+        sse_elapsed, final, items_count = _sse(client, job_id)
+        page = client.get(f"/?job={job_id}").get_data(as_text=True)
+    print(f"Задержка OpenAI {latency:.2f} с, потоков {jobs.JOB_WORKERS}, очередь {jobs.JOB_QUEUE_LIMIT}")
+    print(f"  POST /: {status}, {elapsed * 1000:.1f} мс")
+    print(
+        f"  результат по SSE через {sse_elapsed:.2f} с: {final}, товаров {items_count}, "
+        f"на странице: {'Смотреть на Ozon' in page}"
+    )
+
+    # Заполняем потоки и очередь: 2 выполняются, 4 ждут, дальше отказ
+    with contextlib.redirect_stdout(io.StringIO()):
+        posts = [_post(client, seed) for seed in range(1, 9)]
+    codes = [code for code, _, _ in posts]
+    print(
+        f"  8 POST подряд: коды {codes}, самый долгий ответ "
+        f"{max(elapsed for _, elapsed, _ in posts) * 1000:.1f} мс"
+    )
+    job_ids = [job_id for _, _, job_id in posts if job_id]
+    started = time.perf_counter()
+    for _ in range(50):
+        client.get(f"/jobs/{job_ids[-1]}")
+        client.get("/stats")
+    print(
+        f"  опрос и /stats, пока очередь занята: "
+        f"{(time.perf_counter() - started) / 100 * 1000:.2f} мс на запрос"
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        while any(jobs.get(job_id).status not in jobs.FINISHED for job_id in job_ids):
+            time.sleep(0.1)
+    print(f"  все задачи готовы через {time.perf_counter() - started:.2f} с, {jobs.stats}")
+
+    jobs.JOB_TIMEOUT = latency / 2
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, job_id = _post(client, 20)
+        _, final, _ = _sse(client, job_id)
+    print(f"  таймаут {jobs.JOB_TIMEOUT:.2f} с: {final}, ошибка: {jobs.get(job_id).error}")
+
+    jobs.JOB_RESULT_TTL = 0
+    time.sleep(0.01)
+    print(f"  после JOB_RESULT_TTL: /jobs/{job_id[:6]}... -> {client.get(f'/jobs/{job_id}').status_code}")
+    # Дожидаемся потоков, чтобы не удалить базу у них из-под ног
+    with contextlib.redirect_stdout(io.StringIO()):
+        time.sleep(latency * 3)
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
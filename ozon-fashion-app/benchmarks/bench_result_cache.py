@@ -0,0 +1,153 @@
+"""
+Бенчмарк кэша подборок (model/result_cache.py) для find_similar_items.
+
+Клиент OpenAI подменяется заглушкой с задержкой, как в bench_agent_2.py.
+Печатает время первого запроса и повторов (тот же файл, то же фото под
+другим именем), число запросов к модели при одновременных одинаковых
+запросах, промах после изменения каталога и то, что подборка после
+ошибки OpenAI в кэш не попадает.
+Запуск: python benchmarks/bench_result_cache.py [задержка, с] [потоков]
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+# Изменение каталога должно быть видно сразу, без паузы между проверками
+os.environ["CATALOG_REFRESH_INTERVAL"] = "0"
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; для заглушки он не нужен
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from PIL import Image  # noqa: E402
+
+import db  # noqa: E402
+from model import ai_model, result_cache  # noqa: E402
+
+COMMENT = "подбери образ к этой юбке"
+
+
+class _FakeCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+        self.failing = False
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def create(self, messages, **kwargs):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        if self.failing:
+            raise RuntimeError("OpenAI недоступен")
+        content = messages[0]["content"]
+        prompt = content if isinstance(content, str) else content[0]["text"]
+        if "Анализируй запрос" in prompt:
+            answer = json.dumps(
+                {
+                    "categories": ["Блузы и рубашки женские", "Брюки, бриджи и капри женские"],
+                    "keywords": ["базовый", "образ"],
+                    "search_type": "complementary",
+                    "reasoning": "бенчмарк",
+                },
+                ensure_ascii=False,
+            )
+        else:
+            answer = "1"
+        message = types.SimpleNamespace(content=answer)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _find_unmuted(image_path, comment):
+    started = time.perf_counter()
+    items = db.find_similar_items(image_path, comment=comment)
+    db.remove_db_session()
+    return time.perf_counter() - started, [item.id for item in items]
+
+
+def _find(image_path, comment=COMMENT):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _find_unmuted(image_path, comment)
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    threads_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    completions = _FakeCompletions(latency)
+    ai_model.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=completions)
+    )
+
+    image_path = os.path.join(_tmp_dir, "upload.jpg")
+    # Фрактал сжимается в JPEG примерно как настоящее фото, в отличие от заливки
+    Image.effect_mandelbrot((1280, 960), (-2.0, -1.2, 1.0, 1.2), 100).convert(
+        "RGB"
+    ).save(image_path)
+    same_photo = os.path.join(_tmp_dir, "IMG_0001.jpg")
+    shutil.copy(image_path, same_photo)
+
+    cold, reference = _find(image_path)
+    print(f"Задержка OpenAI {latency:.2f} с, размер фото {os.path.getsize(image_path)} Б")
+    print(f"  первый запрос:               {cold * 1000:9.1f} мс, запросов к модели {completions.requests}")
+    warm, ids = _find(image_path)
+    print(f"  повтор:                      {warm * 1000:9.1f} мс, совпадает: {ids == reference}")
+    warm, ids = _find(same_photo)
+    print(f"  то же фото под другим именем: {warm * 1000:8.1f} мс, совпадает: {ids == reference}")
+
+    completions.requests = 0
+    results = []
+    workers = [
+        threading.Thread(
+            target=lambda: results.append(_find_unmuted(image_path, "юбка и блузка"))
+        )
+        for _ in range(threads_count)
+    ]
+    started = time.perf_counter()
+    # sys.stdout общий для потоков: глушим вывод один раз на всю группу
+    with contextlib.redirect_stdout(io.StringIO()):
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    print(
+        f"  {threads_count} одновременных одинаковых: {time.perf_counter() - started:6.2f} с, "
+        f"запросов к модели {completions.requests}, "
+        f"одинаковый ответ: {len({tuple(ids) for _, ids in results}) == 1}"
+    )
+
+    conn = sqlite3.connect(_db_copy)
+    conn.execute("UPDATE clothing_items SET price = price || ' ' WHERE id = ?", (reference[0],))
+    conn.commit()
+    conn.close()
+    elapsed, _ = _find(image_path)
+    print(f"  после изменения каталога:    {elapsed * 1000:9.1f} мс")
+
+    completions.failing = True
+    _find(image_path, "что-нибудь к джинсам")
+    completions.failing = False
+    elapsed, _ = _find(image_path, "что-нибудь к джинсам")
+    print(f"  повтор после ошибки OpenAI:  {elapsed * 1000:9.1f} мс (считается заново)")
+    print(f"  счётчики: {result_cache.stats}")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
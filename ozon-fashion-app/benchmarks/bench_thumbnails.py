@@ -0,0 +1,74 @@
+"""
+Бенчмарк подготовки картинок кандидатов для Агента 2.
+
+Сравнивает прежний путь (декодирование + полноразмерный JPEG q85 на каждый
+запрос, без учёта скачивания с CDN) с кэшем превью: холодный (построение из картинки в БД),
+тёплый из таблицы image_thumbnails и из LRU в памяти. Печатает время на
+картинку и размер base64-нагрузки.
+Запуск: python benchmarks/bench_thumbnails.py [кол-во товаров]
+"""
+import base64
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+from PIL import Image  # noqa: E402
+
+import db  # noqa: E402
+from model import thumbnails  # noqa: E402
+
+
+def _old_encode(data):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _bench(label, items, func):
+    start = time.perf_counter()
+    payload = sum(len(func(item) or "") for item in items)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<32} {elapsed / len(items) * 1000:7.2f} мс/картинка, "
+        f"нагрузка {payload / len(items) / 1024:6.1f} КБ/картинка"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    items = db.get_db_session().query(db.ClothingItem).limit(n).all()
+    # Эмулируем базу после migrate_images.py: картинки в clothing_images
+    session = db.get_db_session()
+    for item in items:
+        data = db.get_item_image_bytes(item)
+        item.image_hash = hashlib.sha256(data).hexdigest()
+        session.merge(db.ClothingImage(hash=item.image_hash, data=data, size=len(data)))
+    session.commit()
+    raw = {item.id: db.get_item_image_bytes(item) for item in items}
+
+    print(f"Товаров: {len(items)}")
+    _bench("прежний путь (JPEG q85)", items, lambda item: _old_encode(raw[item.id]))
+    _bench("кэш: построение из БД", items, thumbnails.get_thumbnail_base64)
+    thumbnails._lru.clear()
+    _bench("кэш: таблица image_thumbnails", items, thumbnails.get_thumbnail_base64)
+    _bench("кэш: LRU в памяти", items, thumbnails.get_thumbnail_base64)
+    print(f"Статистика кэша: {thumbnails.stats}")
+    db.remove_db_session()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Бенчмарк хранилища загрузок (model/upload_store.py).
+
+Отдача фото через Flask test client: полный ответ 200 против условного
+запроса с If-None-Match (304, тело не читается) и Range. Уборка:
+время прохода collect_garbage по 1k/10k файлам и сколько удалено
+по возрасту и по лимиту размера.
+Запуск: python benchmarks/bench_upload_store.py [макс. файлов]
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией базы и отдельным каталогом загрузок
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+os.environ["UPLOAD_FOLDER"] = os.path.join(_tmp_dir, "uploads")
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; OpenAI здесь не вызывается
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from PIL import Image  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as webapp  # noqa: E402
+from model import upload_store, user_photo  # noqa: E402
+
+REQUESTS = 500
+FILE_SIZE = 60 * 1024
+
+
+def _per_request(client, url, headers=None):
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = client.get(url, headers=headers)
+        response.close()
+    return (time.perf_counter() - started) / REQUESTS * 1e6, response
+
+
+def main():
+    max_files = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    buffer = io.BytesIO()
+    Image.effect_mandelbrot((1280, 960), (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB").save(
+        buffer, format="JPEG"
+    )
+    photo = user_photo.prepare(io.BytesIO(buffer.getvalue()))
+    url = f"/uploads/{upload_store.save(photo)}"
+
+    client = webapp.app.test_client()
+    full_us, response = _per_request(client, url)
+    etag = response.headers["ETag"]
+    cached_us, response_304 = _per_request(client, url, {"If-None-Match": etag})
+    range_us, response_206 = _per_request(client, url, {"Range": "bytes=0-1023"})
+    print(f"Фото {len(photo.jpeg)} байт, {response.headers['Cache-Control']}")
+    print(f"  200 полный ответ:        {full_us:7.1f} мкс")
+    print(f"  {response_304.status_code} If-None-Match:        {cached_us:7.1f} мкс")
+    print(f"  {response_206.status_code} Range 1 КБ:           {range_us:7.1f} мкс")
+
+    for count in (n for n in (1_000, 10_000) if n <= max_files):
+        shutil.rmtree(upload_store.UPLOAD_FOLDER)
+        now = time.time()
+        for i in range(count):
+            name = upload_store.name_for(f"{i:064x}"[::-1])
+            path = os.path.join(upload_store.UPLOAD_FOLDER, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\0" * FILE_SIZE)
+            # Четверть файлов просрочена, остальные разного возраста
+            age = upload_store.UPLOAD_MAX_AGE * (2 if i % 4 == 0 else (i % 100) / 100)
+            os.utime(path, (now - age, now - age))
+        upload_store.UPLOAD_MAX_BYTES = count * FILE_SIZE // 2
+        started = time.perf_counter()
+        removed = upload_store.collect_garbage(now)
+        elapsed = time.perf_counter() - started
+        print(
+            f"\nФайлов {count}: уборка {elapsed * 1000:7.1f} мс, удалено {removed}, "
+            f"осталось {upload_store.stats['stored_bytes'] / 2**20:.1f} МБ "
+            f"(лимит {upload_store.UPLOAD_MAX_BYTES / 2**20:.1f} МБ)"
+        )
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
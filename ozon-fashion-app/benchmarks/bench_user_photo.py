@@ -0,0 +1,131 @@
+"""
+Бенчмарк подготовки фото пользователя на один запрос.
+
+Прежний путь: сохранить загрузку в static/uploads, chmod/getsize, открыть
+файл и перекодировать в полном размере в JPEG 85 для модели, ещё раз открыть
+для визуального вектора и ещё раз прочитать для ключа кэша подборок.
+Новый путь: model/user_photo.prepare из потока (draft + одно уменьшение +
+одно кодирование), вектор и ключ — из готового результата.
+
+Фото — синтетический JPEG 4032x3024 (12 Мп, как у телефона). Пиковая память
+считается по ru_maxrss отдельного процесса на каждый вариант: декодер PIL
+выделяет память мимо tracemalloc.
+Запуск: python benchmarks/bench_user_photo.py [повторов]
+"""
+import base64
+import hashlib
+import io
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# visual_index импортирует db.py — работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+from PIL import Image  # noqa: E402
+
+from model import user_photo, visual_index  # noqa: E402
+
+PHOTO_SIZE = (4032, 3024)
+
+
+def _old_encode_image_to_base64(image_path):
+    """Прежний _encode_image_to_base64 из ai_model.py."""
+    with Image.open(image_path) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _old(upload, upload_dir):
+    path = os.path.join(upload_dir, "IMG_0001.jpg")
+    with open(path, "wb") as f:
+        f.write(upload)
+    os.chmod(path, 0o644)
+    os.path.getsize(path)
+    encoded = _old_encode_image_to_base64(path)
+    vector = visual_index.image_path_features(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return len(encoded), vector, digest
+
+
+def _new(upload, upload_dir):
+    photo = user_photo.prepare(io.BytesIO(upload))
+    path = os.path.join(upload_dir, "IMG_0001.jpg")
+    with open(path, "wb") as f:
+        f.write(photo.jpeg)
+    vector = visual_index.image_features(photo.image)
+    return len(photo.base64), vector, photo.digest
+
+
+def _child(variant, photo_path, repeat):
+    """Один вариант в отдельном процессе: печатает CPU на фото и прирост пика RSS."""
+    with open(photo_path, "rb") as f:
+        upload = f.read()
+    upload_dir = tempfile.mkdtemp()
+    run = _old if variant == "old" else _new
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.process_time()
+    wall = time.perf_counter()
+    for _ in range(repeat):
+        sent, _, _ = run(upload, upload_dir)
+    cpu = (time.process_time() - started) / repeat
+    wall = (time.perf_counter() - wall) / repeat
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+    print(f"{cpu} {wall} {peak} {sent}")
+
+
+def _make_photo(photo_path):
+    # Фрактал сжимается в JPEG примерно как настоящее фото, в отличие от заливки
+    Image.effect_mandelbrot(PHOTO_SIZE, (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB").save(
+        photo_path, quality=92
+    )
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    photo_path = os.path.join(_tmp_dir, "phone.jpg")
+    # Тоже в отдельном процессе: дочерний процесс наследует ru_maxrss родителя
+    subprocess.run(
+        [sys.executable, __file__, "--photo", photo_path], capture_output=True, check=True
+    )
+    print(
+        f"Фото {PHOTO_SIZE[0]}x{PHOTO_SIZE[1]}, {os.path.getsize(photo_path) / 1024:.0f} КБ, "
+        f"повторов {repeat}"
+    )
+    for variant, label in (("old", "прежний путь"), ("new", "user_photo.prepare")):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", variant, photo_path, str(repeat)],
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()[-1].split()
+        cpu, wall, peak, sent = float(output[0]), float(output[1]), int(output[2]), int(output[3])
+        print(
+            f"  {label:<20} CPU {cpu * 1000:7.1f} мс, время {wall * 1000:7.1f} мс, "
+            f"пик памяти +{peak / 1024:6.1f} МБ, в модель {sent / 1024:7.1f} КБ base64"
+        )
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--photo":
+        _make_photo(sys.argv[2])
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+    else:
+        main()
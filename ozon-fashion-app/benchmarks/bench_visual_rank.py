@@ -0,0 +1,138 @@
+"""
+Бенчмарк визуального ранжирования кандидатов Агента 2.
+
+Качество: фото пользователя эмулируется искажённой картинкой товара
+(кадрирование, яркость, уменьшение). Считается, как часто сам товар попадает
+в 5 кандидатов своей категории: прежний выбор по позиции (items[:2] +
+середина + конец) против top-k по визуальным векторам.
+Скорость: top-k по всему каталогу на синтетической матрице 1k/10k/100k
+векторов и среди 30 кандидатов поиска, плюс вектор фото пользователя.
+Запуск: python benchmarks/bench_visual_rank.py [макс. векторов]
+"""
+import contextlib
+import hashlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; OpenAI здесь не вызывается
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageEnhance  # noqa: E402
+
+import db  # noqa: E402
+from model import ai_model, visual_index  # noqa: E402
+
+
+def _prepare_catalog():
+    """Эмулирует базу после migrate_images.py и build_features.py."""
+    session = db.get_db_session()
+    items = session.query(db.ClothingItem).order_by(db.ClothingItem.id).all()
+    images = {}
+    for item in items:
+        data = db.get_item_image_bytes(item)
+        if not data:
+            continue
+        item.image_hash = hashlib.sha256(data).hexdigest()
+        images[item.id] = data
+        with Image.open(io.BytesIO(data)) as img:
+            vector = visual_index.image_features(img).astype(np.float16).tobytes()
+        session.merge(db.ClothingImage(hash=item.image_hash, data=data, size=len(data)))
+        session.merge(db.ImageFeature(image_hash=item.image_hash, vector=vector))
+    session.commit()
+    return [item for item in items if item.id in images], images
+
+
+def _user_photo(data, path):
+    """Искажённая картинка товара как фото пользователя."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        w, h = img.size
+        dx, dy = int(w * random.uniform(0.03, 0.1)), int(h * random.uniform(0.03, 0.1))
+        img = img.crop((dx, dy, w - dx, h - dy))
+        img = ImageEnhance.Brightness(img).enhance(random.uniform(0.85, 1.15))
+        img.thumbnail((400, 400))
+        img.save(path, format="JPEG", quality=70)
+
+
+def _quality(items, images):
+    by_category = {}
+    for item in items:
+        by_category.setdefault(item.category, []).append(item)
+    photo_path = os.path.join(_tmp_dir, "user.jpg")
+    positional = visual = 0
+    for item in items:
+        candidates = by_category[item.category][: ai_model.SEARCH_LIMIT]
+        if item not in candidates:
+            candidates = candidates[:-1] + [item]
+        random.shuffle(candidates)  # позиция в выдаче не связана с фото
+        _user_photo(images[item.id], photo_path)
+        query_vector = visual_index.image_path_features(photo_path)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            old, _ = ai_model._agent_2_collect_candidates(candidates)
+        new = visual_index.rank_items(
+            query_vector, candidates, ai_model.AGENT_2_CANDIDATES
+        )
+        positional += item in old
+        visual += item in new
+    n = len(items)
+    print(f"Товаров: {n}, категорий: {len(by_category)}")
+    print(f"  товар среди кандидатов Агента 2: по позиции {positional / n:.0%}, "
+          f"по векторам {visual / n:.0%}")
+    return photo_path
+
+
+def _speed(photo_path, max_rows):
+    started = time.perf_counter()
+    for _ in range(50):
+        query_vector = visual_index.image_path_features(photo_path)
+    print(f"  вектор фото пользователя: {(time.perf_counter() - started) / 50 * 1000:.2f} мс")
+
+    rng = np.random.default_rng(0)
+    for size in (n for n in (1_000, 10_000, 100_000, 300_000) if n <= max_rows):
+        matrix = np.abs(rng.standard_normal((size, visual_index.FEATURE_DIM))).astype(
+            np.float32
+        )
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        visual_index._index = visual_index._Index(np.arange(1, size + 1), matrix)
+        candidates = rng.choice(size, 30, replace=False) + 1
+
+        for label, ids in (("весь каталог", None), ("30 кандидатов", candidates)):
+            repeat = 20
+            started = time.perf_counter()
+            for _ in range(repeat):
+                visual_index.top_k(query_vector, 5, ids)
+            ms = (time.perf_counter() - started) / repeat * 1000
+            print(f"  векторов {size:>7}, top-5, {label:<14} {ms:7.3f} мс")
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(0)
+    items, images = _prepare_catalog()
+    photo_path = _quality(items, images)
+    _speed(photo_path, max_rows)
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
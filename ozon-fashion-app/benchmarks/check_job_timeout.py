@@ -0,0 +1,127 @@
+"""
+Проверка просрочки подборок (model/jobs.py): задача, не уложившаяся в
+JOB_TIMEOUT, прерывается на следующем этапе и больше не вызывает OpenAI,
+а результат, пришедший после таймаута, не перезаписывает статус TIMEOUT.
+
+Клиент OpenAI подменяется заглушкой с задержкой, как в bench_jobs.py.
+Код выхода 1, если проверка не прошла.
+Запуск: python benchmarks/check_job_timeout.py
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+os.environ["JOB_WORKERS"] = "1"
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py с ключом есть только у разработчиков; для заглушки он не нужен
+    sys.modules["config"] = types.SimpleNamespace(OPENAI_API_KEY="bench")
+
+from PIL import Image  # noqa: E402
+
+from model import ai_model, intent_classifier, jobs, user_photo  # noqa: E402
+
+LATENCY = 0.6
+
+
+class _FakeCompletions:
+    """Считает вызовы OpenAI: агент 1 (текст) и агент 2 (с картинками)."""
+
+    def __init__(self):
+        self.calls = {"agent_1": 0, "agent_2": 0}
+        self.lock = threading.Lock()
+
+    def create(self, messages, **kwargs):
+        content = messages[0]["content"]
+        agent = "agent_2" if isinstance(content, list) else "agent_1"
+        with self.lock:
+            self.calls[agent] += 1
+        time.sleep(LATENCY)
+        # Агенту 1 — не JSON: он перейдёт на разбор по ключевым словам
+        message = types.SimpleNamespace(content="1")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _photo(seed):
+    buffer = io.BytesIO()
+    Image.effect_mandelbrot((640, 480), (-2.0 + seed / 100, -1.2, 1.0, 1.2), 50).convert(
+        "RGB"
+    ).save(buffer, format="JPEG")
+    buffer.seek(0)
+    return user_photo.prepare(buffer)
+
+
+def _run_job(seed, comment):
+    """Ставит задачу и ждёт, пока поток очереди её бросит или доделает."""
+    completions = _FakeCompletions()
+    ai_model.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    finished = dict(jobs.stats)
+    job = jobs.submit(_photo(seed), comment, "/uploads/check.jpg")
+    deadline = time.monotonic() + LATENCY * 10
+    while time.monotonic() < deadline:
+        jobs.get(job.id)  # опрос страницы: _sweep ставит TIMEOUT
+        if any(jobs.stats[key] > finished[key] for key in ("done", "failed", "cancelled")):
+            break
+        if job.status == jobs.TIMEOUT and not any(completions.calls.values()):
+            break
+        time.sleep(0.05)
+    # Поздний результат должен успеть вернуться, если поток его дождался
+    time.sleep(LATENCY * 2)
+    return job, completions.calls
+
+
+def main():
+    jobs.JOB_TIMEOUT = LATENCY / 2
+    jobs.start()
+    failed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Агент 1 через OpenAI дольше JOB_TIMEOUT: до агента 2 дело не доходит
+        intent_classifier.INTENT_CONFIDENCE_THRESHOLD = 2.0
+        job, calls = _run_job(1, "подбери что-нибудь к этому")
+    print(f"таймаут на агенте 1: статус {job.status}, вызовы OpenAI {calls}")
+    if job.status != jobs.TIMEOUT:
+        failed += 1
+        print(f"❌ статус {job.status}, ожидался {jobs.TIMEOUT}")
+    if calls["agent_2"]:
+        failed += 1
+        print("❌ после таймаута вызван агент 2")
+    if not jobs.stats["cancelled"]:
+        failed += 1
+        print("❌ подборка не прервана")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Таймаут во время агента 2 — последнего этапа: результат приходит поздно
+        intent_classifier.INTENT_CONFIDENCE_THRESHOLD = 0.0
+        done_before = jobs.stats["done"]
+        job, calls = _run_job(2, "юбка")
+    print(f"таймаут на агенте 2: статус {job.status}, товаров {len(job.item_ids)}, вызовы {calls}")
+    if not calls["agent_2"]:
+        failed += 1
+        print("❌ агент 2 не вызван — поздний результат не проверен")
+    if job.status != jobs.TIMEOUT or job.item_ids or jobs.stats["done"] != done_before:
+        failed += 1
+        print("❌ поздний результат перезаписал TIMEOUT")
+
+    print(f"Статистика очереди: {jobs.stats}, ошибок проверки: {failed}")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Оценка локального классификатора запросов на размеченном наборе intent_eval.jsonl.
+
+Печатает точность по всем примерам и по уверенным (которые не идут в
+OpenAI), долю запросов без обращения к модели и время классификации.
+Запуск: python benchmarks/eval_intent_classifier.py [порог уверенности]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+from model import intent_classifier  # noqa: E402
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_eval.jsonl")
+
+
+def _is_correct(prediction, example):
+    if prediction["search_type"] != example["search_type"]:
+        return False
+    if example["search_type"] == "complementary":
+        return True
+    return sorted(prediction["categories"]) == sorted(example["categories"])
+
+
+def main():
+    threshold = intent_classifier.INTENT_CONFIDENCE_THRESHOLD
+    if len(sys.argv) > 1:
+        threshold = float(sys.argv[1])
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    # Фразы из обучающих примеров завышали бы точность
+    from model.agent_1_cache import normalize_comment
+
+    training = {normalize_comment(text) for text, _ in intent_classifier._training_samples()}
+    overlap = [e["comment"] for e in examples if normalize_comment(e["comment"]) in training]
+    if overlap:
+        print(f"⚠️  Совпадают с обучающими примерами: {overlap}")
+
+    intent_classifier.get_model()  # обучение не входит в замер
+    correct = confident = confident_correct = 0
+    started = time.perf_counter()
+    rows = []
+    for example in examples:
+        prediction = intent_classifier.classify(example["comment"])
+        ok = _is_correct(prediction, example)
+        is_confident = prediction["confidence"] >= threshold
+        correct += ok
+        confident += is_confident
+        confident_correct += ok and is_confident
+        rows.append((example["comment"], prediction, ok, is_confident))
+    per_call_ms = (time.perf_counter() - started) / len(examples) * 1000
+
+    for comment, prediction, ok, is_confident in rows:
+        route = "локально" if is_confident else "OpenAI  "
+        label = (
+            prediction["categories"][0]
+            if prediction["search_type"] == "specific"
+            else "complementary"
+        )
+        print(
+            f"{'✅' if ok else '❌'} {route} {prediction['confidence']:.2f} "
+            f"{comment[:40]!r:<44} -> {label}"
+        )
+
+    print(f"\nПримеров: {len(examples)}, порог уверенности: {threshold}")
+    print(f"Точность классификатора на всех: {correct / len(examples):.0%}")
+    print(
+        f"Точность на уверенных: "
+        f"{confident_correct / confident if confident else 0:.0%} ({confident_correct}/{confident})"
+    )
+    print(f"Доля запросов без OpenAI: {confident / len(examples):.0%}")
+    print(f"Время классификации: {per_call_ms:.3f} мс/запрос")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Проверка разбора фильтров цены и цвета (model/query_filters.py) на наборе
+фраз с ожидаемым результатом. Печатает несовпадения; код выхода 1, если
+они есть.
+Запуск: python benchmarks/eval_query_filters.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Работаем с копией, чтобы не менять базу под git
+_tmp_dir = tempfile.mkdtemp()
+_db_copy = os.path.join(_tmp_dir, "ozon_clothing_items.db")
+shutil.copy(os.path.join(APP_DIR, "ozon_clothing_items.db"), _db_copy)
+os.environ["OZON_DB_PATH"] = _db_copy
+
+from model.query_filters import parse_query_filters  # noqa: E402
+
+CASES = [
+    ("юбка до 3000₽", {"price_max": 3000.0}),
+    ("от 1 000 до 2 500 рублей", {"price_min": 1000.0, "price_max": 2500.0}),
+    ("не дороже 2к", {"price_max": 2000.0}),
+    ("не больше 1500 р", {"price_max": 1500.0}),
+    ("не выше 4000", {"price_max": 4000.0}),
+    ("дешевле 900", {"price_max": 900.0}),
+    ("меньше 700 рублей", {"price_max": 700.0}),
+    ("ниже 5 тыс", {"price_max": 5000.0}),
+    ("в пределах 2500", {"price_max": 2500.0}),
+    ("от 1500", {"price_min": 1500.0}),
+    ("дороже 2000", {"price_min": 2000.0}),
+    ("больше 3к", {"price_min": 3000.0}),
+    ("выше 1000", {"price_min": 1000.0}),
+    ("не меньше 1000 рублей", {"price_min": 1000.0}),
+    ("не ниже 1500", {"price_min": 1500.0}),
+    ("не дешевле 2к", {"price_min": 2000.0}),
+    ("не дешевле 1000 и не дороже 3000", {"price_min": 1000.0, "price_max": 3000.0}),
+    ("не меньше 500, но меньше 2000", {"price_min": 500.0, "price_max": 2000.0}),
+    ("чёрную юбку до 3000", {"price_max": 3000.0, "colors": ["черный"]}),
+    ("белая или синяя рубашка", {"colors": ["белый", "синий"]}),
+    ("юбка миди", {}),
+]
+
+
+def main():
+    failed = 0
+    for comment, expected in CASES:
+        result = parse_query_filters(comment)
+        if result != expected:
+            failed += 1
+            print(f"❌ {comment!r}: {result}, ожидалось {expected}")
+    print(f"Фраз: {len(CASES)}, несовпадений: {failed}")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
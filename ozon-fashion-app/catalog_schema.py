@@ -0,0 +1,314 @@
+"""
+Схема базы каталога, общая для приложения и парсера (ozon-parser/src/db.py
+импортирует этот модуль): обе стороны открывают один файл, поэтому версия
+схемы, триггеры и миграции описаны только здесь.
+
+Весь DDL идемпотентен (IF NOT EXISTS), а migrate выполняется внутри
+schema_transaction — под блокировкой записи SQLite, так что процессы,
+стартующие одновременно, не мигрируют базу параллельно.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+
+# Версия схемы каталога (PRAGMA user_version), см. migrate
+SCHEMA_VERSION = 4
+
+# Границы ценовых корзин для фасетов: 0 — до 1000, 1 — 1000–2000, ..., 5 — от 10000
+PRICE_BUCKET_EDGES = (1000, 2000, 3000, 5000, 10000)
+
+# Колонки снимка каталога в приложении: их изменение попадает в catalog_changes
+CATALOG_SNAPSHOT_COLUMNS = (
+    "id",
+    "name",
+    "price",
+    "price_value",
+    "url",
+    "image_url",
+    "image_hash",
+    "category",
+    "category_id",
+    "color",
+    "duplicate_of",
+)
+
+# Полнотекстовый индекс по name/description/category. Триггеры держат его в
+# синхроне с clothing_items при любой записи (в том числе upsert парсера).
+# unicode61 не приравнивает ё к е, поэтому в индекс кладём текст с заменой.
+_FTS_COLUMNS = ("name", "description", "category")
+
+
+def _fts_values(row):
+    return ", ".join(
+        f"replace(replace({row}.{column}, 'ё', 'е'), 'Ё', 'Е')"
+        for column in _FTS_COLUMNS
+    )
+
+
+FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS clothing_items_fts USING fts5(
+        name, description, category,
+        content='clothing_items', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_fts_ai
+    AFTER INSERT ON clothing_items BEGIN
+        INSERT INTO clothing_items_fts (rowid, name, description, category)
+        VALUES (new.id, {_fts_values("new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_fts_ad
+    AFTER DELETE ON clothing_items BEGIN
+        INSERT INTO clothing_items_fts
+            (clothing_items_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, {_fts_values("old")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_fts_au
+    AFTER UPDATE OF name, description, category ON clothing_items BEGIN
+        INSERT INTO clothing_items_fts
+            (clothing_items_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, {_fts_values("old")});
+        INSERT INTO clothing_items_fts (rowid, name, description, category)
+        VALUES (new.id, {_fts_values("new")});
+    END
+    """,
+]
+
+# Счётчики фасетов обновляются триггерами при любой записи в clothing_items
+_FACETS = (
+    ("color", "{row}.color"),
+    ("price_bucket", "CAST({row}.price_bucket AS TEXT)"),
+)
+
+
+def _facet_increments(row):
+    return "".join(
+        f"""
+        INSERT INTO category_facets (category_id, facet, value, item_count)
+        SELECT {row}.category_id, '{facet}', {value.format(row=row)}, 1
+        WHERE {row}.category_id IS NOT NULL AND {value.format(row=row)} IS NOT NULL
+        ON CONFLICT (category_id, facet, value)
+        DO UPDATE SET item_count = item_count + 1;"""
+        for facet, value in _FACETS
+    )
+
+
+def _facet_decrements(row):
+    return "".join(
+        f"""
+        UPDATE category_facets SET item_count = item_count - 1
+        WHERE category_id = {row}.category_id AND facet = '{facet}'
+            AND value = {value.format(row=row)};"""
+        for facet, value in _FACETS
+    )
+
+
+FACET_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_facets_ai
+    AFTER INSERT ON clothing_items BEGIN{_facet_increments("new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_facets_ad
+    AFTER DELETE ON clothing_items BEGIN{_facet_decrements("old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_facets_au
+    AFTER UPDATE OF category_id, color, price_bucket ON clothing_items
+    WHEN old.category_id IS NOT new.category_id OR old.color IS NOT new.color
+        OR old.price_bucket IS NOT new.price_bucket
+    BEGIN{_facet_decrements("old")}{_facet_increments("new")}
+    END
+    """,
+]
+
+CHANGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS clothing_items_changes_ai
+    AFTER INSERT ON clothing_items BEGIN
+        INSERT INTO catalog_changes (item_id) VALUES (new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clothing_items_changes_ad
+    AFTER DELETE ON clothing_items BEGIN
+        INSERT INTO catalog_changes (item_id) VALUES (old.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clothing_items_changes_au
+    AFTER UPDATE ON clothing_items
+    WHEN {" OR ".join(f"old.{c} IS NOT new.{c}" for c in CATALOG_SNAPSHOT_COLUMNS)}
+    BEGIN
+        INSERT INTO catalog_changes (item_id) VALUES (new.id);
+    END
+    """,
+]
+
+
+@contextmanager
+def schema_transaction(engine):
+    """
+    Соединение с открытой транзакцией BEGIN IMMEDIATE: блокировка записи
+    берётся до проверки схемы, второй процесс ждёт (busy_timeout) и видит
+    уже обновлённую базу. DDL в SQLite транзакционный — при ошибке всё
+    откатывается.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+
+
+def schema_version(conn):
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def add_missing_columns(conn, model):
+    """create_all не добавляет новые колонки в старые таблицы — делаем ALTER TABLE."""
+    existing = {c["name"] for c in inspect(conn).get_columns(model.__tablename__)}
+    for column in model.__table__.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(
+                text(
+                    f"ALTER TABLE {model.__tablename__} "
+                    f"ADD COLUMN {column.name} {column_type}"
+                )
+            )
+
+
+def _ensure_fulltext_index(conn):
+    """Создаёт FTS5-индекс с триггерами и заполняет его для уже сохранённых товаров."""
+    fts_exists = conn.execute(
+        text(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'clothing_items_fts'"
+        )
+    ).first()
+    if fts_exists:
+        return
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+    conn.execute(
+        text(
+            "INSERT INTO clothing_items_fts (rowid, name, description, category) "
+            f"SELECT id, {_fts_values('clothing_items')} FROM clothing_items"
+        )
+    )
+
+
+def price_bucket_sql(column):
+    return " + ".join(f"({column} >= {edge})" for edge in PRICE_BUCKET_EDGES)
+
+
+def rebuild_category_facets(conn):
+    """Пересчитывает category_facets с нуля."""
+    conn.execute(text("DELETE FROM category_facets"))
+    for facet, value in _FACETS:
+        expr = value.format(row="clothing_items")
+        conn.execute(
+            text(
+                "INSERT INTO category_facets (category_id, facet, value, item_count) "
+                f"SELECT category_id, '{facet}', {expr}, COUNT(*) FROM clothing_items "
+                f"WHERE category_id IS NOT NULL AND {expr} IS NOT NULL "
+                f"GROUP BY category_id, {expr}"
+            )
+        )
+
+
+def migrate(conn):
+    """
+    Обновляет схему каталога до SCHEMA_VERSION (номер — в PRAGMA user_version)
+    и заполняет новые колонки для строк, сохранённых до перехода. Таблицы
+    должны быть уже созданы (create_all); conn — из schema_transaction.
+
+    Версия 2: справочник categories, числовая цена price_value и индекс
+    (category_id, price_value). Версия 3: ценовые корзины, индексы по цвету
+    и корзине, материализованные счётчики фасетов category_facets.
+    Версия 4: журнал изменений товаров catalog_changes для снимка каталога.
+    """
+    _ensure_fulltext_index(conn)
+    version = schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return
+    if version < 2:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO categories (name) "
+                "SELECT DISTINCT category FROM clothing_items "
+                "WHERE category IS NOT NULL AND category != ''"
+            )
+        )
+        conn.execute(
+            text(
+                "UPDATE clothing_items SET category_id = "
+                "(SELECT id FROM categories WHERE categories.name = clothing_items.category) "
+                "WHERE category_id IS NULL"
+            )
+        )
+        conn.execute(
+            text(
+                "UPDATE clothing_items SET price_value = CAST(trim(price) AS REAL) "
+                "WHERE price_value IS NULL AND trim(price) GLOB '[0-9]*'"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_clothing_items_category_price "
+                "ON clothing_items (category_id, price_value)"
+            )
+        )
+        # Парсер создаёт уникальный индекс по url; для баз без него — обычный
+        url_indexed = conn.execute(
+            text(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'index' AND name = 'ux_clothing_items_url'"
+            )
+        ).first()
+        if not url_indexed:
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_clothing_items_url "
+                    "ON clothing_items (url)"
+                )
+            )
+    if version < 3:
+        conn.execute(
+            text(
+                "UPDATE clothing_items SET price_bucket = "
+                f"{price_bucket_sql('price_value')} "
+                "WHERE price_value IS NOT NULL AND price_bucket IS NULL"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_clothing_items_category_color_price "
+                "ON clothing_items (category_id, color, price_value)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_clothing_items_category_bucket "
+                "ON clothing_items (category_id, price_bucket)"
+            )
+        )
+        for statement in FACET_TRIGGERS:
+            conn.execute(text(statement))
+        rebuild_category_facets(conn)
+    if version < 4:
+        for statement in CHANGE_TRIGGERS:
+            conn.execute(text(statement))
+    conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
@@ -1,14 +1,49 @@
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import (
+    bindparam,
+    create_engine,
+    event,
+    func,
+    text,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred, sessionmaker, scoped_session
+import base64
+import binascii
 import random
 import os
+import re
+
+from catalog_schema import (  # noqa: F401 — реэкспорт для app.py и model/catalog.py
+    CATALOG_SNAPSHOT_COLUMNS,
+    PRICE_BUCKET_EDGES,
+    SCHEMA_VERSION,
+    schema_version,
+)
 
 # Получаем абсолютный путь к директории с db.py
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_PATH = os.path.join(BASE_DIR, 'ozon_clothing_items.db')
+DATABASE_PATH = os.getenv(
+    "OZON_DB_PATH", os.path.join(BASE_DIR, "ozon_clothing_items.db")
+)
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# Настройки пула соединений (один engine на процесс)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Настройки SQLite для параллельных читателей
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
 # Отладочная информация
 print(f"Подключаюсь к базе данных: {DATABASE_PATH}")
 print(f"База данных существует: {os.path.exists(DATABASE_PATH)}")
@@ -17,33 +52,307 @@ if os.path.exists(DATABASE_PATH):
 Base = declarative_base()
 
 
+class Category(Base):
+    """Справочник категорий (заполняет парсер)."""
+
+    __tablename__ = "categories"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class ClothingItem(Base):
     __tablename__ = "clothing_items"
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    price = Column(String)
+    price = Column(String)  # Цена строкой, для показа
+    price_value = Column(Float)  # Цена числом — для фильтров
     description = Column(String)
     url = Column(String)
     image_url = Column(String)
-    image_blob = Column(String)
+    # Устаревший base64 картинки — не грузится при обычных запросах каталога
+    image_blob = deferred(Column(String))
+    image_hash = Column(String)  # sha256 картинки в clothing_images
     category = Column(String)
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    color = Column(String)  # Преобладающий цвет с картинки (определяет парсер)
+    price_bucket = Column(Integer)  # Номер ценовой корзины (PRICE_BUCKET_EDGES)
+    # id товара с почти такой же картинкой (парсер сравнивает dHash); NULL — оригинал
+    duplicate_of = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_clothing_items_category_price", "category_id", "price_value"),
+        Index(
+            "ix_clothing_items_category_color_price",
+            "category_id",
+            "color",
+            "price_value",
+        ),
+        Index("ix_clothing_items_category_bucket", "category_id", "price_bucket"),
+    )
+
+
+class CategoryFacet(Base):
+    """Счётчики фасетов по категориям (поддерживаются триггерами, см. catalog_schema)."""
+
+    __tablename__ = "category_facets"
+    category_id = Column(Integer, primary_key=True)
+    facet = Column(String, primary_key=True)  # "color" или "price_bucket"
+    value = Column(String, primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+
+
+class CatalogChange(Base):
+    """Журнал изменённых товаров (пишут триггеры) — по нему обновляется снимок каталога."""
+
+    __tablename__ = "catalog_changes"
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    item_id = Column(Integer, nullable=False)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+class ClothingImage(Base):
+    """Байты картинок товаров по sha256 (заполняет парсер)."""
+
+    __tablename__ = "clothing_images"
+    hash = Column(String, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+class ImageThumbnail(Base):
+    """Превью картинки для Агента 2 (base64 JPEG под low detail vision-модели)."""
+
+    __tablename__ = "image_thumbnails"
+    image_hash = Column(String, primary_key=True)
+    jpeg_base64 = Column(String, nullable=False)
+
+
+class ImageFeature(Base):
+    """Визуальный вектор картинки (float16, считает парсер) — см. model/visual_index.py."""
+
+    __tablename__ = "image_features"
+    image_hash = Column(String, primary_key=True)
+    vector = Column(LargeBinary, nullable=False)
+
+
+class QueryAnalysisCache(Base):
+    """Разобранные ответы Агента 1 по нормализованному тексту комментария."""
+
+    __tablename__ = "query_analysis_cache"
+    comment_key = Column(String, primary_key=True)
+    result_json = Column(String, nullable=False)
+    created_at = Column(Float, nullable=False, index=True)
+
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+    },
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настраивает каждое новое соединение SQLite: WAL, таймаут блокировки, кэш."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Отрицательное значение — размер кэша в КиБ, а не в страницах
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# Схему каталога обновляет только ozon-parser/src/migrate_schema.py (и парсер
+# при записи): импорт db не должен менять файл базы, в том числе под git.
+# Приложение создаёт лишь свою таблицу кэша, если её ещё нет.
+with engine.connect() as _conn:
+    _version = schema_version(_conn)
+if _version < SCHEMA_VERSION:
+    print(
+        f"⚠️  Схема базы версии {_version}, приложению нужна {SCHEMA_VERSION}: "
+        f"python ozon-parser/src/migrate_schema.py {DATABASE_PATH}"
+    )
+QueryAnalysisCache.__table__.create(engine, checkfirst=True)
+
+# Сессия привязана к потоку (запросу Flask) и удаляется в teardown
+SessionLocal = scoped_session(sessionmaker(bind=engine))
 
 
 def get_db_session():
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return SessionLocal()
+
+
+def remove_db_session(exception=None):
+    """Закрывает сессию текущего запроса. Регистрируется в app.teardown_appcontext."""
+    SessionLocal.remove()
+
+
+# Грубое окончание русских слов: запрос "юбку" ищет по префиксу "юбк*"
+_RUSSIAN_ENDINGS = sorted(
+    "а я о е ы и у ю ь й ой ей ий ый ая яя ое ее ые ие ую юю ам ям ах ях ом ем "
+    "ов ев ами ями ого его ому ему ыми ими".split(),
+    key=len,
+    reverse=True,
+)
+# Вес колонок в bm25: совпадение в названии важнее, чем в описании
+FTS_RANK_WEIGHTS = (10.0, 1.0, 2.0)
+
+
+def _stem(word):
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[: -len(ending)]
+    return word
+
+
+def fts_terms(words):
+    """Термы FTS5: префиксы основ слов длиннее двух букв."""
+    terms = []
+    for word in words:
+        for token in re.findall(r"\w+", word.lower().replace("ё", "е")):
+            if len(token) > 2:
+                term = f'"{_stem(token)}"*'
+                if term not in terms:
+                    terms.append(term)
+    return terms
+
+
+def _ranked_ids(match, category_ids, limit, filters=None):
+    # Ранжируются все совпадения: лучшие по bm25 товары не зависят от того,
+    # когда они попали в каталог
+    sql = (
+        "SELECT clothing_items.id "
+        "FROM clothing_items_fts "
+        "JOIN clothing_items ON clothing_items.id = clothing_items_fts.rowid "
+        "WHERE clothing_items_fts MATCH :match"
+    )
+    params = {"match": match, "limit": limit}
+    expanding = []
+    if category_ids:
+        sql += " AND clothing_items.category_id IN :category_ids"
+        params["category_ids"] = list(category_ids)
+        expanding.append("category_ids")
+    filters = filters or {}
+    if filters.get("price_min") is not None:
+        sql += " AND clothing_items.price_value >= :price_min"
+        params["price_min"] = filters["price_min"]
+    if filters.get("price_max") is not None:
+        sql += " AND clothing_items.price_value <= :price_max"
+        params["price_max"] = filters["price_max"]
+    if filters.get("colors"):
+        sql += " AND clothing_items.color IN :colors"
+        params["colors"] = list(filters["colors"])
+        expanding.append("colors")
+    sql += (
+        f" ORDER BY bm25(clothing_items_fts, {', '.join(map(str, FTS_RANK_WEIGHTS))})"
+        " LIMIT :limit"
+    )
+    statement = text(sql)
+    if expanding:
+        statement = statement.bindparams(
+            *(bindparam(name, expanding=True) for name in expanding)
+        )
+    return [row[0] for row in get_db_session().execute(statement, params)]
+
+
+def search_item_ids(words, category_ids=None, limit=30, filters=None):
+    """
+    id товаров, подходящих под слова запроса, по убыванию релевантности (bm25).
+
+    Сначала ищутся товары со всеми словами сразу, затем — с любым из них.
+    category_ids ограничивает поиск категориями (индекс по category_id),
+    filters — фасетами (см. model/query_filters.py).
+    """
+    terms = fts_terms(words)
+    if not terms:
+        return []
+    ids = _ranked_ids(" AND ".join(terms), category_ids, limit, filters)
+    if len(terms) > 1 and len(ids) < limit:
+        seen = set(ids)
+        for item_id in _ranked_ids(
+            " OR ".join(terms), category_ids, limit + len(ids), filters
+        ):
+            if item_id not in seen:
+                ids.append(item_id)
+                if len(ids) >= limit:
+                    break
+    return ids
+
+
+def get_facet_counts(category_ids, facet):
+    """
+    {значение: число товаров} фасета ("color" или "price_bucket") по
+    категориям category_ids — из материализованной таблицы category_facets.
+    """
+    if not category_ids:
+        return {}
+    session = get_db_session()
+    rows = (
+        session.query(CategoryFacet.value, func.sum(CategoryFacet.item_count))
+        .filter(
+            CategoryFacet.category_id.in_(list(category_ids)),
+            CategoryFacet.facet == facet,
+            CategoryFacet.item_count > 0,
+        )
+        .group_by(CategoryFacet.value)
+        .all()
+    )
+    return {value: int(count) for value, count in rows}
+
+
+def get_category_ids(names):
+    """
+    {название: id} для категорий из справочника (точное совпадение названия)
+    в порядке names; неизвестные названия пропускаются.
+    """
+    names = [name for name in names if name]
+    if not names:
+        return {}
+    session = get_db_session()
+    found = dict(
+        session.query(Category.name, Category.id).filter(Category.name.in_(names)).all()
+    )
+    return {name: found[name] for name in names if name in found}
 
 
 def get_item_by_id(item_id):
+    """Товар из снимка каталога в памяти (model/catalog.py)."""
+    from model.catalog import get_item
+
+    return get_item(item_id)
+
+
+def get_item_image_bytes(item):
+    """
+    Байты сохранённой картинки товара: из clothing_images по image_hash,
+    либо из устаревшего image_blob. None, если картинки в базе нет.
+    """
     session = get_db_session()
-    item = session.query(ClothingItem).filter_by(id=item_id).first()
-    session.close()
-    return item
+    if item.image_hash:
+        data = session.query(ClothingImage.data).filter_by(hash=item.image_hash).scalar()
+        if data:
+            return data
+    blob = session.query(ClothingItem.image_blob).filter_by(id=item.id).scalar()
+    if blob:
+        try:
+            return base64.b64decode(blob)
+        except (binascii.Error, ValueError):
+            return None
+    return None
 
 
-def find_similar_items(image_path, top_n=5, comment=""):
+def find_similar_items(photo, top_n=5, comment="", check_cancelled=None):
     """Обёртка, перенаправляющая вызов к реальной AI-модели."""
     from model.ai_model import find_similar_items as _ai_find
-    return _ai_find(image_path=image_path, top_n=top_n, comment=comment)
+    return _ai_find(
+        photo=photo, top_n=top_n, comment=comment, check_cancelled=check_cancelled
+    )
@@ -0,0 +1,111 @@
+import copy
+import json
+import os
+import re
+import time
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import QueryAnalysisCache, get_db_session
+from model.single_flight import SingleFlight
+
+# Сколько живёт разобранный ответ Агента 1 (секунды) и сколько записей хранить
+AGENT_1_CACHE_TTL = int(os.getenv("AGENT_1_CACHE_TTL", str(7 * 24 * 3600)))
+AGENT_1_CACHE_MAX_ENTRIES = int(os.getenv("AGENT_1_CACHE_MAX_ENTRIES", "5000"))
+
+# hits — ответ из таблицы, misses — запрос к модели,
+# coalesced — дождались ответа на такой же запрос из другого потока
+stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+_flights = SingleFlight()
+
+
+def normalize_comment(comment: str) -> str:
+    """Ключ кэша: регистр, ё/е, пунктуация и лишние пробелы не важны."""
+    text = (comment or "").lower().replace("ё", "е")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def _load(key):
+    session = get_db_session()
+    try:
+        row = (
+            session.query(QueryAnalysisCache.result_json, QueryAnalysisCache.created_at)
+            .filter_by(comment_key=key)
+            .first()
+        )
+    finally:
+        session.close()
+    if row is None or time.time() - row.created_at > AGENT_1_CACHE_TTL:
+        return None
+    return json.loads(row.result_json)
+
+
+def _store(key, result):
+    session = get_db_session()
+    now = time.time()
+    try:
+        stmt = sqlite_insert(QueryAnalysisCache.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["comment_key"],
+            set_={
+                "result_json": stmt.excluded.result_json,
+                "created_at": stmt.excluded.created_at,
+            },
+        )
+        session.execute(
+            stmt,
+            {
+                "comment_key": key,
+                "result_json": json.dumps(result, ensure_ascii=False),
+                "created_at": now,
+            },
+        )
+        # Просроченные и самые старые сверх лимита записи удаляем сразу
+        session.query(QueryAnalysisCache).filter(
+            QueryAnalysisCache.created_at < now - AGENT_1_CACHE_TTL
+        ).delete(synchronize_session=False)
+        overflow = session.query(QueryAnalysisCache).count() - AGENT_1_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            oldest = (
+                session.query(QueryAnalysisCache.comment_key)
+                .order_by(QueryAnalysisCache.created_at)
+                .limit(overflow)
+            )
+            session.query(QueryAnalysisCache).filter(
+                QueryAnalysisCache.comment_key.in_(oldest.scalar_subquery())
+            ).delete(synchronize_session=False)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"⚠️  Не удалось сохранить ответ Агента 1 в кэш: {e}")
+    finally:
+        session.close()
+
+
+def get_or_compute(comment, compute):
+    """
+    Разобранный ответ Агента 1 для комментария.
+
+    Сначала ищет в таблице query_analysis_cache (общая для всех процессов),
+    при промахе вызывает compute(comment) и сохраняет результат. Одинаковые
+    одновременные запросы в процессе ждут один вызов compute. Исключения
+    compute пробрасываются и в кэш не попадают.
+    """
+    key = normalize_comment(comment)
+    result = _load(key)
+    if result is not None:
+        stats["hits"] += 1
+        print(f"⚡ АГЕНТ 1: ответ из кэша ({stats})")
+        return result
+
+    def compute_and_store():
+        stats["misses"] += 1
+        result = compute(comment)
+        _store(key, result)
+        return result
+
+    result, leader = _flights.do(key, compute_and_store)
+    if not leader:
+        stats["coalesced"] += 1
+    return copy.deepcopy(result)
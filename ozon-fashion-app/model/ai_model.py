@@ -1,75 +1,112 @@
 import os
 import sys
-import base64
-import requests
-import io
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
 from openai import OpenAI
-from PIL import Image
 import config
 
 # Добавляем путь к нашему проекту
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db import ClothingItem, get_db_session
-
+from db import (
+    ClothingItem,
+    get_category_ids,
+    get_db_session,
+    get_facet_counts,
+    remove_db_session,
+    search_item_ids,
+)
+from model import agent_1_cache, catalog, intent_classifier, result_cache, visual_index
+from model.user_photo import UserPhoto, as_user_photo
+from model.query_filters import is_filter_word, parse_query_filters
+from model.thumbnails import get_thumbnail_base64
+
+
+# Сколько ждать ответа OpenAI (секунды): зависший запрос не должен держать
+# поток очереди подборок дольше JOB_TIMEOUT (model/jobs.py)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
 
 # Инициализируем OpenAI клиент
 try:
     from config import OPENAI_API_KEY
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
 except ImportError:
     # Если config.py не найден, используем переменную окружения
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
-def _encode_image_to_base64(image_path: str) -> str:
-    """Кодирует изображение в base64 для отправки в OpenAI API."""
-    try:
-        # Открываем изображение через PIL для поддержки всех форматов
-        with Image.open(image_path) as img:
-            # Конвертируем в RGB (убираем альфа-канал если есть)
-            if img.mode in ("RGBA", "LA", "P"):
-                img = img.convert("RGB")
-
-            # Сохраняем в буфер как JPEG
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=85)
-
-            return base64.b64encode(buffer.getvalue()).decode("utf-8")
-    except Exception as e:
-        print(f"⚠️  Ошибка обработки изображения {image_path}: {e}")
-        # Fallback: попробуем прочитать как есть
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
-
-
-def _download_and_encode_image(url: str) -> str:
-    """Скачивает изображение по URL и кодирует в base64."""
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-
-        # Получаем размер изображения
-        content_length = len(response.content)
-        print(f"         📊 Размер: {content_length} байт")
-
-        img = Image.open(io.BytesIO(response.content)).convert("RGB")
-        print(f"         🖼️  Разрешение: {img.size[0]}x{img.size[1]}")
-
-        # Конвертируем в base64
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=85)
-        base64_size = len(buffer.getvalue())
-        print(f"         📦 Base64: {base64_size} байт")
-
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
-    except Exception as e:
-        print(f"         ❌ Ошибка загрузки: {e}")
-        return None
-
-
-def _agent_1_process_request(comment: str, image_path: str = None) -> dict:
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT)
+
+# Сколько категорий Агент 2 проверяет одновременно (запросов к OpenAI в полёте)
+AGENT_2_CONCURRENCY = int(os.getenv("AGENT_2_CONCURRENCY", "5"))
+# Режим Агента 2: "per_category" — запрос на категорию, "batched" — один общий запрос
+AGENT_2_MODE = os.getenv("AGENT_2_MODE", "per_category")
+# Сколько товаров категории Агент 2 сравнивает с фото
+AGENT_2_CANDIDATES = int(os.getenv("AGENT_2_CANDIDATES", "5"))
+
+# Сколько кандидатов поиск отдаёт Агенту 2
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "30"))
+SEARCH_STOP_WORDS = {"подбери", "найди", "покажи"}
+
+
+def _agent_1_ask_llm(comment: str) -> dict:
+    """Разбирает комментарий через gpt-4o-mini. Бросает исключение, если ответ не JSON."""
+    # Анализируем запрос с помощью OpenAI
+    prompt = f"""
+    Анализируй запрос пользователя для поиска женской одежды: "{comment}"
+
+    Доступные категории:
+    - "Брюки, бриджи и капри женские"
+    - "Блузы и рубашки женские" 
+    - "Пиджаки, жакеты и жилеты женские"
+    - "Футболки и топы женские"
+    - "Юбки женские"
+
+    Правила:
+    - Если запрос содержит конкретный тип одежды (футболка, брюки, юбка) → search_type: "specific"
+    - Если запрос общий ("что подойдёт", "дополни образ") → search_type: "complementary"
+
+    Примеры:
+    "Подбери футболку" → specific, categories: ["Футболки и топы женские"]
+    "Что подойдёт к этому образу?" → complementary, categories: [все категории]
+
+    Ответ СТРОГО в JSON:
+    {{
+        "categories": ["точные названия категорий"],
+        "keywords": ["ключевые слова"],
+        "search_type": "specific или complementary",
+        "reasoning": "объяснение"
+    }}"""
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=300,
+        temperature=0.1,  # Снижаем температуру для более стабильного JSON
+    )
+
+    # Получаем ответ и очищаем от лишних символов
+    raw_response = response.choices[0].message.content.strip()
+    print(f"🔍 АГЕНТ 1: Сырой ответ: {raw_response}")
+
+    # Пытаемся извлечь JSON из ответа
+    json_match = re.search(r"\{.*\}", raw_response, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(0)
+        result = json.loads(json_str)
+    else:
+        raise ValueError("JSON не найден в ответе")
+
+    # Обращение по ключам проверяет ответ до того, как он попадёт в кэш
+    return {
+        "categories": result["categories"],
+        "keywords": result["keywords"],
+        "search_type": result["search_type"],
+        "reasoning": result["reasoning"],
+    }
+
+
+def _agent_1_process_request(comment: str, photo: UserPhoto = None) -> dict:
     """
     АГЕНТ 1: Обрабатывает пользовательский запрос и формирует поисковый запрос в БД.
 
@@ -81,54 +118,13 @@ def _agent_1_process_request(comment: str, image_path: str = None) -> dict:
     print("🤖 АГЕНТ 1: Обрабатываю запрос пользователя...")
 
     try:
-        # Анализируем запрос с помощью OpenAI
-        prompt = f"""
-        Анализируй запрос пользователя для поиска женской одежды: "{comment}"
-        
-        Доступные категории:
-        - "Брюки, бриджи и капри женские"
-        - "Блузы и рубашки женские" 
-        - "Пиджаки, жакеты и жилеты женские"
-        - "Футболки и топы женские"
-        - "Юбки женские"
-        
-        Правила:
-        - Если запрос содержит конкретный тип одежды (футболка, брюки, юбка) → search_type: "specific"
-        - Если запрос общий ("что подойдёт", "дополни образ") → search_type: "complementary"
-        
-        Примеры:
-        "Подбери футболку" → specific, categories: ["Футболки и топы женские"]
-        "Что подойдёт к этому образу?" → complementary, categories: [все категории]
-        
-        Ответ СТРОГО в JSON:
-        {{
-            "categories": ["точные названия категорий"],
-            "keywords": ["ключевые слова"],
-            "search_type": "specific или complementary",
-            "reasoning": "объяснение"
-        }}"""
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.1,  # Снижаем температуру для более стабильного JSON
-        )
-
-        import json
-        import re
-
-        # Получаем ответ и очищаем от лишних символов
-        raw_response = response.choices[0].message.content.strip()
-        print(f"🔍 АГЕНТ 1: Сырой ответ: {raw_response}")
-
-        # Пытаемся извлечь JSON из ответа
-        json_match = re.search(r"\{.*\}", raw_response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-            result = json.loads(json_str)
+        # Сначала локальный классификатор; OpenAI — только если он не уверен
+        result = intent_classifier.classify(comment)
+        if result["confidence"] >= intent_classifier.INTENT_CONFIDENCE_THRESHOLD:
+            print(f"⚡ АГЕНТ 1: локальный классификатор ({result['reasoning']})")
         else:
-            raise ValueError("JSON не найден в ответе")
+            # Ответ зависит только от текста комментария — повторы берём из кэша
+            result = agent_1_cache.get_or_compute(comment, _agent_1_ask_llm)
 
         print(f"🧠 АГЕНТ 1 определил:")
         print(f"   📂 Категории: {result['categories']}")
@@ -150,32 +146,7 @@ def _agent_1_process_request(comment: str, image_path: str = None) -> dict:
         # Fallback: улучшенный парсинг
         comment_lower = comment.lower()
 
-        category_keywords = {
-            "Брюки, бриджи и капри женские": [
-                "брюки",
-                "джинсы",
-                "штаны",
-                "легинсы",
-                "капри",
-                "бриджи",
-            ],
-            "Блузы и рубашки женские": ["блузка", "рубашка", "блуза", "сорочка"],
-            "Пиджаки, жакеты и жилеты женские": [
-                "пиджак",
-                "жакет",
-                "жилет",
-                "кардиган",
-                "блейзер",
-            ],
-            "Футболки и топы женские": [
-                "футболка",
-                "футболку",
-                "топ",
-                "майка",
-                "тишка",
-            ],
-            "Юбки женские": ["юбка", "юбку", "мини", "макси"],
-        }
+        category_keywords = intent_classifier.CATEGORY_KEYWORDS
 
         mentioned_categories = []
         for category, keywords in category_keywords.items():
@@ -199,11 +170,386 @@ def _agent_1_process_request(comment: str, image_path: str = None) -> dict:
             "search_type": search_type,
             "reasoning": "Fallback анализ по ключевым словам",
             "original_comment": comment,
+            # Подборку после ошибки OpenAI не кэшируем (см. result_cache)
+            "fallback": True,
         }
 
 
+def _skip_near_duplicates(items: List[ClothingItem]) -> List[ClothingItem]:
+    """Оставляет по одному товару на картинку: одинаковый image_hash или duplicate_of."""
+    seen_groups, seen_images, unique = set(), set(), []
+    for item in items:
+        group = item.duplicate_of or item.id
+        if group in seen_groups or (item.image_hash and item.image_hash in seen_images):
+            continue
+        seen_groups.add(group)
+        if item.image_hash:
+            seen_images.add(item.image_hash)
+        unique.append(item)
+    return unique
+
+
+def _agent_2_collect_candidates(items: List[ClothingItem]):
+    """Выбирает до 5 кандидатов категории и берёт их превью. Возвращает (товары, base64)."""
+    # Умный выбор количества товаров для сравнения
+    max_items_to_compare = min(AGENT_2_CANDIDATES, len(items))
+
+    # Если товаров много, берём разнообразную выборку
+    if len(items) > max_items_to_compare:
+        # Берём первые (самые релевантные) + случайные из середины и конца
+        items_to_compare = items[:2]  # Первые 2 самых релевантных
+        if len(items) > 10:
+            # Добавляем товары из середины и конца для разнообразия
+            mid_idx = len(items) // 2
+            items_to_compare.extend([items[mid_idx], items[-2], items[-1]])
+        else:
+            # Если товаров не очень много, берём равномерно
+            step = len(items) // max_items_to_compare
+            for i in range(2, max_items_to_compare):
+                idx = min(i * step, len(items) - 1)
+                items_to_compare.append(items[idx])
+
+        # Убираем дубликаты и ограничиваем
+        seen = set()
+        unique_items = []
+        for item in items_to_compare:
+            if item.id not in seen:
+                seen.add(item.id)
+                unique_items.append(item)
+        items_to_compare = unique_items[:max_items_to_compare]
+    else:
+        items_to_compare = items[:max_items_to_compare]
+
+    print(
+        f"   📊 Стратегия выбора: {len(items)} товаров → {len(items_to_compare)} для AI анализа"
+    )
+    print(f"   📋 Кандидаты для сравнения:")
+    for i, item in enumerate(items_to_compare, 1):
+        print(f"      {i}. {item.name[:35]}... ({item.price}₽)")
+        print(
+            f"         🖼️  Изображение: {item.image_url[:50] if item.image_url else 'Нет'}..."
+        )
+
+    # Собираем изображения товаров
+    candidate_images = []
+    valid_items = []
+
+    print(f"   🔄 Беру превью товаров из кэша...")
+    for i, item in enumerate(items_to_compare, 1):
+        if item.image_hash or item.image_url:
+            item_base64 = get_thumbnail_base64(item)
+            if item_base64:
+                candidate_images.append(item_base64)
+                valid_items.append(item)
+                print(f"      ✅ Превью {i} готово")
+            else:
+                print(f"      ❌ Нет превью для товара {i}")
+        else:
+            print(f"      ⚠️  У товара {i} нет изображения")
+
+    return valid_items, candidate_images
+
+
+def _agent_2_validate_category(
+    category: str,
+    items: List[ClothingItem],
+    original_base64: str,
+    user_comment: str,
+    search_info: dict,
+) -> ClothingItem:
+    """Выбирает через OpenAI Vision лучший товар одной категории."""
+    print(f"🔍 Валидирую категорию: {category} ({len(items)} товаров)")
+
+    if len(items) == 1:
+        # Если товар один, берём его
+        print(
+            f"   ✅ Единственный товар: {items[0].name[:40]}... ({items[0].price}₽)"
+        )
+        return items[0]
+
+    valid_items, candidate_images = _agent_2_collect_candidates(items)
+
+    if not candidate_images:
+        # Если нет изображений, берём первый товар
+        print(f"      ⚠️  Нет доступных изображений, выбираю первый товар")
+        print(f"      ✅ Выбран: {items[0].name[:40]}... ({items[0].price}₽)")
+        return items[0]
+
+    print(f"   🎯 Готов к AI анализу: {len(candidate_images)} изображений")
+
+    # Адаптивный промпт в зависимости от типа поиска
+    search_type = search_info.get("search_type", "specific")
+
+    # Динамический промпт в зависимости от количества товаров
+    num_items = len(valid_items)
+    items_list = []
+    valid_numbers = []
+
+    for i, item in enumerate(valid_items, 1):
+        items_list.append(f"ИЗОБРАЖЕНИЕ {i+1}: Товар №{i} - {item.name[:40]}")
+        valid_numbers.append(str(i))
+
+    items_description = "\n                ".join(items_list)
+    valid_range = ", ".join(valid_numbers)
+
+    if search_type == "specific":
+        prompt = f"""
+        Пользователь ищет конкретный тип одежды: "{user_comment}"
+
+        ИЗОБРАЖЕНИЕ 1: Исходное фото пользователя (НЕ для выбора)
+        {items_description}
+
+        Выбери НОМЕР ТОВАРА ({valid_range}), который лучше всего соответствует запросу.
+        Учитывай стиль, цвет, фасон и качество товара.
+
+        ВАЖНО: Отвечай только цифрой товара: {valid_range}
+        """
+    else:
+        prompt = f"""
+        Пользователь ищет дополняющие товары к своему образу: "{user_comment}"
+
+        ИЗОБРАЖЕНИЕ 1: Исходный образ пользователя (НЕ для выбора)
+        {items_description}
+
+        Выбери НОМЕР ТОВАРА ({valid_range}), который лучше всего дополнит исходный образ.
+        Учитывай сочетаемость по стилю, цветам и общую гармонию образа.
+
+        ВАЖНО: Отвечай только цифрой товара: {valid_range}
+        """
+
+    # Формируем сообщения с изображениями
+    content = [{"type": "text", "text": prompt}]
+
+    # Добавляем исходное изображение
+    content.append(
+        {
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{original_base64}"},
+        }
+    )
+
+    # Добавляем изображения кандидатов (превью уже под low detail)
+    for img_base64 in candidate_images:
+        content.append(
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{img_base64}",
+                    "detail": "low",
+                },
+            }
+        )
+
+    # Отправляем запрос в OpenAI
+    print(f"   🧠 Отправляю запрос в OpenAI Vision...")
+    print(f"      📤 Модель: gpt-4o-mini")
+    print(f"      📤 Изображений: {len(content) - 1} (включая исходное)")
+    payload_bytes = len(original_base64) + sum(map(len, candidate_images))
+    print(f"      📤 Размер изображений: {payload_bytes} байт (base64)")
+    print(f"      📤 Тип поиска: {search_type}")
+    print(f"   📋 Структура изображений для AI:")
+    print(f"      🖼️  1. Исходное фото пользователя (НЕ для выбора)")
+    for i, item in enumerate(valid_items, 1):
+        print(f"      🖼️  {i+1}. Товар №{i}: {item.name[:35]}...")
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": content}],
+        max_tokens=5,
+    )
+
+    # Парсим ответ
+    choice = response.choices[0].message.content.strip()
+    print(f"   🤖 AI ответил: '{choice}'")
+
+    # Показываем соответствие выбора товарам
+    valid_range = ", ".join([str(i) for i in range(1, len(valid_items) + 1)])
+    print(f"   🔍 Расшифровка выбора AI:")
+    print(f"      AI ответил: '{choice}' (должно быть {valid_range})")
+    for i, item in enumerate(valid_items, 1):
+        marker = "👉" if choice == str(i) else "  "
+        print(f"      {marker} Товар №{i}: {item.name[:30]}... ({item.price}₽)")
+
+    try:
+        choice_num = int(choice)
+
+        # Если AI ответил номером изображения (2, 3, 4, 5, 6), конвертируем в номер товара (1, 2, 3, 4, 5)
+        if choice_num >= 2 and choice_num <= len(valid_items) + 1:
+            choice_idx = choice_num - 2  # 2->0, 3->1, 4->2, 5->3, 6->4
+            print(
+                f"   🔄 Конвертирую номер изображения {choice_num} в номер товара {choice_idx + 1}"
+            )
+        # Если AI ответил номером товара (1, 2, 3, 4, 5)
+        elif choice_num >= 1 and choice_num <= len(valid_items):
+            choice_idx = choice_num - 1  # 1->0, 2->1, 3->2, 4->3, 5->4
+            print(f"   ✅ Использую номер товара {choice_num} как есть")
+        else:
+            choice_idx = -1  # Некорректный выбор
+
+        if 0 <= choice_idx < len(valid_items):
+            selected_item = valid_items[choice_idx]
+            print(
+                f"   ✅ ВЫБРАН: {selected_item.name[:40]}... ({selected_item.price}₽)"
+            )
+            return selected_item
+        else:
+            fallback_item = valid_items[0]
+            print(f"   ⚠️  Некорректный выбор '{choice}', взят первый товар")
+            print(
+                f"   ✅ ВЫБРАН: {fallback_item.name[:40]}... ({fallback_item.price}₽)"
+            )
+            return fallback_item
+    except (ValueError, IndexError):
+        fallback_item = valid_items[0]
+        print(f"   ❌ Ошибка парсинга выбора '{choice}', взят первый товар")
+        print(
+            f"   ✅ ВЫБРАН: {fallback_item.name[:40]}... ({fallback_item.price}₽)"
+        )
+        return fallback_item
+
+
+def _validate_category_safely(category, items, original_base64, user_comment, search_info):
+    """Ошибка в одной категории не должна ломать остальные: берём первый товар."""
+    try:
+        return _agent_2_validate_category(
+            category, items, original_base64, user_comment, search_info
+        )
+    except Exception as e:
+        print(f"   ❌ Ошибка валидации категории {category}: {e}, взят первый товар")
+        search_info["fallback"] = True
+        return items[0]
+    finally:
+        # Сессия БД привязана к потоку пула — закрываем её после задачи
+        remove_db_session()
+
+
+def _agent_2_validate_batched(
+    categories: Dict[str, List[ClothingItem]],
+    original_base64: str,
+    user_comment: str,
+    search_info: dict,
+) -> Dict[str, ClothingItem]:
+    """
+    Выбирает товары всех категорий одним запросом к OpenAI Vision:
+    фото пользователя отправляется один раз вместе с кандидатами всех категорий.
+
+    Возвращает {категория: товар}. Категории, для которых ответ не удалось
+    разобрать, в результат не попадают — их проверяют отдельными запросами.
+    """
+    picks = {}
+    pending = []  # (категория, товары, превью) — то, что уйдёт в общий запрос
+    for category, items in categories.items():
+        print(f"🔍 Готовлю категорию: {category} ({len(items)} товаров)")
+        if len(items) == 1:
+            print(
+                f"   ✅ Единственный товар: {items[0].name[:40]}... ({items[0].price}₽)"
+            )
+            picks[category] = items[0]
+            continue
+        valid_items, candidate_images = _agent_2_collect_candidates(items)
+        if not candidate_images:
+            print(f"      ⚠️  Нет доступных изображений, выбираю первый товар")
+            picks[category] = items[0]
+            continue
+        pending.append((category, valid_items, candidate_images))
+
+    if not pending:
+        return picks
+
+    search_type = search_info.get("search_type", "specific")
+    if search_type == "specific":
+        task = f'Пользователь ищет конкретный тип одежды: "{user_comment}"'
+        goal = "лучше всего соответствует запросу (стиль, цвет, фасон, качество)"
+    else:
+        task = f'Пользователь ищет дополняющие товары к своему образу: "{user_comment}"'
+        goal = "лучше всего дополнит исходный образ (стиль, цвета, общая гармония)"
+
+    sections = []
+    image_num = 2
+    for category_num, (category, valid_items, _) in enumerate(pending, 1):
+        sections.append(f"КАТЕГОРИЯ {category_num}: {category}")
+        for i, item in enumerate(valid_items, 1):
+            sections.append(
+                f"  ИЗОБРАЖЕНИЕ {image_num}: Товар №{i} - {item.name[:40]}"
+            )
+            image_num += 1
+    answer_example = ", ".join(
+        f'"{category_num}": номер товара' for category_num in range(1, len(pending) + 1)
+    )
+    prompt = f"""
+{task}
+
+ИЗОБРАЖЕНИЕ 1: Исходное фото пользователя (НЕ для выбора)
+{chr(10).join(sections)}
+
+В каждой категории выбери НОМЕР ТОВАРА (№ внутри категории), который {goal}.
+
+Ответ СТРОГО в JSON: {{{answer_example}}}
+"""
+
+    content = [
+        {"type": "text", "text": prompt},
+        {
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{original_base64}"},
+        },
+    ]
+    for _, _, candidate_images in pending:
+        for img_base64 in candidate_images:
+            content.append(
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{img_base64}",
+                        "detail": "low",
+                    },
+                }
+            )
+
+    payload_bytes = len(original_base64) + sum(
+        len(img) for _, _, images in pending for img in images
+    )
+    print(f"   🧠 Отправляю общий запрос в OpenAI Vision...")
+    print(f"      📤 Категорий: {len(pending)}, изображений: {len(content) - 1}")
+    print(f"      📤 Размер изображений: {payload_bytes} байт (base64)")
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": content}],
+        max_tokens=10 + 8 * len(pending),
+        temperature=0.1,
+    )
+    raw_response = response.choices[0].message.content.strip()
+    print(f"   🤖 AI ответил: {raw_response}")
+
+    try:
+        json_match = re.search(r"\{.*\}", raw_response, re.DOTALL)
+        if not json_match:
+            raise ValueError("JSON не найден в ответе")
+        choices = json.loads(json_match.group(0))
+        if not isinstance(choices, dict):
+            raise ValueError("ответ не является объектом JSON")
+    except ValueError as e:
+        print(f"   ❌ Ошибка разбора общего ответа: {e}")
+        return picks
+
+    for category_num, (category, valid_items, _) in enumerate(pending, 1):
+        try:
+            choice_idx = int(choices.get(str(category_num))) - 1
+        except (TypeError, ValueError):
+            choice_idx = -1
+        if 0 <= choice_idx < len(valid_items):
+            picks[category] = valid_items[choice_idx]
+            print(
+                f"   ✅ {category}: {picks[category].name[:40]}... ({picks[category].price}₽)"
+            )
+        else:
+            print(f"   ⚠️  {category}: некорректный выбор, проверю отдельным запросом")
+    return picks
+
+
 def _agent_2_validate_items(
-    original_image_path: str,
+    photo,
     candidate_items: List[ClothingItem],
     user_comment: str,
     search_info: dict,
@@ -213,14 +559,16 @@ def _agent_2_validate_items(
 
     Использует OpenAI Vision для анализа исходного фото пользователя и сравнения
     с товарами из БД, выбирая лучшие варианты по стилю и сочетаемости.
+    photo — UserPhoto (model/user_photo.py) или путь к файлу.
     """
     print(f"🤖 АГЕНТ 2: Валидирую товары по фото...")
     print(f"   🎯 Тип поиска: {search_info.get('search_type')}")
     print(f"   💭 Логика поиска: {search_info.get('reasoning')}")
 
     try:
-        # Кодируем исходное изображение
-        original_base64 = _encode_image_to_base64(original_image_path)
+        # Фото уже уменьшено и закодировано в JPEG один раз на запрос
+        photo = as_user_photo(photo)
+        original_base64 = photo.base64
 
         # Группируем товары по категориям
         categories = {}
@@ -232,211 +580,57 @@ def _agent_2_validate_items(
 
         print(f"📦 Найдено товаров в {len(categories)} категориях")
 
-        best_items = []
-
+        # Одна и та же фотография у разных продавцов не должна занимать места кандидатов
         for category, items in categories.items():
-            print(f"🔍 Валидирую категорию: {category} ({len(items)} товаров)")
-
-            if len(items) == 1:
-                # Если товар один, берём его
-                print(
-                    f"   ✅ Единственный товар: {items[0].name[:40]}... ({items[0].price}₽)"
-                )
-                best_items.append(items[0])
-                continue
-
-            # Умный выбор количества товаров для сравнения
-            max_items_to_compare = min(5, len(items))  # До 5 товаров максимум
-
-            # Если товаров много, берём разнообразную выборку
-            if len(items) > max_items_to_compare:
-                # Берём первые (самые релевантные) + случайные из середины и конца
-                items_to_compare = items[:2]  # Первые 2 самых релевантных
-                if len(items) > 10:
-                    # Добавляем товары из середины и конца для разнообразия
-                    mid_idx = len(items) // 2
-                    items_to_compare.extend([items[mid_idx], items[-2], items[-1]])
-                else:
-                    # Если товаров не очень много, берём равномерно
-                    step = len(items) // max_items_to_compare
-                    for i in range(2, max_items_to_compare):
-                        idx = min(i * step, len(items) - 1)
-                        items_to_compare.append(items[idx])
-
-                # Убираем дубликаты и ограничиваем
-                seen = set()
-                unique_items = []
-                for item in items_to_compare:
-                    if item.id not in seen:
-                        seen.add(item.id)
-                        unique_items.append(item)
-                items_to_compare = unique_items[:max_items_to_compare]
-            else:
-                items_to_compare = items[:max_items_to_compare]
-
-            print(
-                f"   📊 Стратегия выбора: {len(items)} товаров → {len(items_to_compare)} для AI анализа"
-            )
-            print(f"   📋 Кандидаты для сравнения:")
-            for i, item in enumerate(items_to_compare, 1):
-                print(f"      {i}. {item.name[:35]}... ({item.price}₽)")
-                print(
-                    f"         🖼️  Изображение: {item.image_url[:50] if item.image_url else 'Нет'}..."
+            unique = _skip_near_duplicates(items)
+            if len(unique) < len(items):
+                print(f"🪞 {category}: пропущено дублей картинок {len(items) - len(unique)}")
+            categories[category] = unique
+
+        # В OpenAI уходят самые похожие на фото товары категории (по векторам)
+        try:
+            query_vector = visual_index.image_features(photo.image)
+            categories = {
+                category: visual_index.rank_items(query_vector, items, AGENT_2_CANDIDATES)
+                for category, items in categories.items()
+            }
+        except Exception as e:
+            print(f"⚠️  Визуальное ранжирование недоступно: {e}")
+
+        picks = {}
+        if AGENT_2_MODE == "batched":
+            try:
+                picks = _agent_2_validate_batched(
+                    categories, original_base64, user_comment, search_info
                 )
-
-            # Собираем изображения товаров
-            candidate_images = []
-            valid_items = []
-
-            print(f"   🔄 Загружаю изображения товаров...")
-            for i, item in enumerate(items_to_compare, 1):
-                if item.image_url:
-                    print(
-                        f"      📥 Загружаю изображение {i}: {item.image_url[:60]}..."
+            except Exception as e:
+                print(f"❌ Общий запрос не удался: {e}, проверяю категории по отдельности")
+
+        # Категории без выбора (режим per_category или ошибка общего запроса)
+        # валидируем параллельно, а результат собираем в исходном порядке категорий
+        remaining = {
+            category: items
+            for category, items in categories.items()
+            if category not in picks
+        }
+        if remaining:
+            workers = max(1, min(AGENT_2_CONCURRENCY, len(remaining)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    category: pool.submit(
+                        _validate_category_safely,
+                        category,
+                        items,
+                        original_base64,
+                        user_comment,
+                        search_info,
                     )
-                    item_base64 = _download_and_encode_image(item.image_url)
-                    if item_base64:
-                        candidate_images.append(item_base64)
-                        valid_items.append(item)
-                        print(f"      ✅ Изображение {i} загружено успешно")
-                    else:
-                        print(f"      ❌ Ошибка загрузки изображения {i}")
-                else:
-                    print(f"      ⚠️  У товара {i} нет изображения")
-
-            if not candidate_images:
-                # Если нет изображений, берём первый товар
-                print(f"      ⚠️  Нет доступных изображений, выбираю первый товар")
-                print(f"      ✅ Выбран: {items[0].name[:40]}... ({items[0].price}₽)")
-                best_items.append(items[0])
-                continue
-
-            print(f"   🎯 Готов к AI анализу: {len(candidate_images)} изображений")
-
-            # Адаптивный промпт в зависимости от типа поиска
-            search_type = search_info.get("search_type", "specific")
-
-            # Динамический промпт в зависимости от количества товаров
-            num_items = len(valid_items)
-            items_list = []
-            valid_numbers = []
-
-            for i, item in enumerate(valid_items, 1):
-                items_list.append(f"ИЗОБРАЖЕНИЕ {i+1}: Товар №{i} - {item.name[:40]}")
-                valid_numbers.append(str(i))
-
-            items_description = "\n                ".join(items_list)
-            valid_range = ", ".join(valid_numbers)
-
-            if search_type == "specific":
-                prompt = f"""
-                Пользователь ищет конкретный тип одежды: "{user_comment}"
-                
-                ИЗОБРАЖЕНИЕ 1: Исходное фото пользователя (НЕ для выбора)
-                {items_description}
-                
-                Выбери НОМЕР ТОВАРА ({valid_range}), который лучше всего соответствует запросу.
-                Учитывай стиль, цвет, фасон и качество товара.
-                
-                ВАЖНО: Отвечай только цифрой товара: {valid_range}
-                """
-            else:
-                prompt = f"""
-                Пользователь ищет дополняющие товары к своему образу: "{user_comment}"
-                
-                ИЗОБРАЖЕНИЕ 1: Исходный образ пользователя (НЕ для выбора)
-                {items_description}
-                
-                Выбери НОМЕР ТОВАРА ({valid_range}), который лучше всего дополнит исходный образ.
-                Учитывай сочетаемость по стилю, цветам и общую гармонию образа.
-                
-                ВАЖНО: Отвечай только цифрой товара: {valid_range}
-                """
-
-            # Формируем сообщения с изображениями
-            content = [{"type": "text", "text": prompt}]
-
-            # Добавляем исходное изображение
-            content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{original_base64}"},
+                    for category, items in remaining.items()
                 }
-            )
-
-            # Добавляем изображения кандидатов
-            for img_base64 in candidate_images:
-                content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"},
-                    }
-                )
-
-            # Отправляем запрос в OpenAI
-            print(f"   🧠 Отправляю запрос в OpenAI Vision...")
-            print(f"      📤 Модель: gpt-4o-mini")
-            print(f"      📤 Изображений: {len(content) - 1} (включая исходное)")
-            print(f"      📤 Тип поиска: {search_type}")
-            print(f"   📋 Структура изображений для AI:")
-            print(f"      🖼️  1. Исходное фото пользователя (НЕ для выбора)")
-            for i, item in enumerate(valid_items, 1):
-                print(f"      🖼️  {i+1}. Товар №{i}: {item.name[:35]}...")
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": content}],
-                max_tokens=5,
-            )
+                for category, future in futures.items():
+                    picks[category] = future.result()
 
-            # Парсим ответ
-            choice = response.choices[0].message.content.strip()
-            print(f"   🤖 AI ответил: '{choice}'")
-
-            # Показываем соответствие выбора товарам
-            valid_range = ", ".join([str(i) for i in range(1, len(valid_items) + 1)])
-            print(f"   🔍 Расшифровка выбора AI:")
-            print(f"      AI ответил: '{choice}' (должно быть {valid_range})")
-            for i, item in enumerate(valid_items, 1):
-                marker = "👉" if choice == str(i) else "  "
-                print(f"      {marker} Товар №{i}: {item.name[:30]}... ({item.price}₽)")
-
-            try:
-                choice_num = int(choice)
-
-                # Если AI ответил номером изображения (2, 3, 4, 5, 6), конвертируем в номер товара (1, 2, 3, 4, 5)
-                if choice_num >= 2 and choice_num <= len(valid_items) + 1:
-                    choice_idx = choice_num - 2  # 2->0, 3->1, 4->2, 5->3, 6->4
-                    print(
-                        f"   🔄 Конвертирую номер изображения {choice_num} в номер товара {choice_idx + 1}"
-                    )
-                # Если AI ответил номером товара (1, 2, 3, 4, 5)
-                elif choice_num >= 1 and choice_num <= len(valid_items):
-                    choice_idx = choice_num - 1  # 1->0, 2->1, 3->2, 4->3, 5->4
-                    print(f"   ✅ Использую номер товара {choice_num} как есть")
-                else:
-                    choice_idx = -1  # Некорректный выбор
-
-                if 0 <= choice_idx < len(valid_items):
-                    selected_item = valid_items[choice_idx]
-                    best_items.append(selected_item)
-                    print(
-                        f"   ✅ ВЫБРАН: {selected_item.name[:40]}... ({selected_item.price}₽)"
-                    )
-                else:
-                    fallback_item = valid_items[0]
-                    best_items.append(fallback_item)
-                    print(f"   ⚠️  Некорректный выбор '{choice}', взят первый товар")
-                    print(
-                        f"   ✅ ВЫБРАН: {fallback_item.name[:40]}... ({fallback_item.price}₽)"
-                    )
-            except (ValueError, IndexError):
-                fallback_item = valid_items[0]
-                best_items.append(fallback_item)
-                print(f"   ❌ Ошибка парсинга выбора '{choice}', взят первый товар")
-                print(
-                    f"   ✅ ВЫБРАН: {fallback_item.name[:40]}... ({fallback_item.price}₽)"
-                )
+        best_items = [picks[category] for category in categories]
 
         print(f"🎯 АГЕНТ 2: Итоговый результат - {len(best_items)} товаров:")
         for i, item in enumerate(best_items, 1):
@@ -447,6 +641,7 @@ def _agent_2_validate_items(
 
     except Exception as e:
         print(f"❌ Ошибка при валидации: {e}")
+        search_info["fallback"] = True
         # Fallback: по одному товару из каждой категории
         categories = {}
         for item in candidate_items:
@@ -456,116 +651,99 @@ def _agent_2_validate_items(
         return list(categories.values())
 
 
-def _search_items_by_request(request_info: dict) -> List[ClothingItem]:
+def _find_candidates(keywords, category_ids, scope, search_type, filters):
+    """FTS-поиск по словам с добором товарами категорий до SEARCH_LIMIT."""
+    ids = []
+    if keywords and (scope or search_type != "specific"):
+        ids = search_item_ids(
+            keywords, category_ids=scope, limit=SEARCH_LIMIT, filters=filters
+        )
+        print(f"🔍 Полнотекстовый поиск по {keywords}: {len(ids)} товаров")
+    # Товары берутся из снимка каталога в памяти, а не из ORM
+    items = catalog.get_items(ids)
+
+    # Добираем до лимита товарами категорий, поровну на каждую
+    if category_ids and len(items) < SEARCH_LIMIT:
+        per_category = math.ceil((SEARCH_LIMIT - len(items)) / len(category_ids))
+        for category_id in category_ids.values():
+            items.extend(
+                catalog.category_items(
+                    category_id, per_category, exclude=ids, filters=filters
+                )
+            )
+        items = items[:SEARCH_LIMIT]
+    return items
+
+
+def _search_items_by_request(request_info: dict) -> List[catalog.CatalogItem]:
     """
     Ищет товары в базе данных по запросу пользователя.
-    Простой и быстрый поиск без детального анализа изображения.
+
+    Слова запроса ищутся по полнотекстовому индексу и ранжируются bm25,
+    оставшиеся места поровну добираются товарами запрошенных категорий
+    (названия не из справочника сопоставляются с категориями снимка каталога).
+    Цена и цвет из комментария сужают выборку; если с ними ничего не
+    нашлось, поиск повторяется без фильтров.
     """
     session = get_db_session()
     try:
-        from sqlalchemy import or_
-
         categories = request_info.get("requested_categories", [])
         keywords = request_info.get("search_keywords", [])
 
         print(f"🎯 Ищу товары в категориях: {categories}")
         print(f"🔤 Ключевые слова: {keywords}")
 
-        # Формируем запрос к базе данных
-        query = session.query(ClothingItem)
-
-        # Стратегия поиска: приоритет категориям над ключевыми словами
-        all_conditions = []
-
         search_type = request_info.get("search_type", "specific")
-
-        # Определяем стратегию поиска на основе типа
-        if search_type == "specific":  # Конкретный запрос
+        relevant_keywords = [
+            kw for kw in keywords if len(kw) > 2 and kw not in SEARCH_STOP_WORDS
+        ]
+
+        # Категории фильтруются точно по id из справочника (индекс по category_id)
+        category_ids = get_category_ids(categories)
+        unknown = [c for c in categories if c not in category_ids]
+        if unknown:
+            # Названия не из справочника ищем по вхождению в названия категорий снимка
+            similar = catalog.category_ids_like(unknown)
+            print(f"⚠️  Нет в справочнике категорий: {unknown}, похожие: {list(similar)}")
+            for name, category_id in similar.items():
+                if category_id not in category_ids.values():
+                    category_ids[name] = category_id
+
+        # Конкретный запрос ранжирует товары внутри категорий,
+        # комплементарный ищет слова по всему каталогу
+        if search_type == "specific":
             print(f"🎯 Точечный поиск по категориям: {categories}")
-            category_conditions = []
-            for category in categories:
-                category_conditions.append(ClothingItem.category.ilike(f"%{category}%"))
-
-            # Для конкретного запроса используем только категории
-            all_conditions = category_conditions
-
-        else:  # Комплементарный поиск
-            print(f"🔍 Комплементарный поиск по категориям: {categories}")
-            # Добавляем условия по категориям
-            if categories:
-                for category in categories:
-                    all_conditions.append(ClothingItem.category.ilike(f"%{category}%"))
-
-            # Добавляем условия по ключевым словам
-            relevant_keywords = [
-                kw
-                for kw in keywords
-                if len(kw) > 2 and kw not in ["подбери", "найди", "покажи"]
-            ]
-            if relevant_keywords:
-                print(f"🔍 Добавляю поиск по ключевым словам: {relevant_keywords}")
-                for keyword in relevant_keywords:
-                    like_pattern = f"%{keyword}%"
-                    all_conditions.extend(
-                        [
-                            ClothingItem.name.ilike(like_pattern),
-                            ClothingItem.description.ilike(like_pattern),
-                            ClothingItem.category.ilike(like_pattern),
-                        ]
-                    )
-
-        # Применяем все условия через OR
-        if all_conditions:
-            print(f"🔍 Всего условий поиска: {len(all_conditions)}")
-            query = query.filter(or_(*all_conditions))
+            scope = list(category_ids.values())
         else:
+            print(f"🔍 Комплементарный поиск по категориям: {categories}")
+            scope = None
+
+        # Цена и цвет из комментария — фасетные фильтры, а не слова для поиска
+        filters = parse_query_filters(request_info.get("original_comment", ""))
+        if filters.get("colors") and category_ids:
+            # Счётчики фасетов: цвета, которых нет в категориях, не фильтруем
+            available = get_facet_counts(category_ids.values(), "color")
+            filters["colors"] = [c for c in filters["colors"] if available.get(c)]
+            if not filters["colors"]:
+                del filters["colors"]
+        if filters:
+            print(f"🎛️  Фильтры: {filters}")
+            relevant_keywords = [kw for kw in relevant_keywords if not is_filter_word(kw)]
+
+        items = _find_candidates(
+            relevant_keywords, category_ids, scope, search_type, filters
+        )
+        if not items and filters:
+            print("🔄 По фильтрам ничего нет, ищу без них")
+            items = _find_candidates(
+                relevant_keywords, category_ids, scope, search_type, {}
+            )
+        if not categories and not items:
             print("⚠️  Нет условий для поиска, возвращаю все товары")
-
-        # Ограничиваем результат
-        items = query.limit(30).all()
+            items = catalog.first_items(SEARCH_LIMIT)
 
         print(f"📦 Найдено {len(items)} товаров по запросу")
 
-        # Fallback: если ничего не найдено, но есть категории, ищем только по категориям
-        if not items and categories:
-            print("🔄 Fallback: ищу только по категориям")
-            fallback_query = session.query(ClothingItem)
-            category_conditions = []
-            for category in categories:
-                print(f"🔍 Fallback ищет категорию: '{category}'")
-                category_conditions.append(ClothingItem.category.ilike(f"%{category}%"))
-
-            if category_conditions:
-                fallback_query = fallback_query.filter(or_(*category_conditions))
-
-                # Отладка: показываем SQL запрос
-                print(f"🔍 SQL запрос: {fallback_query}")
-
-                items = fallback_query.limit(30).all()
-                print(f"📦 Fallback нашёл {len(items)} товаров")
-
-                # Если всё ещё 0, попробуем совсем простой запрос
-                if not items:
-                    print("🔍 Пробую самый простой запрос...")
-                    simple_query = session.query(ClothingItem).filter(
-                        ClothingItem.category.ilike("%Пиджаки%")
-                    )
-                    simple_items = simple_query.limit(5).all()
-                    print(f"📦 Простой запрос нашёл {len(simple_items)} товаров")
-
-                    # Проверяем общее количество товаров в базе
-                    total_count = session.query(ClothingItem).count()
-                    print(f"📊 Всего товаров в базе: {total_count}")
-
-                    # Проверяем первые 3 товара
-                    first_items = session.query(ClothingItem).limit(3).all()
-                    print(f"📋 Первые товары в базе:")
-                    for i, item in enumerate(first_items, 1):
-                        print(f"   {i}. {item.name} | Категория: '{item.category}'")
-
-                    if simple_items:
-                        items = simple_items
-
         return items
 
     finally:
@@ -573,45 +751,69 @@ def _search_items_by_request(request_info: dict) -> List[ClothingItem]:
 
 
 def find_similar_items(
-    image_path: str,
+    photo,
     top_n: int = 5,
     comment: str = "",
+    check_cancelled=None,
 ) -> List[ClothingItem]:
     """
     Двухэтапная система подбора товаров с двумя AI агентами:
 
     АГЕНТ 1: Анализирует запрос пользователя и формирует поисковый запрос в БД
     АГЕНТ 2: Валидирует найденные товары по фото и выбирает лучшие
+
+    photo — UserPhoto (model/user_photo.py) или путь к файлу. Повтор того же
+    фото с тем же комментарием берётся из кэша подборок (model/result_cache.py).
+    check_cancelled вызывается перед каждым этапом: чтобы прервать подборку
+    (например, просроченную задачу model/jobs.py), он бросает исключение.
     """
+    photo = as_user_photo(photo)
+    return result_cache.get_or_compute(
+        photo.digest,
+        comment,
+        top_n,
+        lambda: _find_similar_items(photo, top_n, comment, check_cancelled),
+    )
+
+
+def _find_similar_items(
+    photo: UserPhoto, top_n: int, comment: str, check_cancelled=None
+) -> Tuple[List[ClothingItem], bool]:
+    """Подборка без кэша: (товары, можно ли их кэшировать)."""
+    check_cancelled = check_cancelled or (lambda: None)
     print(f"🛍️  Двухэтапный AI поиск товаров начался...")
-    print(f"📸 Фото: {image_path}")
+    print(f"📸 Фото: {photo.image.width}x{photo.image.height}, {len(photo.jpeg)} байт")
     print(f"💭 Запрос: '{comment}'")
     print("=" * 50)
 
     # ЭТАП 1: АГЕНТ 1 обрабатывает запрос пользователя
+    check_cancelled()
     print("🔥 ЭТАП 1: Анализ запроса пользователя")
-    search_info = _agent_1_process_request(comment, image_path)
+    search_info = _agent_1_process_request(comment, photo)
     print(f"📋 Определил категории: {search_info['requested_categories']}")
     print(f"🎯 Тип поиска: {search_info['search_type']}")
 
     # Поиск в базе данных на основе результатов АГЕНТА 1
+    check_cancelled()
     candidate_items = _search_items_by_request(search_info)
 
     if not candidate_items:
         print("😞 Товары не найдены")
-        return []
+        return [], not search_info.get("fallback")
 
     print(f"📦 Найдено кандидатов: {len(candidate_items)}")
     print("=" * 50)
 
     # ЭТАП 2: АГЕНТ 2 валидирует товары по фото
+    check_cancelled()
     print("🔥 ЭТАП 2: AI валидация по фото")
     try:
         best_items = _agent_2_validate_items(
-            image_path, candidate_items, comment, search_info
+            photo, candidate_items, comment, search_info
         )
     except Exception as e:
         print(f"⚠️  АГЕНТ 2: Ошибка валидации: {e}")
+        search_info["fallback"] = True
         # Fallback: по одному товару из каждой категории
         categories = {}
         for item in candidate_items:
@@ -629,4 +831,4 @@ def find_similar_items(
         print(f"   {i}. {item.name[:35]}... ({item.price}₽)")
         print(f"      {item.category}")
 
-    return final_items
+    return final_items, not search_info.get("fallback")
@@ -0,0 +1,259 @@
+"""
+Снимок каталога в памяти процесса: компактные записи товаров без картинок
+и описаний вместо ORM-объектов SQLAlchemy.
+
+Загружается целиком при первом обращении; дальше не чаще раза в
+CATALOG_REFRESH_INTERVAL секунд проверяется PRAGMA data_version, и если
+база изменилась — дочитываются только товары из журнала catalog_changes
+(его пишут триггеры, см. catalog_schema.CHANGE_TRIGGERS).
+"""
+import bisect
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+from db import CATALOG_SNAPSHOT_COLUMNS, engine
+
+# Как часто проверять, не изменилась ли база, секунды
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "1.0"))
+# Сколько изменённых товаров дочитывать одним IN (...)
+CATALOG_REFRESH_CHUNK = 500
+
+stats = {"full_loads": 0, "refreshes": 0, "items_refreshed": 0}
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+class CatalogItem:
+    """Товар из снимка: те же атрибуты, что у ClothingItem, без image_blob и description."""
+
+    __slots__ = CATALOG_SNAPSHOT_COLUMNS
+
+    def __init__(self, row):
+        for name, value in zip(CATALOG_SNAPSHOT_COLUMNS, row):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"<CatalogItem {self.id} {self.name!r}>"
+
+
+_SELECT = f"SELECT {', '.join(CATALOG_SNAPSHOT_COLUMNS)} FROM clothing_items"
+
+
+class _Snapshot:
+    def __init__(self, connection):
+        # Отдельное соединение: data_version меняется от коммитов других соединений
+        self.connection = connection
+        self.items = {}
+        self.by_category = {}  # category_id -> список id по возрастанию
+        self.watermark = 0
+        self.data_version = None
+        self.checked_at = 0.0
+
+    def _category_list(self, lists, category_id):
+        """Копия списка id категории для нового снимка (копируется один раз)."""
+        ids = lists.get(category_id)
+        if ids is None:
+            ids = lists[category_id] = list(self.by_category.get(category_id, ()))
+        return ids
+
+    def _put(self, items, lists, item):
+        old = items.get(item.id)
+        if old is not None and old.category_id != item.category_id:
+            self._remove_from_category(lists, old)
+        items[item.id] = item
+        ids = self._category_list(lists, item.category_id)
+        i = bisect.bisect_left(ids, item.id)
+        if i == len(ids) or ids[i] != item.id:
+            ids.insert(i, item.id)
+
+    def _remove_from_category(self, lists, item):
+        ids = self._category_list(lists, item.category_id)
+        i = bisect.bisect_left(ids, item.id)
+        if i < len(ids) and ids[i] == item.id:
+            del ids[i]
+
+    def _remove(self, items, lists, item_id):
+        item = items.pop(item_id, None)
+        if item is not None:
+            self._remove_from_category(lists, item)
+
+    def load(self):
+        started = time.perf_counter()
+        # Журнал читаем до товаров: изменения во время загрузки применятся повторно
+        self.watermark = self._max_seq()
+        self.data_version = self._data_version()
+        for row in self.connection.execute(text(f"{_SELECT} ORDER BY id")):
+            item = CatalogItem(row)
+            self.items[item.id] = item
+            self.by_category.setdefault(item.category_id, []).append(item.id)
+        self.checked_at = time.monotonic()
+        stats["full_loads"] += 1
+        print(
+            f"🗂️  Снимок каталога: {len(self.items)} товаров, "
+            f"{time.perf_counter() - started:.2f} с"
+        )
+
+    def _data_version(self):
+        return self.connection.execute(text("PRAGMA data_version")).scalar()
+
+    def _max_seq(self):
+        # Последний выданный seq, даже если журнал уже обрезан: AUTOINCREMENT
+        # не переиспользует номера, так что пропуск в журнале = обрезка
+        return self.connection.execute(
+            text(
+                "SELECT COALESCE((SELECT seq FROM sqlite_sequence "
+                "WHERE name = 'catalog_changes'), 0)"
+            )
+        ).scalar()
+
+    def refresh(self):
+        """
+        Дочитывает изменённые товары. False — журнал уже обрезан дальше
+        watermark, нужна полная перезагрузка.
+        """
+        self.checked_at = time.monotonic()
+        data_version = self._data_version()
+        if data_version == self.data_version:
+            return True
+        self.data_version = data_version
+
+        first_seq = self.connection.execute(
+            text("SELECT MIN(seq) FROM catalog_changes")
+        ).scalar()
+        if first_seq is not None and first_seq > self.watermark + 1:
+            return False
+        rows = self.connection.execute(
+            text("SELECT seq, item_id FROM catalog_changes WHERE seq > :seq"),
+            {"seq": self.watermark},
+        ).all()
+        if not rows:
+            return True
+        changed = sorted({item_id for _, item_id in rows})
+        select = text(f"{_SELECT} WHERE id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        # Копирование при записи: читатели обходят items и by_category без
+        # блокировки, поэтому изменения собираются в копиях (списки категорий
+        # копируются, только если меняются) и подменяются одной ссылкой
+        items = dict(self.items)
+        lists = {}
+        found = set()
+        for i in range(0, len(changed), CATALOG_REFRESH_CHUNK):
+            chunk = changed[i : i + CATALOG_REFRESH_CHUNK]
+            for row in self.connection.execute(select, {"ids": chunk}):
+                item = CatalogItem(row)
+                found.add(item.id)
+                self._put(items, lists, item)
+        for item_id in changed:
+            if item_id not in found:
+                self._remove(items, lists, item_id)
+        by_category = dict(self.by_category)
+        by_category.update(lists)
+        self.items, self.by_category = items, by_category
+        self.watermark = max(seq for seq, _ in rows)
+        stats["refreshes"] += 1
+        stats["items_refreshed"] += len(changed)
+        return True
+
+
+def get_snapshot():
+    """Текущий снимок каталога (загружается и обновляется по мере обращений)."""
+    global _snapshot
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and time.monotonic() - snapshot.checked_at < CATALOG_REFRESH_INTERVAL
+    ):
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is not None and not _snapshot.refresh():
+            _snapshot.connection.close()
+            _snapshot = None
+        if _snapshot is None:
+            # Без транзакции: открытое чтение держало бы старый снимок WAL
+            connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            snapshot = _Snapshot(connection)
+            snapshot.load()
+            _snapshot = snapshot
+        return _snapshot
+
+
+def catalog_version():
+    """
+    Номер последнего изменения каталога (seq из catalog_changes): растёт,
+    когда парсер добавляет, удаляет или меняет товары.
+    """
+    return get_snapshot().watermark
+
+
+def get_item(item_id):
+    """Товар по id или None."""
+    return get_snapshot().items.get(item_id)
+
+
+def get_items(item_ids):
+    """Товары по списку id в том же порядке; отсутствующие пропускаются."""
+    items = get_snapshot().items
+    return [items[item_id] for item_id in item_ids if item_id in items]
+
+
+def _matches(item, filters):
+    if filters.get("price_min") is not None and (
+        item.price_value is None or item.price_value < filters["price_min"]
+    ):
+        return False
+    if filters.get("price_max") is not None and (
+        item.price_value is None or item.price_value > filters["price_max"]
+    ):
+        return False
+    if filters.get("colors") and item.color not in filters["colors"]:
+        return False
+    return True
+
+
+def category_items(category_id, limit, exclude=(), filters=None):
+    """
+    До limit товаров категории в порядке id (как выдаёт SQLite по индексу):
+    не из exclude и подходящих под filters (см. model/query_filters.py).
+    """
+    snapshot = get_snapshot()
+    items = snapshot.items
+    exclude = set(exclude)
+    result = []
+    for item_id in snapshot.by_category.get(category_id, ()):
+        if item_id in exclude:
+            continue
+        item = items.get(item_id)
+        if item is None or (filters and not _matches(item, filters)):
+            continue
+        result.append(item)
+        if len(result) >= limit:
+            break
+    return result
+
+
+def first_items(limit):
+    items = get_snapshot().items
+    return [items[i] for i in sorted(items)[:limit]]
+
+
+def category_ids_like(names):
+    """
+    {название: id} категорий снимка, в названии которых есть одно из names
+    (без учёта регистра) — для названий, которых нет в справочнике точно.
+    """
+    needles = [name.lower() for name in names if name]
+    snapshot = get_snapshot()
+    items = snapshot.items
+    found = {}
+    for category_id, ids in snapshot.by_category.items():
+        item = items.get(ids[0]) if ids else None
+        if item is None or category_id is None or not item.category:
+            continue
+        if any(needle in item.category.lower() for needle in needles):
+            found[item.category] = category_id
+    return found
@@ -0,0 +1,228 @@
+"""
+Локальный классификатор запроса пользователя перед Агентом 1.
+
+TF-IDF по символьным n-граммам слов + многоклассовая логистическая регрессия
+на NumPy. Классы — пять категорий каталога (конкретный запрос) и
+"complementary" (дополнить образ). Обучается при первом обращении на таблице
+ключевых слов, шаблонных фразах и названиях товаров из каталога.
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from db import ClothingItem, get_db_session
+from model.agent_1_cache import normalize_comment
+
+# Ниже этой уверенности запрос отдаётся в OpenAI
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.7"))
+# Сколько названий товаров каждой категории брать в обучение
+INTENT_MAX_NAMES_PER_CATEGORY = int(os.getenv("INTENT_MAX_NAMES_PER_CATEGORY", "300"))
+
+COMPLEMENTARY = "complementary"
+
+CATEGORY_KEYWORDS = {
+    "Брюки, бриджи и капри женские": [
+        "брюки",
+        "джинсы",
+        "штаны",
+        "легинсы",
+        "капри",
+        "бриджи",
+    ],
+    "Блузы и рубашки женские": ["блузка", "рубашка", "блуза", "сорочка"],
+    "Пиджаки, жакеты и жилеты женские": [
+        "пиджак",
+        "жакет",
+        "жилет",
+        "кардиган",
+        "блейзер",
+    ],
+    "Футболки и топы женские": [
+        "футболка",
+        "футболку",
+        "топ",
+        "майка",
+        "тишка",
+    ],
+    "Юбки женские": ["юбка", "юбку", "мини", "макси"],
+}
+
+_SPECIFIC_TEMPLATES = [
+    "{}",
+    "подбери {}",
+    "найди {}",
+    "хочу {}",
+    "покажи {}",
+    "нужна {}",
+    "нужен {}",
+    "подбери {} к этому образу",
+    "какая {} подойдёт",
+    "{} под этот образ",
+    "подбери {} в тон",
+]
+
+_COMPLEMENTARY_PHRASES = [
+    "что подойдёт к этому образу",
+    "дополни образ",
+    "дополни мой лук",
+    "собери образ",
+    "подбери что-нибудь",
+    "подбери что-то к этому",
+    "с чем это носить",
+    "с чем сочетать",
+    "что надеть с этим",
+    "помоги составить образ",
+    "подбери вещи к образу",
+    "подбери комплект",
+    "что купить к этому",
+    "что будет хорошо смотреться",
+    "сделай образ завершённым",
+    "хочу стильный образ",
+    "образ для офиса",
+    "образ на вечеринку",
+    "лук на свидание",
+    "повседневный образ",
+    "что сюда добавить",
+    "подбери одежду под это фото",
+    "найди похожий стиль",
+    "что посоветуешь",
+]
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def _features(text):
+    """Символьные 2–4-граммы слов (с границами слова) и сами слова."""
+    features = Counter()
+    for word in normalize_comment(text).split():
+        features["w:" + word] += 1
+        padded = f" {word} "
+        for n in (2, 3, 4):
+            for i in range(len(padded) - n + 1):
+                features[padded[i : i + n]] += 1
+    return features
+
+
+def _training_samples():
+    samples = []
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            samples.extend((t.format(keyword), category) for t in _SPECIFIC_TEMPLATES)
+    samples.extend((phrase, COMPLEMENTARY) for phrase in _COMPLEMENTARY_PHRASES)
+
+    session = get_db_session()
+    for category in CATEGORY_KEYWORDS:
+        names = (
+            session.query(ClothingItem.name)
+            .filter(ClothingItem.category == category)
+            .limit(INTENT_MAX_NAMES_PER_CATEGORY)
+            .all()
+        )
+        samples.extend((name, category) for (name,) in names if name)
+    return samples
+
+
+class _Model:
+    def __init__(self, samples, epochs=300, learning_rate=2.0, l2=1e-4):
+        self.classes = list(CATEGORY_KEYWORDS) + [COMPLEMENTARY]
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        docs = [_features(text) for text, _ in samples]
+        labels = np.array([class_index[label] for _, label in samples])
+
+        self.vocab = {}
+        df = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+        for feature in df:
+            self.vocab[feature] = len(self.vocab)
+        self.idf = np.array(
+            [math.log((1 + len(docs)) / (1 + df[f])) + 1 for f in self.vocab],
+            dtype=np.float32,
+        )
+
+        x = np.zeros((len(docs), len(self.vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            idx, vec = self._vectorize(doc)
+            x[row, idx] = vec
+
+        # Классы неравны по объёму (названий товаров много) — взвешиваем обратно частоте
+        counts = np.bincount(labels, minlength=len(self.classes)).astype(np.float32)
+        weights = (len(labels) / (len(self.classes) * np.maximum(counts, 1)))[labels]
+        y = np.eye(len(self.classes), dtype=np.float32)[labels]
+
+        self.w = np.zeros((len(self.vocab), len(self.classes)), dtype=np.float32)
+        self.b = np.zeros(len(self.classes), dtype=np.float32)
+        scale = weights[:, None] / weights.sum()
+        for _ in range(epochs):
+            grad = (self._softmax(x @ self.w + self.b) - y) * scale
+            self.w -= learning_rate * (x.T @ grad + l2 * self.w)
+            self.b -= learning_rate * grad.sum(axis=0)
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def _vectorize(self, features):
+        known = [(self.vocab[f], c) for f, c in features.items() if f in self.vocab]
+        if not known:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        idx = np.array([i for i, _ in known], dtype=np.int64)
+        tf = np.array([c for _, c in known], dtype=np.float32)
+        vec = (1 + np.log(tf)) * self.idf[idx]
+        return idx, vec / np.linalg.norm(vec)
+
+    def predict_proba(self, text):
+        idx, vec = self._vectorize(_features(text))
+        return self._softmax(vec @ self.w[idx] + self.b)
+
+
+def get_model():
+    """Обученная модель (обучается один раз на процесс при первом обращении)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                samples = _training_samples()
+                _model = _Model(samples)
+                print(
+                    f"🧮 Классификатор запросов обучен: {len(samples)} примеров, "
+                    f"{len(_model.vocab)} признаков, "
+                    f"{time.perf_counter() - started:.2f} с"
+                )
+    return _model
+
+
+def classify(comment: str) -> dict:
+    """
+    Разбирает комментарий локально. Возвращает словарь в формате ответа
+    Агента 1 (categories, keywords, search_type, reasoning) и confidence.
+    """
+    keywords = normalize_comment(comment).split()
+    if not keywords:
+        # Без текста запрос может быть только комплементарным
+        label, confidence = COMPLEMENTARY, 1.0
+    else:
+        model = get_model()
+        proba = model.predict_proba(comment)
+        best = int(proba.argmax())
+        label, confidence = model.classes[best], float(proba[best])
+
+    if label == COMPLEMENTARY:
+        categories, search_type = list(CATEGORY_KEYWORDS), "complementary"
+    else:
+        categories, search_type = [label], "specific"
+    return {
+        "categories": categories,
+        "keywords": keywords,
+        "search_type": search_type,
+        "reasoning": f"Локальный классификатор, уверенность {confidence:.2f}",
+        "confidence": confidence,
+    }
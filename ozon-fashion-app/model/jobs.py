@@ -0,0 +1,249 @@
+"""
+Очередь подборок: POST на главную только ставит задачу и сразу отвечает,
+find_similar_items выполняют JOB_WORKERS фоновых потоков. Страница узнаёт
+результат по SSE (/jobs/<id>/events) или опросом (/jobs/<id>).
+
+Очередь ограничена JOB_QUEUE_LIMIT задачами; задача, не завершившаяся за
+JOB_TIMEOUT секунд с постановки, считается просроченной и прерывается на
+следующем этапе подборки; готовые результаты хранятся JOB_RESULT_TTL секунд.
+"""
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+
+from db import find_similar_items, remove_db_session
+from model import catalog
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "32"))
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "120"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "600"))
+# SSE-соединение занимает поток веб-сервера: через столько секунд сервер его
+# закрывает, и EventSource переподключается сам
+JOB_EVENTS_MAX_DURATION = 25
+JOB_EVENTS_KEEPALIVE = 10
+
+QUEUED, RUNNING, DONE, FAILED, TIMEOUT = "queued", "running", "done", "failed", "timeout"
+FINISHED = (DONE, FAILED, TIMEOUT)
+
+stats = {
+    "submitted": 0,
+    "rejected": 0,
+    "done": 0,
+    "failed": 0,
+    "timeout": 0,
+    "cancelled": 0,
+}
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+# Будит ждущих (SSE) при любом изменении статуса
+_changed = threading.Condition(_jobs_lock)
+_queue = queue.Queue(maxsize=JOB_QUEUE_LIMIT)
+_workers = []
+
+
+class QueueFull(Exception):
+    """Очередь подборок заполнена — клиенту стоит повторить позже."""
+
+
+class Cancelled(Exception):
+    """Задача просрочена — подборка прерывается между этапами."""
+
+
+class Job:
+    """Подборка для одного фото: статус, id найденных товаров или ошибка."""
+
+    __slots__ = (
+        "id", "photo", "comment", "photo_url", "status", "item_ids", "error",
+        "created_at", "finished_at",
+    )
+
+    def __init__(self, photo, comment, photo_url):
+        self.id = secrets.token_urlsafe(12)
+        self.photo = photo  # освобождается после выполнения
+        self.comment = comment
+        self.photo_url = photo_url
+        self.status = QUEUED
+        self.item_ids = []
+        self.error = None
+        self.created_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def items(self):
+        return catalog.get_items(self.item_ids)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "items": [
+                {
+                    "id": item.id,
+                    "name": item.name,
+                    "price": item.price,
+                    "category": item.category,
+                    "url": item.url,
+                    "image_url": item.image_url,
+                }
+                for item in self.items
+            ],
+        }
+
+
+def _finish(job, status, item_ids=(), error=None):
+    """Под _jobs_lock: первый завершивший (поток или таймаут) определяет итог."""
+    if job.status in FINISHED:
+        return
+    job.status = status
+    job.item_ids = list(item_ids)
+    job.error = error
+    job.photo = None
+    job.finished_at = time.monotonic()
+    stats[status] += 1
+    _changed.notify_all()
+
+
+def _sweep():
+    """Под _jobs_lock: просрочка незавершённых задач и удаление старых результатов."""
+    now = time.monotonic()
+    for job_id, job in list(_jobs.items()):
+        if job.status in FINISHED:
+            if now - job.finished_at > JOB_RESULT_TTL:
+                del _jobs[job_id]
+        elif now - job.created_at > JOB_TIMEOUT:
+            _finish(job, TIMEOUT, error="Подборка не успела за отведённое время")
+
+
+def _expired(job):
+    return job.status in FINISHED or time.monotonic() - job.created_at > JOB_TIMEOUT
+
+
+def _find_items(job, photo):
+    def check_cancelled():
+        if _expired(job):
+            raise Cancelled(job.id)
+
+    while True:
+        try:
+            return find_similar_items(
+                photo, comment=job.comment, check_cancelled=check_cancelled
+            )
+        except Cancelled:
+            if _expired(job):
+                raise
+            # Прервана чужая подборка того же фото, результата которой ждала
+            # эта задача (model/result_cache.py), — считаем заново
+
+
+def _worker_loop():
+    while True:
+        job = _queue.get()
+        with _jobs_lock:
+            _sweep()
+            if job.status != QUEUED:  # просрочена, пока ждала в очереди
+                continue
+            job.status = RUNNING
+            photo = job.photo
+            _changed.notify_all()
+        try:
+            items = _find_items(job, photo)
+            with _jobs_lock:
+                # Поздний результат не перезаписывает TIMEOUT (см. _finish)
+                _finish(job, DONE, item_ids=[item.id for item in items])
+        except Cancelled:
+            print(f"⏹️  Подборка {job.id} прервана: время вышло")
+            with _jobs_lock:
+                stats["cancelled"] += 1
+                _sweep()
+        except Exception as e:
+            print(f"❌ Подборка {job.id} не удалась: {e}")
+            with _jobs_lock:
+                _finish(job, FAILED, error="Не удалось подобрать товары")
+        finally:
+            # Сессия БД привязана к потоку — закрываем её после задачи
+            remove_db_session()
+
+
+def start():
+    """Запускает JOB_WORKERS фоновых потоков (один раз на процесс)."""
+    with _jobs_lock:
+        while len(_workers) < JOB_WORKERS:
+            worker = threading.Thread(
+                target=_worker_loop, name=f"job-worker-{len(_workers)}", daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+
+
+def submit(photo, comment, photo_url) -> Job:
+    """Ставит подборку в очередь. Очередь заполнена — QueueFull."""
+    job = Job(photo, comment, photo_url)
+    with _jobs_lock:
+        _sweep()
+        try:
+            _queue.put_nowait(job)
+        except queue.Full:
+            stats["rejected"] += 1
+            raise QueueFull() from None
+        _jobs[job.id] = job
+        stats["submitted"] += 1
+    return job
+
+
+def get(job_id):
+    """Задача по id или None, если её нет или результат уже удалён."""
+    with _jobs_lock:
+        _sweep()
+        return _jobs.get(job_id)
+
+
+def queue_depth():
+    return _queue.qsize()
+
+
+def event_stream(job_id):
+    """
+    Server-sent events для страницы: событие status при каждом изменении
+    статуса (последнее — с товарами), gone — задачи нет.
+    """
+    deadline = time.monotonic() + JOB_EVENTS_MAX_DURATION
+    last_status = None
+    yield "retry: 1000\n\n"
+    while True:
+        with _jobs_lock:
+            _sweep()
+            job = _jobs.get(job_id)
+            if job is not None and job.status == last_status:
+                now = time.monotonic()
+                # Просыпаемся и к сроку задачи, чтобы сообщить о таймауте
+                _changed.wait(
+                    max(
+                        0.0,
+                        min(
+                            JOB_EVENTS_KEEPALIVE,
+                            deadline - now,
+                            job.created_at + JOB_TIMEOUT - now + 0.01,
+                        ),
+                    )
+                )
+                _sweep()
+                job = _jobs.get(job_id)
+        if job is None:
+            yield "event: gone\ndata: {}\n\n"
+            return
+        if job.status != last_status:
+            last_status = job.status
+            data = json.dumps(job.to_dict(), ensure_ascii=False)
+            yield f"event: status\ndata: {data}\n\n"
+            if last_status in FINISHED:
+                return
+        else:
+            yield ": keepalive\n\n"
+        if time.monotonic() >= deadline:
+            return
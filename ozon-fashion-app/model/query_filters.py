@@ -0,0 +1,112 @@
+"""
+Фасетные фильтры из текста запроса: цена («до 3000₽», «от 1 000 до 2 500»,
+«не дороже 2к», «не меньше 1000») и цвет («чёрную юбку»).
+
+Цвета — названия палитры, которой парсер размечает товары по картинке
+(ozon-parser/src/utils/colors.py); фильтры применяются в поиске кандидатов.
+"""
+import re
+
+from model.agent_1_cache import normalize_comment
+
+# Основа прилагательного -> название цвета в палитре парсера
+COLOR_STEMS = {
+    "черн": "черный",
+    "бел": "белый",
+    "сер": "серый",
+    "бежев": "бежевый",
+    "коричнев": "коричневый",
+    "красн": "красный",
+    "розов": "розовый",
+    "оранжев": "оранжевый",
+    "желт": "желтый",
+    "зелен": "зеленый",
+    "голуб": "голубой",
+    "син": "синий",
+    "фиолетов": "фиолетовый",
+}
+_ADJECTIVE_ENDINGS = set(
+    "ый ий ой ая яя ое ее ые ие ую юю ого его ому ему ым им ыми ими ых их ом ем".split()
+)
+
+# Слова вокруг цены — в полнотекстовый поиск не идут
+PRICE_WORDS = {
+    "от",
+    "до",
+    "дешевле",
+    "дороже",
+    "не",
+    "больше",
+    "меньше",
+    "выше",
+    "ниже",
+    "руб",
+    "рубль",
+    "рубля",
+    "рублей",
+    "р",
+    "тыс",
+    "к",
+}
+
+_NUMBER = r"(\d{1,3}(?:[  ]\d{3})+|\d+)\s*(к|тыс\w*)?\.?\s*(?:₽|руб\w*|р\b)?"
+_RANGE_RE = re.compile(rf"\bот\s+{_NUMBER}\s*до\s+{_NUMBER}")
+# С «не» слово меняет смысл: «не меньше 1000» — нижняя граница, «не дороже» — верхняя
+_MAX_RE = re.compile(
+    rf"\b(?:до|в\s+пределах|не\s+(?:дороже|больше|выше)|(?<!не\s)(?:дешевле|меньше|ниже))"
+    rf"\s+{_NUMBER}"
+)
+_MIN_RE = re.compile(
+    rf"\b(?:от|не\s+(?:дешевле|меньше|ниже)|(?<!не\s)(?:дороже|больше|выше))\s+{_NUMBER}"
+)
+
+
+def _amount(digits, suffix):
+    value = float(re.sub(r"\D", "", digits))
+    return value * 1000 if suffix else value
+
+
+def color_of(word):
+    """Название цвета палитры для слова запроса или None."""
+    word = word.lower().replace("ё", "е")
+    for stem, color in COLOR_STEMS.items():
+        if word.startswith(stem) and word[len(stem) :] in _ADJECTIVE_ENDINGS:
+            return color
+    return None
+
+
+def is_filter_word(word):
+    """Слово задаёт фильтр (цвет, цена), а не ищется по тексту товара."""
+    word = word.lower()
+    return word.isdigit() or word in PRICE_WORDS or color_of(word) is not None
+
+
+def parse_query_filters(comment):
+    """
+    Разбирает комментарий пользователя в фильтры: price_min / price_max
+    (рубли, float) и colors (список названий палитры). В словаре только
+    найденные фильтры — пустой словарь означает «без фильтров».
+    """
+    text = (comment or "").lower().replace("ё", "е")
+    filters = {}
+
+    match = _RANGE_RE.search(text)
+    if match:
+        low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+        filters["price_min"], filters["price_max"] = min(low, high), max(low, high)
+    else:
+        match = _MAX_RE.search(text)
+        if match:
+            filters["price_max"] = _amount(*match.group(1, 2))
+        match = _MIN_RE.search(text)
+        if match:
+            filters["price_min"] = _amount(*match.group(1, 2))
+
+    colors = []
+    for word in normalize_comment(text).split():
+        color = color_of(word)
+        if color and color not in colors:
+            colors.append(color)
+    if colors:
+        filters["colors"] = colors
+    return filters
@@ -0,0 +1,84 @@
+"""
+Кэш готовых подборок find_similar_items: одинаковое фото (sha256 подготовленного
+JPEG, см. model/user_photo.py), тот же комментарий и top_n отдают прежний
+результат без агентов.
+
+Хранятся только id товаров, сами товары берутся из снимка каталога.
+Записи вытесняются по LRU и TTL и устаревают, как только парсер что-то
+поменял в каталоге (номер последнего изменения в catalog_changes).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from model import catalog
+from model.agent_1_cache import normalize_comment
+from model.single_flight import SingleFlight
+
+# Сколько живёт подборка (секунды) и сколько подборок держать в памяти
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+
+# stale — запись была, но истёк TTL или каталог изменился;
+# uncached — результат после ошибки OpenAI, в кэш не кладём
+stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "uncached": 0}
+
+_lru = OrderedDict()  # ключ -> (версия каталога, время записи, id товаров)
+_lru_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def _lru_get(key, version):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        entry_version, created_at, item_ids = entry
+        if entry_version != version or time.monotonic() - created_at > RESULT_CACHE_TTL:
+            del _lru[key]
+            stats["stale"] += 1
+            return None
+        _lru.move_to_end(key)
+        return item_ids
+
+
+def _lru_put(key, version, item_ids):
+    with _lru_lock:
+        _lru[key] = (version, time.monotonic(), item_ids)
+        _lru.move_to_end(key)
+        while len(_lru) > RESULT_CACHE_MAX_ENTRIES:
+            _lru.popitem(last=False)
+
+
+def get_or_compute(photo_digest, comment, top_n, compute):
+    """
+    Подборка товаров для фото и комментария.
+
+    compute() возвращает (товары, можно ли их кэшировать). Одинаковые
+    одновременные запросы ждут один вызов compute; исключения compute
+    пробрасываются всем ждущим и в кэш не попадают.
+    """
+    key = (photo_digest, normalize_comment(comment), top_n)
+    version = catalog.catalog_version()
+    item_ids = _lru_get(key, version)
+    if item_ids is not None:
+        stats["hits"] += 1
+        print(f"⚡ Подборка из кэша ({stats})")
+        return catalog.get_items(item_ids)
+
+    def compute_and_store():
+        stats["misses"] += 1
+        items, cacheable = compute()
+        item_ids = [item.id for item in items]
+        if cacheable:
+            _lru_put(key, version, item_ids)
+        else:
+            stats["uncached"] += 1
+        return items, item_ids
+
+    (items, item_ids), leader = _flights.do(key, compute_and_store)
+    if leader:
+        return items
+    stats["coalesced"] += 1
+    return catalog.get_items(item_ids)
@@ -0,0 +1,50 @@
+"""
+Схлопывание одинаковых одновременных вычислений: первый поток с данным
+ключом вызывает compute, остальные ждут его результата (или исключения).
+Используется кэшами model/agent_1_cache.py и model/result_cache.py.
+"""
+import threading
+
+
+class _Flight:
+    """Вычисление, которое уже выполняется в другом потоке."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute):
+        """
+        (результат compute(), leader): leader — compute вызвал этот поток,
+        иначе результат получен от потока, начавшего раньше. Исключение
+        compute пробрасывается и вызвавшему, и всем ждущим.
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, False
+
+        try:
+            flight.result = compute()
+            return flight.result, True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
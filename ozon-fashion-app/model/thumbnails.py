@@ -0,0 +1,126 @@
+import base64
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from PIL import Image
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import ImageThumbnail, get_db_session, get_item_image_bytes
+
+# Превью под low detail vision-модели: картинка вписывается в 512x512
+THUMBNAIL_SIDE = int(os.getenv("THUMBNAIL_SIDE", "512"))
+THUMBNAIL_JPEG_QUALITY = 80
+# Сколько превью держать в памяти процесса (LRU)
+THUMBNAIL_LRU_SIZE = int(os.getenv("THUMBNAIL_LRU_SIZE", "2048"))
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+# as_is — сохранённая парсером картинка уже не больше превью и отправляется как есть
+stats = {"memory_hits": 0, "db_hits": 0, "as_is": 0, "built": 0, "downloaded": 0}
+
+
+def make_thumbnail_base64(data: bytes) -> str:
+    """Уменьшает картинку до THUMBNAIL_SIDE и кодирует JPEG в base64."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        img = img.convert("RGB")
+        img.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=THUMBNAIL_JPEG_QUALITY)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _fits_thumbnail(data: bytes) -> bool:
+    """JPEG RGB не больше THUMBNAIL_SIDE — годится в превью без перекодирования."""
+    with Image.open(io.BytesIO(data)) as img:
+        return img.format == "JPEG" and img.mode == "RGB" and max(img.size) <= THUMBNAIL_SIDE
+
+
+def _lru_get(key):
+    with _lru_lock:
+        value = _lru.get(key)
+        if value is not None:
+            _lru.move_to_end(key)
+        return value
+
+
+def _lru_put(key, value):
+    with _lru_lock:
+        _lru[key] = value
+        _lru.move_to_end(key)
+        while len(_lru) > THUMBNAIL_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _load_from_db(image_hash):
+    session = get_db_session()
+    return (
+        session.query(ImageThumbnail.jpeg_base64)
+        .filter_by(image_hash=image_hash)
+        .scalar()
+    )
+
+
+def _save_to_db(image_hash, thumbnail):
+    session = get_db_session()
+    try:
+        stmt = sqlite_insert(ImageThumbnail.__table__).on_conflict_do_nothing(
+            index_elements=["image_hash"]
+        )
+        session.execute(stmt, {"image_hash": image_hash, "jpeg_base64": thumbnail})
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"⚠️  Не удалось сохранить превью {image_hash[:12]}: {e}")
+
+
+def get_thumbnail_base64(item):
+    """
+    Превью товара для Агента 2 без сетевых запросов и перекодирования в горячем пути.
+
+    Порядок: LRU в памяти -> таблица image_thumbnails -> картинка, сохранённая
+    парсером (как есть, если она не больше превью, иначе уменьшенная с записью
+    в таблицу) -> скачивание по image_url. Возвращает base64 JPEG или None.
+    """
+    key = item.image_hash or f"item:{item.id}"
+    thumbnail = _lru_get(key)
+    if thumbnail:
+        stats["memory_hits"] += 1
+        return thumbnail
+
+    if item.image_hash:
+        thumbnail = _load_from_db(item.image_hash)
+        if thumbnail:
+            stats["db_hits"] += 1
+            _lru_put(key, thumbnail)
+            return thumbnail
+
+    as_is = False
+    try:
+        data = get_item_image_bytes(item)
+        if data:
+            as_is = _fits_thumbnail(data)
+            stats["as_is" if as_is else "built"] += 1
+        elif item.image_url:
+            response = requests.get(item.image_url, timeout=10)
+            response.raise_for_status()
+            data = response.content
+            stats["downloaded"] += 1
+        else:
+            return None
+        if as_is:
+            thumbnail = base64.b64encode(data).decode("utf-8")
+        else:
+            thumbnail = make_thumbnail_base64(data)
+    except Exception as e:
+        print(f"         ❌ Ошибка подготовки превью: {e}")
+        return None
+
+    # Картинка и так лежит в clothing_images — копию в image_thumbnails не пишем
+    if item.image_hash and not as_is:
+        _save_to_db(item.image_hash, thumbnail)
+    _lru_put(key, thumbnail)
+    return thumbnail
@@ -0,0 +1,131 @@
+"""
+Хранилище фото пользователей: файл называется sha256 своего содержимого
+(подготовленного JPEG, см. model/user_photo.py) и лежит в подкаталоге по
+первым двум символам хэша — ab/ab12...ef.jpg.
+
+Одинаковые загрузки хранятся один раз и не перезаписывают чужие, а
+содержимое по имени никогда не меняется, поэтому браузер и прокси могут
+кэшировать его навсегда. Фоновая уборка удаляет файлы старше UPLOAD_MAX_AGE
+и самые старые сверх UPLOAD_MAX_BYTES; файлы в корне каталога не трогает.
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "static/uploads")
+# Сколько хранить фото с последней загрузки (секунды) и сколько всего байт
+UPLOAD_MAX_AGE = int(os.getenv("UPLOAD_MAX_AGE", str(24 * 3600)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_GC_INTERVAL = int(os.getenv("UPLOAD_GC_INTERVAL", "600"))
+
+stats = {"saved": 0, "reused": 0, "gc_runs": 0, "gc_removed": 0, "stored_bytes": 0}
+
+_NAME_RE = re.compile(r"^([0-9a-f]{2})/(\1[0-9a-f]{62})\.jpg$")
+_gc_thread = None
+_gc_lock = threading.Lock()
+
+
+def name_for(digest: str) -> str:
+    return f"{digest[:2]}/{digest}.jpg"
+
+
+def save(photo) -> str:
+    """Сохраняет JPEG фото (если такого ещё нет) и возвращает его имя в хранилище."""
+    name = name_for(photo.digest)
+    path = os.path.join(UPLOAD_FOLDER, name)
+    try:
+        # Повторная загрузка продлевает жизнь файлу
+        os.utime(path)
+        stats["reused"] += 1
+        return name
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Через временный файл: параллельный запрос не увидит недописанный JPEG
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(photo.jpeg)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    stats["saved"] += 1
+    return name
+
+
+def resolve(name: str):
+    """(путь к файлу, ETag) для имени из хранилища или None, если имя чужое."""
+    match = _NAME_RE.match(name)
+    if match is None:
+        return None
+    return os.path.join(UPLOAD_FOLDER, name), match.group(2)
+
+
+def collect_garbage(now=None):
+    """Удаляет просроченные файлы, затем самые старые сверх лимита размера."""
+    now = time.time() if now is None else now
+    files, total, removed = [], 0, 0
+    with os.scandir(UPLOAD_FOLDER) as shards:
+        for shard in shards:
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    # Недописанные .tmp старше часа — от упавшего процесса
+                    expired = now - info.st_mtime > (
+                        3600 if entry.name.endswith(".tmp") else UPLOAD_MAX_AGE
+                    )
+                    if expired:
+                        removed += _unlink(entry.path)
+                    else:
+                        files.append((info.st_mtime, info.st_size, entry.path))
+                        total += info.st_size
+    if total > UPLOAD_MAX_BYTES:
+        files.sort()
+        for _, size, path in files:
+            if total <= UPLOAD_MAX_BYTES:
+                break
+            removed += _unlink(path)
+            total -= size
+    stats["gc_runs"] += 1
+    stats["gc_removed"] += removed
+    stats["stored_bytes"] = total
+    return removed
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+def _gc_loop():
+    while True:
+        try:
+            removed = collect_garbage()
+            if removed:
+                print(f"🧹 Уборка загрузок: удалено {removed}, занято {stats['stored_bytes']} байт")
+        except OSError as e:
+            print(f"⚠️  Уборка загрузок не удалась: {e}")
+        time.sleep(UPLOAD_GC_INTERVAL)
+
+
+def start_gc():
+    """Запускает фоновую уборку (один поток на процесс)."""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is None:
+            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+            _gc_thread = threading.Thread(target=_gc_loop, name="upload-gc", daemon=True)
+            _gc_thread.start()
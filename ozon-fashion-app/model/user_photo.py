@@ -0,0 +1,100 @@
+"""
+Фото пользователя, подготовленное один раз на запрос.
+
+Загрузка декодируется прямо из потока запроса (JPEG — сразу в уменьшенном
+масштабе через draft), уменьшается до размера, который vision-модель всё
+равно использует, и один раз кодируется в JPEG. Эти байты общие для превью
+на странице, ключа кэша подборок и обоих агентов — файл с диска больше не
+перечитывается.
+"""
+import base64
+import hashlib
+import io
+import os
+
+from PIL import ExifTags, Image
+
+# OpenAI в режиме high detail вписывает фото в 2048x2048 и уменьшает
+# короткую сторону до 768 — больше отправлять бессмысленно
+USER_PHOTO_SIDE = int(os.getenv("USER_PHOTO_SIDE", "768"))
+USER_PHOTO_MAX_SIDE = 2048
+USER_PHOTO_JPEG_QUALITY = 85
+# Насколько фото может оказаться меньше целевого размера: 4000x3000 декодируется
+# в 1/4 (1000x750) без отдельного уменьшения вместо 1/2 и дорогого resize
+USER_PHOTO_SIZE_SLACK = 0.9
+
+# EXIF Orientation -> поворот (телефоны пишут кадр «боком» и ставят этот тег)
+_ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class UserPhoto:
+    """Готовый JPEG, уменьшенная картинка PIL и sha256 этих байтов."""
+
+    __slots__ = ("jpeg", "image", "digest", "_base64")
+
+    def __init__(self, jpeg, image):
+        self.jpeg = jpeg
+        self.image = image
+        self.digest = hashlib.sha256(jpeg).hexdigest()
+        self._base64 = None
+
+    @property
+    def base64(self):
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.jpeg).decode("utf-8")
+        return self._base64
+
+
+def _target_size(width, height):
+    scale = min(
+        1.0,
+        USER_PHOTO_SIDE / min(width, height),
+        USER_PHOTO_MAX_SIDE / max(width, height),
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare(stream) -> UserPhoto:
+    """
+    Декодирует фото из файлового объекта. Не картинка — OSError от PIL,
+    картинка больше Image.MAX_IMAGE_PIXELS (защита от «бомб») — ValueError.
+    """
+    try:
+        img = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise ValueError(str(e)) from e
+    with img:
+        orientation = img.getexif().get(ExifTags.Base.Orientation)
+        size = _target_size(*img.size)
+        # JPEG декодируется сразу в 1/2, 1/4 или 1/8 размера, не меньше запрошенного
+        img.draft(
+            "RGB",
+            (int(size[0] * USER_PHOTO_SIZE_SLACK), int(size[1] * USER_PHOTO_SIZE_SLACK)),
+        )
+        image = img.convert("RGB")
+    if image.width > size[0]:
+        image = image.resize(size, Image.BICUBIC, reducing_gap=3.0)
+    if orientation in _ORIENTATION:
+        image = image.transpose(_ORIENTATION[orientation])
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=USER_PHOTO_JPEG_QUALITY)
+    return UserPhoto(buffer.getvalue(), image)
+
+
+def prepare_file(path: str) -> UserPhoto:
+    with open(path, "rb") as f:
+        return prepare(f)
+
+
+def as_user_photo(photo) -> UserPhoto:
+    """UserPhoto как есть, путь к файлу — подготовить (скрипты и бенчмарки)."""
+    return photo if isinstance(photo, UserPhoto) else prepare_file(photo)
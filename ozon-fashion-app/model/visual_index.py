@@ -0,0 +1,127 @@
+"""
+Визуальное предварительное ранжирование кандидатов Агента 2.
+
+Векторы картинок каталога (парсер считает их при обходе, таблица
+image_features) держатся в памяти одной матрицей float32; фото пользователя
+сравнивается со всеми кандидатами одним матричным умножением, и в OpenAI
+уходят самые похожие товары, а не выбранные по позиции в выдаче.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import text
+
+from db import get_db_session
+from visual_features import FEATURE_DIM, FEATURE_SAMPLE_SIDE, image_features
+
+# Как часто перечитывать векторы из базы (новые товары от парсера), секунды
+VISUAL_INDEX_TTL = int(os.getenv("VISUAL_INDEX_TTL", "300"))
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def image_path_features(image_path):
+    with Image.open(image_path) as img:
+        img.draft("RGB", (FEATURE_SAMPLE_SIDE * 4, FEATURE_SAMPLE_SIDE * 4))
+        return image_features(img)
+
+
+class _Index:
+    """id товаров (по возрастанию) и матрица их векторов построчно."""
+
+    def __init__(self, ids, matrix):
+        self.ids = ids
+        self.matrix = matrix
+        self.loaded_at = time.monotonic()
+
+    def rows(self, item_ids):
+        """Номера строк для item_ids (-1, если вектора нет)."""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(item_ids), -1)
+        pos = np.minimum(np.searchsorted(self.ids, item_ids), len(self.ids) - 1)
+        return np.where(self.ids[pos] == item_ids, pos, -1)
+
+
+def _load():
+    started = time.perf_counter()
+    rows = get_db_session().execute(
+        text(
+            "SELECT clothing_items.id, image_features.vector FROM clothing_items "
+            "JOIN image_features ON image_features.image_hash = clothing_items.image_hash "
+            "ORDER BY clothing_items.id"
+        )
+    ).all()
+    skipped = sum(1 for _, vector in rows if len(vector) != FEATURE_DIM * 2)
+    if skipped:
+        # Векторы посчитаны другой версией visual_features.py у парсера
+        print(
+            f"⚠️  Визуальный индекс: {skipped} векторов не длины {FEATURE_DIM} пропущено, "
+            f"пересчитайте их (build_features.py --rebuild)"
+        )
+    rows = [(item_id, vector) for item_id, vector in rows if len(vector) == FEATURE_DIM * 2]
+    ids = np.array([item_id for item_id, _ in rows], dtype=np.int64)
+    matrix = (
+        np.frombuffer(b"".join(vector for _, vector in rows), dtype=np.float16)
+        .reshape(len(rows), FEATURE_DIM)
+        .astype(np.float32)
+    )
+    print(
+        f"🖼️  Визуальный индекс: {len(rows)} векторов, "
+        f"{time.perf_counter() - started:.2f} с"
+    )
+    return _Index(ids, matrix)
+
+
+def get_index():
+    """Матрица векторов каталога; перечитывается раз в VISUAL_INDEX_TTL секунд."""
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.loaded_at > VISUAL_INDEX_TTL:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index.loaded_at > VISUAL_INDEX_TTL:
+                _index = _load()
+            index = _index
+    return index
+
+
+def top_k(query_vector, k, item_ids=None):
+    """
+    [(id товара, сходство)] k самых похожих на query_vector по убыванию —
+    по всему каталогу или только среди item_ids.
+    """
+    index = get_index()
+    if item_ids is None:
+        ids, matrix = index.ids, index.matrix
+    else:
+        rows = index.rows(item_ids)
+        rows = rows[rows >= 0]
+        ids, matrix = index.ids[rows], index.matrix[rows]
+    if not len(ids):
+        return []
+    scores = matrix @ query_vector
+    k = min(k, len(ids))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(ids[i]), float(scores[i])) for i in best]
+
+
+def rank_items(query_vector, items, k):
+    """
+    k товаров из items, самых похожих на фото; товары без вектора добавляются
+    в конце в исходном порядке (релевантность текстовому запросу).
+    Если векторов нет ни у одного товара, items возвращаются как есть.
+    """
+    ranked = top_k(query_vector, k, [item.id for item in items])
+    if not ranked:
+        return list(items)
+    items_by_id = {item.id: item for item in items}
+    result = [items_by_id[item_id] for item_id, _ in ranked]
+    if len(result) < k:
+        chosen = {item.id for item in result}
+        result.extend(item for item in items if item.id not in chosen)
+    return result[:k]
@@ -0,0 +1,61 @@
+"""
+Компактный визуальный вектор картинки для предварительного ранжирования
+кандидатов Агента 2, общий для приложения и парсера (ozon-parser/src/utils/
+visual_features.py импортирует этот модуль): парсер сохраняет векторы
+каталога, приложение сравнивает с ними фото пользователя, поэтому функция
+одна. При её изменении векторы пересчитываются (build_features.py --rebuild).
+Параметры не настраиваются через окружение по той же причине.
+"""
+import numpy as np
+from PIL import Image
+
+FEATURE_SAMPLE_SIDE = 32
+FEATURE_BINS = 4  # по каждому каналу RGB -> 4^3 = 64 корзины цвета
+FEATURE_LAYOUT_SIDE = 8  # яркость 8x8 — силуэт и расположение
+FEATURE_DIM = FEATURE_BINS**3 + FEATURE_LAYOUT_SIDE**2
+# Вклад гистограммы цвета против силуэта
+FEATURE_COLOR_WEIGHT = 0.8
+# Как в utils/colors.py: насколько пиксель должен отличаться от фона
+BACKGROUND_TOLERANCE = 60
+
+
+def image_features(img):
+    """
+    Вектор float32 длины FEATURE_DIM с единичной нормой (сходство — скалярное
+    произведение): корни долей пикселей товара в корзинах RGB (фон по рамке
+    отбрасывается) и центрированная яркость 8x8.
+    """
+    small = img.convert("RGB").resize(
+        (FEATURE_SAMPLE_SIDE, FEATURE_SAMPLE_SIDE), Image.BILINEAR
+    )
+    pixels = np.asarray(small, dtype=np.int32)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+
+    flat = pixels.reshape(-1, 3)
+    foreground = np.abs(flat - background).sum(axis=1) > BACKGROUND_TOLERANCE
+    if foreground.mean() > 0.05:
+        flat = flat[foreground]
+    quantized = flat * FEATURE_BINS // 256
+    bins = (quantized[:, 0] * FEATURE_BINS + quantized[:, 1]) * FEATURE_BINS + quantized[:, 2]
+    hist = np.bincount(bins, minlength=FEATURE_BINS**3).astype(np.float32)
+    hist = np.sqrt(hist / hist.sum())
+
+    layout = np.asarray(
+        small.convert("L").resize(
+            (FEATURE_LAYOUT_SIDE, FEATURE_LAYOUT_SIDE), Image.BILINEAR
+        ),
+        dtype=np.float32,
+    ).ravel()
+    layout -= layout.mean()
+    layout /= np.linalg.norm(layout) or 1.0
+
+    vector = np.concatenate(
+        [hist * FEATURE_COLOR_WEIGHT, layout * (1 - FEATURE_COLOR_WEIGHT)]
+    )
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def features_to_bytes(vector):
+    """Вектор для хранения в image_features: float16, 2 байта на компоненту."""
+    return np.asarray(vector, dtype=np.float16).tobytes()
@@ -0,0 +1,60 @@
+"""
+Бенчмарк записи товаров в БД: по одному vs save_clothing_items().
+
+Запуск: python benchmarks/bench_batch_ingest.py [кол-во товаров]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+import db  # noqa: E402
+
+
+def _make_rows(n, prefix):
+    return [
+        {
+            "name": f"Товар {i}",
+            "price": float(1000 + i),
+            "description": " ",
+            "url": f"https://www.ozon.ru/product/{prefix}-{i}/?at=token{i}",
+            "image_url": f"https://ir.ozone.ru/s3/multimedia/wc500/{i}.jpg",
+            "image_blob": "x" * 2048,
+            "category": "Юбки женские",
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    start = time.perf_counter()
+    for row in _make_rows(n, "single"):
+        db.save_clothing_item(**row)
+    single = time.perf_counter() - start
+    print(f"По одному:         {n / single:10.0f} строк/с")
+
+    start = time.perf_counter()
+    stats = db.save_clothing_items(_make_rows(n, "batch"))
+    batch = time.perf_counter() - start
+    print(f"Пачкой (вставка):  {n / batch:10.0f} строк/с  {stats}")
+
+    start = time.perf_counter()
+    stats = db.save_clothing_items(_make_rows(n, "batch"))
+    recrawl = time.perf_counter() - start
+    print(f"Пачкой (повтор):   {n / recrawl:10.0f} строк/с  {stats}")
+
+    db.engine.dispose()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
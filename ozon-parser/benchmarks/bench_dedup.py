@@ -0,0 +1,118 @@
+"""
+Бенчмарк поиска почти одинаковых картинок по dHash: проход дедупликации
+(каждый хэш ищется среди канонических и либо связывается, либо добавляется)
+на HammingIndex против полного перебора на NumPy.
+
+Хэши синтетические: смещённые биты (белый фон даёт много одинаковых бит,
+это худший случай для индекса) и 10% дублей — копии ранних хэшей с
+несколькими перевёрнутыми битами.
+Запуск: python benchmarks/bench_dedup.py [макс. хэшей]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from utils.perceptual_hash import (  # noqa: E402
+    DUPLICATE_MAX_DISTANCE,
+    HASH_BITS,
+    HammingIndex,
+)
+
+DUPLICATE_SHARE = 0.1
+BIT_PROBABILITY = 0.35
+BRUTE_FORCE_SAMPLE = 300
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _make_hashes(n, rng):
+    hashes, planted = [], {}
+    for i in range(n):
+        if i > 100 and rng.random() < DUPLICATE_SHARE:
+            source = rng.randrange(i)
+            value = hashes[source]
+            for bit in rng.sample(range(HASH_BITS), rng.randint(0, DUPLICATE_MAX_DISTANCE // 2)):
+                value ^= 1 << bit
+            planted[i] = source
+        else:
+            value = 0
+            for bit in range(HASH_BITS):
+                if rng.random() < BIT_PROBABILITY:
+                    value |= 1 << bit
+        hashes.append(value)
+    return hashes, planted
+
+
+def _dedup(hashes):
+    index = HammingIndex()
+    links = {}
+    for key, value in enumerate(hashes):
+        match = index.nearest(value)
+        if match:
+            links[key] = match[0]
+        else:
+            index.add(key, value)
+    return index, links
+
+
+def _brute_force(hashes, canonical, queries):
+    """Ближайший канонический хэш полным перебором (XOR + popcount по байтам)."""
+    matrix = np.frombuffer(
+        b"".join(hashes[key].to_bytes(HASH_BITS // 8, "big") for key in canonical),
+        dtype=np.uint8,
+    ).reshape(len(canonical), HASH_BITS // 8)
+    canonical = np.array(canonical)
+    results = {}
+    for key in queries:
+        query = np.frombuffer(hashes[key].to_bytes(HASH_BITS // 8, "big"), dtype=np.uint8)
+        distances = _POPCOUNT[matrix ^ query].sum(axis=1)
+        distances[canonical == key] = HASH_BITS + 1  # сам с собой не сравниваем
+        best = int(distances.argmin())
+        results[key] = (
+            int(canonical[best]) if distances[best] <= DUPLICATE_MAX_DISTANCE else None
+        )
+    return results
+
+
+def main():
+    max_hashes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(0)
+    print(f"dHash {HASH_BITS} бит, порог {DUPLICATE_MAX_DISTANCE} бит")
+    for size in (n for n in (10_000, 100_000, 300_000) if n <= max_hashes):
+        hashes, planted = _make_hashes(size, rng)
+
+        started = time.perf_counter()
+        index, links = _dedup(hashes)
+        elapsed = time.perf_counter() - started
+        found = sum(1 for key in planted if key in links)
+        print(
+            f"\nХэшей {size}: HammingIndex {elapsed:6.2f} с "
+            f"({elapsed / size * 1e6:5.1f} мкс/хэш), связано {len(links)}, "
+            f"найдено дублей {found}/{len(planted)}"
+        )
+
+        canonical = sorted(key for key in range(size) if key in index)
+        queries = rng.sample(range(size), BRUTE_FORCE_SAMPLE)
+        started = time.perf_counter()
+        expected = _brute_force(hashes, canonical, queries)
+        per_query = (time.perf_counter() - started) / len(queries)
+        mismatches = sum(
+            1
+            for key in queries
+            if key not in index and (links.get(key) is None) != (expected[key] is None)
+        )
+        print(
+            f"  перебор NumPy {per_query * 1000:6.2f} мс/хэш "
+            f"(весь проход ~{per_query * size:6.0f} с), "
+            f"расхождений с индексом на {len(queries)} хэшах: {mismatches}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Бенчмарк извлечения товаров из сохранённых страниц: html.parser vs lxml vs пул процессов.
+
+Проверяет, что оба движка дают одинаковые записи (включая запасной
+селектор цены c35_3_1-a1), и печатает страницы/с и плитки/с.
+Запуск: python benchmarks/bench_extractor.py [кол-во страниц] [плиток на странице]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from extractor import extract_directory, extract_file, list_snapshots  # noqa: E402
+
+
+def make_snapshot(page, tiles):
+    parts = ['<html><body><h1 class="qb61_3_0-a1">Юбки женские</h1><div class="grid">']
+    for i in range(tiles):
+        # Каждая пятая плитка — со старой разметкой цены
+        price_class = "c35_3_1-a1 tsHeadline500Medium" if i % 5 == 0 else "tsHeadline500Medium x"
+        parts.append(
+            f'<div class="tile-root"><div class="wrap">'
+            f'<a class="tile-clickable-element" href="/product/p{page}-{i}/?at=t">'
+            f'<img loading="lazy" src="https://ir.ozone.ru/wc500/{page}{i}.jpg"></a>'
+            f'<div><span class="tsBody500Medium">Юбка <b>миди</b> {i}</span></div>'
+            f'<div><span class="{price_class}">{1000 + i} ₽</span>'
+            f'<span class="tsBodyControl400Small">−35%</span></div>'
+            f"</div></div>"
+        )
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def _as_tuples(items):
+    return [(i.name, i.price, i.url, i.image_url, i.category) for i in items]
+
+
+def _bench(label, pages, tiles, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22} {pages / elapsed:8.1f} стр/с  {pages * tiles / elapsed:10.0f} плиток/с"
+    )
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    tiles = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    directory = tempfile.mkdtemp()
+    for page in range(pages):
+        with open(os.path.join(directory, f"page_{page:04d}.html"), "w", encoding="utf-8") as f:
+            f.write(make_snapshot(page, tiles))
+    paths = list_snapshots(directory)
+
+    assert _as_tuples(extract_file(paths[0], "bs4")) == _as_tuples(extract_file(paths[0], "lxml"))
+    assert len(extract_file(paths[0], "lxml")) == tiles
+
+    _bench("html.parser (bs4)", pages, tiles, lambda: [extract_file(p, "bs4") for p in paths])
+    _bench("lxml", pages, tiles, lambda: [extract_file(p, "lxml") for p in paths])
+    _bench(
+        f"lxml, пул ({os.cpu_count()} проц.)",
+        pages,
+        tiles,
+        lambda: extract_directory(directory, engine="lxml"),
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
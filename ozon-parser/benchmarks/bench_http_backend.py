@@ -0,0 +1,86 @@
+"""
+Бенчмарк HTTP-движка (utils/ozon_scraper.py) на локальном сервере.
+
+Сервер отдаёт сохранённые страницы категории (?page=N) с задержкой;
+страница без плиток имитирует выдачу, которой нужен JavaScript.
+Показывает страницы/с и CPU-время процесса на страницу.
+Запуск: python benchmarks/bench_http_backend.py [кол-во категорий] [страниц]
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ingest_pipeline import make_category_html  # noqa: E402
+from utils.ozon_scraper import BrowserRequired, fetch_category_pages  # noqa: E402
+
+LATENCY = 0.1
+TILES_PER_PAGE = 36
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        parts = urlsplit(self.path)
+        page = int(parse_qs(parts.query).get("page", ["1"])[0])
+        if parts.path.startswith("/category/js-only"):
+            body = "<html><body><div id='app'></div></body></html>"
+        else:
+            body = make_category_html(TILES_PER_PAGE, "http://127.0.0.1/img")
+            body = body.replace("item-", f"item-{page}-")
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PageHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def main():
+    categories = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get()}"
+    links = [f"{base}/category/cat-{i}/" for i in range(categories)]
+    links.append(f"{base}/category/js-only/")
+
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    fetched, fallback = 0, []
+    for url in links:
+        try:
+            fetched += len(fetch_category_pages(url, pages=pages))
+        except BrowserRequired:
+            fallback.append(url)
+    elapsed = time.perf_counter() - start
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+
+    print(f"Страниц: {fetched} за {elapsed:.2f} с ({fetched / elapsed:.1f} стр/с)")
+    print(f"CPU на страницу: {cpu / fetched * 1000:.1f} мс")
+    print(f"Нужен браузер: {fallback}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
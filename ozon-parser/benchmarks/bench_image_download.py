@@ -0,0 +1,83 @@
+"""
+Бенчмарк загрузки картинок: последовательный requests.get vs fetch_image()
+из INGEST_FETCH_WORKERS потоков, как на этапе загрузки в ingest_pipeline.
+
+Локальный HTTP-сервер отдаёт фиктивные картинки с искусственной задержкой.
+Запуск: python benchmarks/bench_image_download.py [кол-во картинок] [задержка, мс]
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from utils.image_downloader import fetch_image  # noqa: E402
+
+FIXTURE_IMAGE = os.urandom(30 * 1024)
+LATENCY = 0.1
+# Как INGEST_FETCH_WORKERS в ingest_pipeline (его импорт открыл бы базу)
+FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(FIXTURE_IMAGE)))
+        self.end_headers()
+        self.wfile.write(FIXTURE_IMAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def _sequential(urls):
+    result = []
+    for url in urls:
+        response = requests.get(url)
+        response.raise_for_status()
+        result.append(response.content)
+    return result
+
+
+def _concurrent(urls):
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        return list(pool.map(lambda url: fetch_image(url)[0], urls))
+
+
+def main():
+    global LATENCY
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/wc500/{i}.jpg" for i in range(n)]
+
+    start = time.perf_counter()
+    sequential = _sequential(urls)
+    seq_time = time.perf_counter() - start
+    print(f"Последовательно: {seq_time:6.2f} с ({n / seq_time:7.1f} картинок/с)")
+
+    start = time.perf_counter()
+    concurrent = _concurrent(urls)
+    conc_time = time.perf_counter() - start
+    print(f"Параллельно:     {conc_time:6.2f} с ({n / conc_time:7.1f} картинок/с)")
+
+    assert sequential == concurrent
+    print(f"Ускорение: x{seq_time / conc_time:.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
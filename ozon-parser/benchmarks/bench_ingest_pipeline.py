@@ -0,0 +1,122 @@
+"""
+Бенчмарк потокового конвейера загрузки: строки/с и пиковая память (RSS).
+
+Генерирует страницу категории с N плитками, картинки отдаёт локальный
+HTTP-сервер с задержкой. Пиковый RSS не должен расти вместе с N.
+Второй проход — инкрементальный (условные запросы по ETag).
+Запуск: python benchmarks/bench_ingest_pipeline.py [кол-во товаров]
+"""
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from ingest_pipeline import run_ingest_pipeline  # noqa: E402
+
+LATENCY = 0.02
+
+
+def _fixture_image():
+    buffer = io.BytesIO()
+    Image.effect_mandelbrot((500, 650), (-2, -1.5, 1, 1.5), 100).convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+FIXTURE_IMAGE = _fixture_image()
+
+
+FIXTURE_ETAG = '"fixture-v1"'
+BYTES_SENT = multiprocessing.Value("q", 0)
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        if self.headers.get("If-None-Match") == FIXTURE_ETAG:
+            self.send_response(304)
+            self.send_header("ETag", FIXTURE_ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("ETag", FIXTURE_ETAG)
+        self.send_header("Content-Length", str(len(FIXTURE_IMAGE)))
+        self.end_headers()
+        self.wfile.write(FIXTURE_IMAGE)
+        with BYTES_SENT.get_lock():
+            BYTES_SENT.value += len(FIXTURE_IMAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_category_html(n, image_base_url):
+    tiles = "".join(
+        f'<div class="tile-root"><a class="tile-clickable-element" href="/product/item-{i}/?at=x">'
+        f'<img src="{image_base_url}/wc500/{i}.jpg"></a>'
+        f'<span class="tsBody500Medium">Товар {i}</span>'
+        f'<span class="tsHeadline500Medium">{1000 + i} ₽</span></div>'
+        for i in range(n)
+    )
+    return f'<html><body><h1 class="qb61_3_0-a1">Юбки женские</h1>{tiles}</body></html>'
+
+
+def _serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    # Сервер в отдельном процессе, чтобы не делить GIL с конвейером
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    html = make_category_html(n, f"http://127.0.0.1:{port_queue.get()}")
+
+    devnull = open(os.devnull, "w")
+
+    def run(incremental):
+        BYTES_SENT.value = 0
+        stdout, sys.stdout = sys.stdout, devnull
+        start = time.perf_counter()
+        try:
+            stats = run_ingest_pipeline(html, incremental=incremental)
+        finally:
+            sys.stdout = stdout
+        return stats, time.perf_counter() - start, BYTES_SENT.value
+
+    stats, elapsed, sent = run(incremental=False)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Товаров: {n}, сохранено: {stats['saved']}, время: {elapsed:.2f} с")
+    print(f"Скорость: {stats['saved'] / elapsed:.0f} товаров/с, пиковый RSS: {peak_mb:.0f} МБ")
+    print(f"Полный проход: картинок {sent / 1024:.0f} КБ")
+
+    stats, inc_elapsed, inc_sent = run(incremental=True)
+    print(
+        f"Инкрементальный проход: {inc_elapsed:.2f} с "
+        f"({inc_elapsed / elapsed:.0%} от полного), картинок {inc_sent / 1024:.0f} КБ, "
+        f"без изменений: {stats['unchanged']}"
+    )
+    server.terminate()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
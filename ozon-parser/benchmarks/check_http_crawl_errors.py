@@ -0,0 +1,93 @@
+"""
+Проверка HTTP-обхода (parser.crawl_over_http): ошибка в одной категории не
+прерывает обход остальных.
+
+Загрузка страниц подменяется: одна категория падает при загрузке (уходит в
+fallback на браузер), другая — при сохранении; остальные должны быть
+обработаны, а упавшая при сохранении — остаться незавершённой.
+Код выхода 1, если это не так.
+Запуск: python benchmarks/check_http_crawl_errors.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'check.db')}"
+
+try:
+    import undetected_chromedriver  # noqa: F401
+    import selenium  # noqa: F401
+except ImportError:
+    # Браузер в этой проверке не запускается — хватит пустых модулей для импорта parser
+    for name in (
+        "undetected_chromedriver",
+        "selenium",
+        "selenium.webdriver",
+        "selenium.webdriver.common",
+        "selenium.webdriver.common.by",
+        "selenium.webdriver.support",
+        "selenium.webdriver.support.ui",
+        "selenium.webdriver.support.expected_conditions",
+    ):
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules["selenium.webdriver.common.by"].By = None
+    sys.modules["selenium.webdriver.support.ui"].WebDriverWait = None
+    sys.modules["selenium.webdriver.support"].expected_conditions = sys.modules[
+        "selenium.webdriver.support.expected_conditions"
+    ]
+
+import parser  # noqa: E402
+from db import CrawlState, get_db_session, start_crawl_run  # noqa: E402
+
+LINKS = [f"https://www.ozon.ru/category/check-{i}/" for i in range(6)]
+FETCH_FAILS = LINKS[1]
+HANDLE_FAILS = LINKS[3]
+
+
+def _fetch_category_pages(url):
+    if url == FETCH_FAILS:
+        raise ConnectionError("соединение сброшено")
+    return [f"<html>{url}</html>"]
+
+
+def main():
+    parser.fetch_category_pages = _fetch_category_pages
+    handled = []
+
+    def handle_page(url, pages):
+        if url == HANDLE_FAILS:
+            raise ValueError("битая страница")
+        handled.append(url)
+        parser.mark_category_done(url, len(pages))
+
+    start_crawl_run(LINKS)
+    fallback = parser.crawl_over_http(LINKS, handle_page, workers=2)
+
+    session = get_db_session()
+    statuses = dict(session.query(CrawlState.category_url, CrawlState.status))
+    session.close()
+
+    expected_handled = [url for url in LINKS if url not in (FETCH_FAILS, HANDLE_FAILS)]
+    failed = 0
+    if sorted(handled) != sorted(expected_handled):
+        failed += 1
+        print(f"❌ обработаны {handled}, ожидались {expected_handled}")
+    if fallback != [FETCH_FAILS]:
+        failed += 1
+        print(f"❌ на браузер отправлены {fallback}, ожидалось {[FETCH_FAILS]}")
+    if statuses.get(HANDLE_FAILS) == "done":
+        failed += 1
+        print(f"❌ {HANDLE_FAILS} помечена завершённой, хотя сохранение упало")
+    print(f"Категорий: {len(LINKS)}, обработано: {len(handled)}, ошибок проверки: {failed}")
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
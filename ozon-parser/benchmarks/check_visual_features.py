@@ -0,0 +1,142 @@
+"""
+Проверка: визуальные векторы, которые парсер записывает в image_features,
+совпадают с теми, что приложение считает по той же сохранённой картинке.
+
+Парсер нормализует картинки-фикстуры (ingest_pipeline.normalize_image) и
+сохраняет товары во временную базу. Затем в отдельном процессе (у парсера и
+приложения свои модули db) приложение загружает векторы своим визуальным
+индексом и пересчитывает их по картинкам из clothing_images. Вектор парсера
+считается до сжатия в JPEG, поэтому сравнивается косинус, а не байты.
+Код выхода 1, если есть расхождения.
+Запуск: python benchmarks/check_visual_features.py
+"""
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image, ImageDraw
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(BENCH_DIR)), "ozon-fashion-app")
+
+# Ниже этого косинуса векторы считаются разными
+MIN_SIMILARITY = 0.99
+
+
+def _fixture_images():
+    images = [
+        Image.effect_mandelbrot((500, 650), (-2, -1.5, 1, 1.5), 100).convert("RGB"),
+        Image.radial_gradient("L").convert("RGB").resize((900, 1200)),
+    ]
+    for color, size in (((200, 30, 40), (400, 520)), ((20, 60, 160), (1000, 800))):
+        img = Image.new("RGB", size, (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        w, h = size
+        draw.rectangle((w // 4, h // 6, w * 3 // 4, h * 5 // 6), fill=color)
+        draw.ellipse((w // 3, h // 10, w * 2 // 3, h // 3), fill=(30, 30, 30))
+        images.append(img)
+    result = []
+    for img in images:
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        result.append(buffer.getvalue())
+    return result
+
+
+def _parser_side(db_path):
+    os.environ["OZON_DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, SRC_DIR)
+    from db import save_clothing_items
+    from ingest_pipeline import normalize_image
+
+    batch = []
+    for i, data in enumerate(_fixture_images()):
+        image_bytes, thumbnail_base64, attributes = normalize_image(data)
+        batch.append(
+            {
+                "name": f"Фикстура {i}",
+                "price": "1000",
+                "description": " ",
+                "url": f"https://www.ozon.ru/product/fixture-{i}/",
+                "image_url": f"https://cdn.example/fixture-{i}.jpg",
+                "image_bytes": image_bytes,
+                "thumbnail_base64": thumbnail_base64,
+                "category": "Фикстуры",
+                **attributes,
+            }
+        )
+    save_clothing_items(batch)
+    return len(batch)
+
+
+def _app_side(db_path):
+    """{id товара: косинус между вектором из базы и пересчитанным приложением}."""
+    os.environ["OZON_DB_PATH"] = db_path
+    sys.path.insert(0, APP_DIR)
+    from sqlalchemy import text
+
+    from db import get_db_session
+    from model import visual_index
+
+    index = visual_index.get_index()
+    rows = get_db_session().execute(
+        text(
+            "SELECT clothing_items.id, clothing_images.data FROM clothing_items "
+            "JOIN clothing_images ON clothing_images.hash = clothing_items.image_hash"
+        )
+    ).all()
+    similarities = {}
+    for item_id, data in rows:
+        row = index.rows([item_id])[0]
+        if row < 0:
+            similarities[item_id] = None
+            continue
+        with Image.open(io.BytesIO(data)) as img:
+            vector = visual_index.image_features(img)
+        similarities[item_id] = float(index.matrix[row] @ vector)
+    return similarities
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, "ozon_clothing_items.db")
+    try:
+        saved = _parser_side(db_path)
+        # Модули db парсера и приложения называются одинаково — отдельный процесс
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--app", db_path],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        similarities = json.loads(output.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    failed = 0
+    for item_id, similarity in similarities.items():
+        if similarity is None:
+            failed += 1
+            print(f"❌ товар {item_id}: вектора парсера нет в индексе приложения")
+        elif similarity < MIN_SIMILARITY:
+            failed += 1
+            print(f"❌ товар {item_id}: косинус {similarity:.4f}")
+        else:
+            print(f"товар {item_id}: косинус {similarity:.4f}")
+    if len(similarities) != saved:
+        failed += 1
+        print(f"❌ сохранено {saved} товаров, приложение видит {len(similarities)}")
+    print(f"Товаров: {saved}, расхождений: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--app"]:
+        print(json.dumps(_app_side(sys.argv[2])))
+    else:
+        sys.exit(main())
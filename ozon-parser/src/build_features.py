@@ -0,0 +1,133 @@
+"""
+Считает признаки картинок из clothing_images, которых ещё нет в базе:
+визуальные векторы (utils/visual_features.py, таблица image_features) и
+перцептивные хэши товаров (utils/perceptual_hash.py, clothing_items.dhash),
+после чего связывает товары с почти одинаковыми картинками (duplicate_of).
+
+Новые товары получают признаки при обходе; скрипт нужен для картинок,
+сохранённых раньше (в том числе перенесённых migrate_images.py), и после
+изменения функции признаков (--rebuild).
+
+Запуск: python src/build_features.py path/to/ozon_clothing_items.db [--rebuild]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+FEATURES_CHUNK = 200
+
+
+def build(chunk_size=FEATURES_CHUNK, rebuild=False):
+    from PIL import Image
+    from sqlalchemy import text
+
+    import db
+    from utils.perceptual_hash import dhash, to_db
+    from utils.visual_features import features_to_bytes, image_features
+
+    started = time.perf_counter()
+    if rebuild:
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM image_features"))
+            conn.execute(text("UPDATE clothing_items SET dhash = NULL, duplicate_of = NULL"))
+
+    built = broken = 0
+    last_hash = ""
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT clothing_images.hash, clothing_images.data "
+                    "FROM clothing_images LEFT JOIN image_features "
+                    "ON image_features.image_hash = clothing_images.hash "
+                    "WHERE image_features.image_hash IS NULL "
+                    "AND clothing_images.hash > :last_hash "
+                    "ORDER BY clothing_images.hash LIMIT :limit"
+                ),
+                {"last_hash": last_hash, "limit": chunk_size},
+            ).all()
+            if not rows:
+                break
+            last_hash = rows[-1][0]
+
+            vectors = []
+            for hash_, data in rows:
+                try:
+                    with Image.open(io.BytesIO(data)) as img:
+                        vector = features_to_bytes(image_features(img))
+                except (OSError, ValueError):
+                    broken += 1
+                    continue
+                vectors.append({"image_hash": hash_, "vector": vector})
+            if vectors:
+                conn.execute(
+                    text(
+                        "INSERT OR IGNORE INTO image_features (image_hash, vector) "
+                        "VALUES (:image_hash, :vector)"
+                    ),
+                    vectors,
+                )
+            built += len(vectors)
+        print(f"Посчитано: {built}")
+
+    hashed = 0
+    last_hash = ""
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT hash, data FROM clothing_images WHERE hash > :last_hash "
+                    "AND hash IN (SELECT image_hash FROM clothing_items WHERE dhash IS NULL) "
+                    "ORDER BY hash LIMIT :limit"
+                ),
+                {"last_hash": last_hash, "limit": chunk_size},
+            ).all()
+            if not rows:
+                break
+            last_hash = rows[-1][0]
+
+            hashes = []
+            for hash_, data in rows:
+                try:
+                    with Image.open(io.BytesIO(data)) as img:
+                        hashes.append({"hash": hash_, "dhash": to_db(dhash(img))})
+                except (OSError, ValueError):
+                    continue  # битая картинка — товар остаётся без хэша
+            if hashes:
+                conn.execute(
+                    text("UPDATE clothing_items SET dhash = :dhash WHERE image_hash = :hash"),
+                    hashes,
+                )
+            hashed += len(hashes)
+
+    session = db.get_db_session()
+    try:
+        linked = db.link_near_duplicates(session)
+        session.commit()
+    finally:
+        session.close()
+
+    print(
+        f"Готово: векторов {built}, хэшей {hashed}, связано дублей {linked}, "
+        f"битых картинок {broken}, время {time.perf_counter() - started:.1f} с"
+    )
+    return {"built": built, "hashed": hashed, "linked": linked, "broken": broken}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Визуальные векторы и перцептивные хэши картинок каталога"
+    )
+    arg_parser.add_argument("database", help="путь к ozon_clothing_items.db")
+    arg_parser.add_argument(
+        "--rebuild", action="store_true", help="пересчитать все векторы заново"
+    )
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.database):
+        sys.exit(f"Файл не найден: {args.database}")
+    # db.py берёт путь к базе из окружения при импорте
+    os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    build(rebuild=args.rebuild)
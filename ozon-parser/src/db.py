@@ -1,43 +1,623 @@
-from sqlalchemy import create_engine, Column, Integer, String
+import base64
+import bisect
+import hashlib
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    create_engine,
+    event,
+    func,
+    text,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    case,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred, sessionmaker, scoped_session
+
+from utils.perceptual_hash import HammingIndex, from_db, to_db
+
+# Схема базы общая с приложением (ozon-fashion-app/catalog_schema.py): оба
+# открывают один файл, и версия, триггеры и миграции должны совпадать
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ozon-fashion-app")
+)
+from catalog_schema import (  # noqa: E402
+    PRICE_BUCKET_EDGES,
+    add_missing_columns,
+    migrate,
+    schema_transaction,
+)
+
+DATABASE_URL = os.getenv("OZON_DATABASE_URL", "sqlite:///ozon_clothing_items.db")
 
-DATABASE_URL = "sqlite:///ozon_clothing_items.db"
+# Настройки пула соединений (один engine на процесс)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Сколько URL проверять одним IN (...) — ниже лимита переменных SQLite
+URL_LOOKUP_CHUNK = 500
+# Сколько последних записей catalog_changes хранить; отставшее приложение
+# перечитает каталог целиком
+CATALOG_CHANGES_KEEP = int(os.getenv("CATALOG_CHANGES_KEEP", "200000"))
+
+# Настройки SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
 
 Base = declarative_base()
 
 
+class Category(Base):
+    """Справочник категорий: товары ссылаются на него через category_id."""
+
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class ClothingItem(Base):
     __tablename__ = "clothing_items"
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    price = Column(String, nullable=False)
+    price = Column(String, nullable=False)  # Устаревшее: цена строкой, для показа
+    price_value = Column(Float)  # Цена числом — для фильтров и сортировки
     description = Column(String)
-    url = Column(String)
+    url = Column(String)  # Канонический URL товара (без ?at=...)
     image_url = Column(String)
-    image_blob = Column(String)  # Для хранения base64-строки изображения
-    category = Column(String)  # Новое поле для категории
+    # Устаревшее: base64 картинки прямо в строке. Новые записи хранят
+    # только image_hash, а байты лежат в clothing_images (см. migrate_images.py)
+    image_blob = deferred(Column(String))
+    image_hash = Column(String)  # sha256 картинки в clothing_images
+    category = Column(String)  # Название категории (для показа и полнотекстового поиска)
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    color = Column(String)  # Преобладающий цвет с картинки (utils/colors.PALETTE)
+    price_bucket = Column(Integer)  # Номер ценовой корзины (PRICE_BUCKET_EDGES)
+    dhash = Column(LargeBinary)  # Перцептивный хэш картинки (utils/perceptual_hash.py)
+    # id товара с почти такой же картинкой (он сам не дубль); NULL — товар канонический
+    duplicate_of = Column(Integer)
+    # Валидаторы картинки для условных запросов (If-None-Match / If-Modified-Since)
+    image_etag = Column(String)
+    image_last_modified = Column(String)
+    last_seen_at = Column(DateTime)  # Когда товар последний раз встречался при обходе
+
+    __table_args__ = (
+        Index("ux_clothing_items_url", "url", unique=True),
+        Index("ix_clothing_items_category_price", "category_id", "price_value"),
+        Index(
+            "ix_clothing_items_category_color_price",
+            "category_id",
+            "color",
+            "price_value",
+        ),
+        Index("ix_clothing_items_category_bucket", "category_id", "price_bucket"),
+    )
+
+
+class CategoryFacet(Base):
+    """
+    Материализованные счётчики фасетов: сколько товаров категории имеют
+    данный цвет / ценовую корзину. Поддерживаются триггерами на clothing_items.
+    """
+
+    __tablename__ = "category_facets"
+
+    category_id = Column(Integer, primary_key=True)
+    facet = Column(String, primary_key=True)  # "color" или "price_bucket"
+    value = Column(String, primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+
+
+class CatalogChange(Base):
+    """
+    Журнал изменений товаров (пишут триггеры catalog_schema.CHANGE_TRIGGERS): приложение
+    держит каталог в памяти и дочитывает только товары с seq больше своего.
+    """
+
+    __tablename__ = "catalog_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    item_id = Column(Integer, nullable=False)
+
+
+class ClothingImage(Base):
+    """Контентно-адресуемое хранилище картинок: одинаковые картинки хранятся один раз."""
+
+    __tablename__ = "clothing_images"
+
+    hash = Column(String, primary_key=True)  # sha256 от байтов картинки
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+class ImageThumbnail(Base):
+    """
+    Уменьшенная копия картинки для vision-модели (low detail, 512px),
+    уже закодированная в base64 — Агенту 2 остаётся только вставить её в запрос.
+    Хранится только для картинок больше превью: меньшие приложение отправляет
+    из clothing_images как есть.
+    """
+
+    __tablename__ = "image_thumbnails"
+
+    image_hash = Column(String, primary_key=True)  # sha256 исходной картинки
+    jpeg_base64 = Column(String, nullable=False)
+
+
+class ImageFeature(Base):
+    """
+    Визуальный вектор картинки (utils/visual_features.py, float16) — по нему
+    приложение ранжирует кандидатов Агента 2 относительно фото пользователя.
+    """
+
+    __tablename__ = "image_features"
+
+    image_hash = Column(String, primary_key=True)  # sha256 исходной картинки
+    vector = Column(LargeBinary, nullable=False)
+
+
+class CrawlState(Base):
+    """Прогресс обхода по категориям — позволяет продолжить прерванный запуск."""
+
+    __tablename__ = "crawl_state"
+
+    category_url = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="pending")  # pending/in_progress/done
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    items_saved = Column(Integer, default=0)
+    last_seen_at = Column(DateTime)
+
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+    },
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _ensure_url_unique_index(conn):
+    """
+    Старые базы созданы без UNIQUE(url): create_all не меняет существующие таблицы.
+    Индекс создаётся, только если url уже канонические и не повторяются.
+    Строки при импорте не меняются и не удаляются: дубли убирает
+    migrate_schema.py, сохраняя копию базы.
+    """
+    index_exists = conn.execute(
+        text(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'index' AND name = 'ux_clothing_items_url'"
+        )
+    ).first()
+    if index_exists:
+        return
+    conflicts = conn.execute(
+        text(
+            "SELECT COUNT(*) FROM clothing_items "
+            "WHERE instr(url, '?') > 0 OR instr(url, '#') > 0 OR url IN "
+            "(SELECT url FROM clothing_items GROUP BY url HAVING COUNT(*) > 1)"
+        )
+    ).scalar()
+    if conflicts:
+        raise RuntimeError(
+            f"В clothing_items {conflicts} строк с неканоническим или повторяющимся url, "
+            "уникальный индекс по url не создан. Запустите "
+            "python src/migrate_schema.py <путь к базе>"
+        )
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_clothing_items_url "
+            "ON clothing_items (url)"
+        )
+    )
+
+
+with schema_transaction(engine) as _conn:
+    Base.metadata.create_all(_conn)
+    add_missing_columns(_conn, ClothingItem)
+    _ensure_url_unique_index(_conn)
+    migrate(_conn)
+SessionLocal = scoped_session(sessionmaker(bind=engine))
 
 
 def get_db_session():
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return SessionLocal()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_product_url(url):
+    """Отрезает трекинговые параметры (?at=...), чтобы один товар имел один URL."""
+    return url.split("?", 1)[0].split("#", 1)[0] if url else url
+
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _store_images(session, images):
+    """images — {hash: bytes}. Уже сохранённые картинки пропускаются (INSERT OR IGNORE)."""
+    if not images:
+        return
+    stmt = sqlite_insert(ClothingImage.__table__).on_conflict_do_nothing(
+        index_elements=["hash"]
+    )
+    session.execute(
+        stmt,
+        [{"hash": h, "data": data, "size": len(data)} for h, data in images.items()],
+    )
+
+
+def _category_ids(session, names):
+    """{название категории: id}; новые категории добавляются в справочник."""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    stmt = sqlite_insert(Category.__table__).on_conflict_do_nothing(
+        index_elements=["name"]
+    )
+    session.execute(stmt, [{"name": name} for name in names])
+    return dict(
+        session.query(Category.name, Category.id).filter(Category.name.in_(names)).all()
+    )
+
+
+def _price_value(price):
+    try:
+        return float(str(price).replace(" ", "").replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def price_bucket(price_value):
+    """Номер ценовой корзины: 0 — дешевле PRICE_BUCKET_EDGES[0] и так далее."""
+    if price_value is None:
+        return None
+    return bisect.bisect_right(PRICE_BUCKET_EDGES, price_value)
+
+
+def _store_thumbnails(session, thumbnails):
+    """thumbnails — {image_hash: base64 JPEG}."""
+    if not thumbnails:
+        return
+    stmt = sqlite_insert(ImageThumbnail.__table__).on_conflict_do_nothing(
+        index_elements=["image_hash"]
+    )
+    session.execute(
+        stmt,
+        [{"image_hash": h, "jpeg_base64": b64} for h, b64 in thumbnails.items()],
+    )
+
+
+def _store_features(session, features):
+    """features — {image_hash: байты вектора}."""
+    if not features:
+        return
+    stmt = sqlite_insert(ImageFeature.__table__).on_conflict_do_nothing(
+        index_elements=["image_hash"]
+    )
+    session.execute(
+        stmt, [{"image_hash": h, "vector": v} for h, v in features.items()]
+    )
+
+
+_duplicate_index = None
+_duplicate_index_lock = threading.Lock()
+
+
+def _reset_duplicate_index():
+    global _duplicate_index
+    with _duplicate_index_lock:
+        _duplicate_index = None
+
+
+def link_near_duplicates(session, urls=None):
+    """
+    Проставляет duplicate_of товарам, чей dHash близок к dHash уже известного
+    канонического товара. Индекс канонических товаров (HammingIndex) строится
+    из БД один раз на процесс и пополняется по ходу обхода.
+    urls=None — проверить все несвязанные товары. Возвращает число связанных.
+    """
+    global _duplicate_index
+    query = session.query(ClothingItem.id, ClothingItem.dhash).filter(
+        ClothingItem.dhash.is_not(None), ClothingItem.duplicate_of.is_(None)
+    )
+    if urls is None:
+        rows = query.all()
+    else:
+        rows = []
+        for i in range(0, len(urls), URL_LOOKUP_CHUNK):
+            chunk = urls[i : i + URL_LOOKUP_CHUNK]
+            rows.extend(query.filter(ClothingItem.url.in_(chunk)).all())
+    pending = {item_id for item_id, _ in rows}
+
+    links = []
+    with _duplicate_index_lock:
+        if _duplicate_index is None:
+            _duplicate_index = HammingIndex()
+            if urls is not None:
+                for item_id, value in query.order_by(ClothingItem.id):
+                    if item_id not in pending:
+                        _duplicate_index.add(item_id, from_db(value))
+        index = _duplicate_index
+        for item_id, value in sorted(rows):
+            value = from_db(value)
+            if index.get(item_id) == value:
+                continue  # уже проверен и остаётся каноническим
+            index.remove(item_id)
+            match = index.nearest(value)
+            if match:
+                links.append({"id": item_id, "duplicate_of": match[0]})
+            else:
+                index.add(item_id, value)
+    if links:
+        session.execute(
+            text("UPDATE clothing_items SET duplicate_of = :duplicate_of WHERE id = :id"),
+            links,
+        )
+    return len(links)
+
+
+def save_clothing_items(batch):
+    """
+    Сохраняет пачку товаров одной транзакцией (executemany + upsert по url).
+
+    batch — итерируемое словарей с полями name, price, description, url,
+    image_url, category и картинкой: image_bytes (сырые байты) или устаревший
+    image_blob (base64); опционально image_etag, image_last_modified,
+    thumbnail_base64 (превью для Агента 2), features (визуальный вектор из
+    utils.visual_features), dhash (utils.perceptual_hash) и color (название
+    из utils.colors). Товары с почти одинаковой картинкой связываются через
+    duplicate_of.
+    Картинки кладутся в clothing_images по sha256, в строке остаётся image_hash.
+    Повторный обход обновляет строки на месте; если картинки нет (None),
+    сохранённая остаётся прежней.
+    Возвращает {"inserted": ..., "updated": ...}.
+    """
+    now = _utcnow()
+    rows = {}
+    images = {}
+    thumbnails = {}
+    features = {}
+    for item in batch:
+        data = item.get("image_bytes")
+        if data is None and item.get("image_blob"):
+            data = base64.b64decode(item["image_blob"])
+        hash_ = None
+        if data:
+            hash_ = image_hash(data)
+            images[hash_] = data
+            if item.get("thumbnail_base64"):
+                thumbnails[hash_] = item["thumbnail_base64"]
+            if item.get("features"):
+                features[hash_] = item["features"]
+        url = normalize_product_url(item.get("url"))
+        price_value = _price_value(item.get("price"))
+        # при дублях внутри пачки побеждает последний
+        rows[url] = {
+            "name": item.get("name"),
+            "price": item.get("price"),
+            "price_value": price_value,
+            "price_bucket": price_bucket(price_value),
+            "color": item.get("color"),
+            "dhash": to_db(item["dhash"]) if item.get("dhash") is not None else None,
+            "description": item.get("description"),
+            "url": url,
+            "image_url": item.get("image_url"),
+            "image_hash": hash_,
+            "image_blob": None,
+            "image_etag": item.get("image_etag"),
+            "image_last_modified": item.get("image_last_modified"),
+            "category": item.get("category"),
+            "last_seen_at": now,
+        }
+    if not rows:
+        return {"inserted": 0, "updated": 0}
+
+    session = get_db_session()
+    try:
+        urls = list(rows)
+        existing = set()
+        for i in range(0, len(urls), URL_LOOKUP_CHUNK):
+            chunk = urls[i : i + URL_LOOKUP_CHUNK]
+            existing.update(
+                url
+                for (url,) in session.query(ClothingItem.url).filter(
+                    ClothingItem.url.in_(chunk)
+                )
+            )
+
+        _store_images(session, images)
+        _store_thumbnails(session, thumbnails)
+        _store_features(session, features)
+        category_ids = _category_ids(session, (r["category"] for r in rows.values()))
+        for row in rows.values():
+            row["category_id"] = category_ids.get(row["category"])
+
+        table = ClothingItem.__table__
+        stmt = sqlite_insert(table)
+        set_ = {
+            column: stmt.excluded[column]
+            for column in (
+                "name",
+                "price",
+                "price_value",
+                "price_bucket",
+                "description",
+                "image_url",
+                "category",
+                "category_id",
+                "last_seen_at",
+            )
+        }
+        # image_hash=None означает «картинка не менялась» — оставляем сохранённую
+        # (и цвет, определённый по ней)
+        for column in (
+            "image_hash",
+            "image_etag",
+            "image_last_modified",
+            "color",
+            "dhash",
+        ):
+            set_[column] = func.coalesce(stmt.excluded[column], table.c[column])
+        # Сменилась картинка — связь с дублем пересчитает link_near_duplicates
+        set_["duplicate_of"] = case(
+            (stmt.excluded.dhash.is_not(table.c.dhash) & stmt.excluded.dhash.is_not(None), None),
+            else_=table.c.duplicate_of,
+        )
+        # Новая картинка в хранилище вытесняет устаревший base64 из строки
+        set_["image_blob"] = case(
+            (stmt.excluded.image_hash.is_not(None), None), else_=table.c.image_blob
+        )
+        stmt = stmt.on_conflict_do_update(index_elements=["url"], set_=set_)
+        session.execute(stmt, list(rows.values()))
+        link_near_duplicates(session, urls)
+        session.execute(
+            text(
+                "DELETE FROM catalog_changes WHERE seq <= "
+                "(SELECT MAX(seq) FROM catalog_changes) - :keep"
+            ),
+            {"keep": CATALOG_CHANGES_KEEP},
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        _reset_duplicate_index()
+        raise
+    finally:
+        session.close()
+
+    updated = len(existing)
+    return {"inserted": len(rows) - updated, "updated": updated}
 
 
 def save_clothing_item(name, price, description, url, image_url, image_blob, category):
+    return save_clothing_items(
+        [
+            {
+                "name": name,
+                "price": price,
+                "description": description,
+                "url": url,
+                "image_url": image_url,
+                "image_blob": image_blob,
+                "category": category,
+            }
+        ]
+    )
+
+
+def get_known_items(urls):
+    """
+    Возвращает {url: {"image_url", "image_etag", "image_last_modified"}}
+    для уже сохранённых товаров — для инкрементального обхода.
+    """
+    urls = list(dict.fromkeys(normalize_product_url(url) for url in urls if url))
+    session = get_db_session()
+    try:
+        known = {}
+        for i in range(0, len(urls), URL_LOOKUP_CHUNK):
+            chunk = urls[i : i + URL_LOOKUP_CHUNK]
+            for url, image_url, etag, last_modified in session.query(
+                ClothingItem.url,
+                ClothingItem.image_url,
+                ClothingItem.image_etag,
+                ClothingItem.image_last_modified,
+            ).filter(ClothingItem.url.in_(chunk)):
+                known[url] = {
+                    "image_url": image_url,
+                    "image_etag": etag,
+                    "image_last_modified": last_modified,
+                }
+        return known
+    finally:
+        session.close()
+
+
+def start_crawl_run(category_urls, resume=False):
+    """
+    Готовит состояние обхода и возвращает категории, которые нужно обойти.
+    При resume=True категории, завершённые в прошлом запуске, пропускаются.
+    """
+    session = get_db_session()
+    try:
+        states = {
+            state.category_url: state
+            for state in session.query(CrawlState).filter(
+                CrawlState.category_url.in_(category_urls)
+            )
+        }
+        pending = []
+        for url in category_urls:
+            state = states.get(url)
+            if state is None:
+                state = CrawlState(category_url=url, status="pending", items_saved=0)
+                session.add(state)
+            elif resume and state.status == "done":
+                continue
+            else:
+                state.status = "pending"
+                state.items_saved = 0
+            pending.append(url)
+        session.commit()
+        return pending
+    finally:
+        session.close()
+
+
+def mark_category_started(category_url):
+    _update_crawl_state(category_url, status="in_progress", started_at=_utcnow())
+
+
+def mark_category_done(category_url, items_saved):
+    now = _utcnow()
+    _update_crawl_state(
+        category_url,
+        status="done",
+        finished_at=now,
+        last_seen_at=now,
+        items_saved=items_saved,
+    )
+
+
+def _update_crawl_state(category_url, **values):
     session = get_db_session()
-    new_item = ClothingItem(
-        name=name,
-        price=price,
-        description=description,
-        url=url,
-        image_url=image_url,
-        image_blob=image_blob,
-        category=category,
-    )
-    session.add(new_item)
-    session.commit()
-    session.close()
+    try:
+        session.query(CrawlState).filter_by(category_url=category_url).update(values)
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,193 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from models.clothing_item import ClothingItem
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    # Без lxml работаем медленнее, через html.parser из BeautifulSoup
+    lxml_html = None
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if lxml_html is not None:
+    # Селекторы компилируются один раз на процесс
+    _XPATH_CATEGORY = etree.XPath(f"(//h1[{_has_class('qb61_3_0-a1')}])[1]")
+    _XPATH_TILES = etree.XPath(f"//div[{_has_class('tile-root')}]")
+    _XPATH_NAME = etree.XPath(f"(.//span[{_has_class('tsBody500Medium')}])[1]")
+    _XPATH_PRICE = etree.XPath(f"(.//span[{_has_class('tsHeadline500Medium')}])[1]")
+    _XPATH_PRICE_FALLBACK = etree.XPath(
+        f"(.//span[{_has_class('c35_3_1-a1')} and {_has_class('tsHeadline500Medium')}])[1]"
+    )
+    _XPATH_LINK = etree.XPath(f"(.//a[{_has_class('tile-clickable-element')}])[1]")
+    _XPATH_IMG = etree.XPath("(.//img)[1]")
+
+
+def _first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _text(node):
+    return "".join(node.itertext()).strip()
+
+
+def _make_item(name, price_text, href, image_url, category):
+    price_str = (
+        price_text.replace("\u2009", "").replace("₽", "").replace(" ", "")
+    )
+    try:
+        price = float(price_str)
+    except ValueError:
+        print(f"Ошибка конвертации цены: {price_str}")
+        return None
+
+    url = "https://www.ozon.ru" + href
+    clothing_item = ClothingItem(name, price, "", url, image_url)
+    clothing_item.category = category
+    return clothing_item
+
+
+def _extract_lxml(html):
+    try:
+        root = lxml_html.fromstring(html)
+    except ValueError:
+        # lxml не принимает str с объявлением кодировки — отдаём байты
+        root = lxml_html.fromstring(html.encode("utf-8"))
+    category_tag = _first(_XPATH_CATEGORY, root)
+    category = _text(category_tag) if category_tag is not None else ""
+
+    for item in _XPATH_TILES(root):
+        name_tag = _first(_XPATH_NAME, item)
+        price_tag = _first(_XPATH_PRICE, item)
+        link_tag = _first(_XPATH_LINK, item)
+        img_tag = _first(_XPATH_IMG, item)
+
+        if price_tag is None:
+            price_tag = _first(_XPATH_PRICE_FALLBACK, item)
+
+        if None in (name_tag, price_tag, link_tag, img_tag):
+            continue
+        clothing_item = _make_item(
+            _text(name_tag),
+            _text(price_tag),
+            link_tag.get("href", ""),
+            img_tag.get("src", ""),
+            category,
+        )
+        if clothing_item:
+            yield clothing_item
+
+
+def _extract_bs4(html):
+    soup = BeautifulSoup(html, "html.parser")
+    # Парсим категорию
+    category_tag = soup.select_one("h1.qb61_3_0-a1")
+    category = category_tag.text.strip() if category_tag else ""
+
+    for item in soup.select("div.tile-root"):
+        name_tag = item.select_one("span.tsBody500Medium")
+        price_tag = item.select_one("span.tsHeadline500Medium")
+        link_tag = item.select_one("a.tile-clickable-element")
+        img_tag = item.select_one("img")
+
+        if not price_tag:
+            price_tag = item.select_one("span.c35_3_1-a1.tsHeadline500Medium")
+
+        if name_tag and price_tag and link_tag and img_tag:
+            clothing_item = _make_item(
+                name_tag.text.strip(),
+                price_tag.text.strip(),
+                link_tag.get("href", ""),
+                img_tag.get("src", ""),
+                category,
+            )
+            if clothing_item:
+                yield clothing_item
+
+
+def extract_clothing_items(html, engine=None):
+    """
+    Извлекает товары из HTML без печати статистики.
+
+    engine: "lxml" (по умолчанию, если установлен) или "bs4".
+    """
+    engine = engine or ("lxml" if lxml_html is not None else "bs4")
+    if engine == "lxml":
+        return _extract_lxml(html)
+    return _extract_bs4(html)
+
+
+def iter_clothing_items(html, engine=None):
+    """Извлекает товары из HTML категории по одному (без загрузки картинок)."""
+    parse_started = time.perf_counter()
+    count = 0
+    for clothing_item in extract_clothing_items(html, engine=engine):
+        count += 1
+        yield clothing_item
+
+    print(f"Разбор HTML: {time.perf_counter() - parse_started:.2f} с, плиток: {count}")
+
+
+def extract_file(path, engine=None):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return list(extract_clothing_items(f.read(), engine=engine))
+
+
+def list_snapshots(directory):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith((".html", ".htm"))
+    )
+
+
+def extract_directory(directory, processes=None, engine=None):
+    """
+    Разбирает все сохранённые страницы (*.html) каталога пулом процессов.
+    Возвращает {путь: [ClothingItem, ...]} в порядке имён файлов.
+    """
+    paths = list_snapshots(directory)
+    if not paths:
+        return {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = pool.map(
+            extract_file, paths, [engine] * len(paths), chunksize=max(1, len(paths) // 32)
+        )
+        return dict(zip(paths, results))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Офлайн-разбор сохранённых страниц категорий Ozon"
+    )
+    arg_parser.add_argument("directory", help="каталог с *.html")
+    arg_parser.add_argument("--processes", type=int, default=None)
+    arg_parser.add_argument(
+        "--save",
+        action="store_true",
+        help="прогнать товары через конвейер загрузки и сохранить в БД",
+    )
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    pages = extract_directory(args.directory, processes=args.processes)
+    tiles = sum(len(items) for items in pages.values())
+    elapsed = time.perf_counter() - started
+    print(f"Страниц: {len(pages)}, товаров: {tiles}, время: {elapsed:.2f} с")
+
+    if args.save:
+        from ingest_pipeline import run_ingest_pipeline
+
+        for path, items in pages.items():
+            print(f"Сохраняем: {path}")
+            run_ingest_pipeline(None, items=iter(items))
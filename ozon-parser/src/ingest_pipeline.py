@@ -0,0 +1,282 @@
+import base64
+import io
+import os
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from db import get_known_items, normalize_product_url, save_clothing_items
+from extractor import iter_clothing_items
+from utils.colors import dominant_color
+from utils.image_downloader import fetch_image
+from utils.perceptual_hash import dhash
+from utils.visual_features import features_to_bytes, image_features
+
+# Потоковый конвейер: плитки -> загрузка картинок -> нормализация -> запись пачками.
+# Очереди ограничены, поэтому медленный этап притормаживает предыдущие,
+# и в памяти одновременно живёт не больше INGEST_QUEUE_SIZE картинок на этап.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+INGEST_NORMALIZE_WORKERS = int(os.getenv("INGEST_NORMALIZE_WORKERS", "2"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+KNOWN_LOOKUP_CHUNK = 100  # сколько плиток проверять в БД за один запрос
+IMAGE_MAX_SIDE = int(os.getenv("INGEST_IMAGE_MAX_SIDE", "500"))
+IMAGE_JPEG_QUALITY = 85
+# Превью для vision-модели в режиме low detail (512x512)
+THUMBNAIL_SIDE = int(os.getenv("THUMBNAIL_SIDE", "512"))
+THUMBNAIL_JPEG_QUALITY = 80
+
+_DONE = object()
+
+
+def normalize_image(data):
+    """
+    Приводит картинку к RGB JPEG не больше IMAGE_MAX_SIDE.
+    Возвращает (байты JPEG, base64-превью THUMBNAIL_SIDE для Агента 2,
+    признаки картинки: color — цвет для фильтров, features — визуальный
+    вектор, dhash — перцептивный хэш для поиска дублей). Превью None, если
+    сохраняемая картинка уже не больше THUMBNAIL_SIDE: приложение отправит
+    её саму, а вторая копия в image_thumbnails только удвоила бы базу.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        img = img.convert("RGB")
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+        attributes = {
+            "color": dominant_color(img),
+            "features": features_to_bytes(image_features(img)),
+            "dhash": dhash(img),
+        }
+
+        thumbnail_base64 = None
+        if max(img.size) > THUMBNAIL_SIDE:
+            img.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+            thumbnail = io.BytesIO()
+            img.save(thumbnail, format="JPEG", quality=THUMBNAIL_JPEG_QUALITY)
+            thumbnail_base64 = base64.b64encode(thumbnail.getvalue()).decode("utf-8")
+    return buffer.getvalue(), thumbnail_base64, attributes
+
+
+def _item_to_row(item):
+    return {
+        "name": item.name,
+        "price": item.price,
+        "description": " ",
+        "url": item.url,
+        "image_url": item.image_url,
+        "image_bytes": item.image_bytes,
+        "thumbnail_base64": getattr(item, "thumbnail_base64", None),
+        "image_etag": getattr(item, "image_etag", None),
+        "image_last_modified": getattr(item, "image_last_modified", None),
+        "category": item.category,
+        **(getattr(item, "image_attributes", None) or {}),
+    }
+
+
+def _mark_known(items):
+    """Помечает уже сохранённые товары (item.known), проверяя БД пачками."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= KNOWN_LOOKUP_CHUNK:
+            yield from _annotate_known(chunk)
+            chunk = []
+    yield from _annotate_known(chunk)
+
+
+def _annotate_known(chunk):
+    known = get_known_items(item.url for item in chunk) if chunk else {}
+    for item in chunk:
+        item.known = known.get(normalize_product_url(item.url))
+        yield item
+
+
+def _extract_stage(items, tiles_queue, fetch_workers):
+    try:
+        for item in items:
+            tiles_queue.put(item)
+    except Exception as e:
+        print(f"Ошибка разбора HTML: {e}")
+    finally:
+        for _ in range(fetch_workers):
+            tiles_queue.put(_DONE)
+
+
+def _fetch_stage(tiles_queue, images_queue, stats, stats_lock):
+    while True:
+        item = tiles_queue.get()
+        if item is _DONE:
+            return
+        known = getattr(item, "known", None)
+        if known and known["image_url"] == item.image_url:
+            if not (known["image_etag"] or known["image_last_modified"]):
+                # Тот же URL картинки и нечем проверить — считаем её неизменной
+                with stats_lock:
+                    stats["unchanged"] += 1
+                images_queue.put((item, None))
+                continue
+            etag, last_modified = known["image_etag"], known["image_last_modified"]
+        else:
+            etag, last_modified = None, None
+
+        try:
+            if item.image_url:
+                data, item.image_etag, item.image_last_modified = fetch_image(
+                    item.image_url, etag=etag, last_modified=last_modified
+                )
+            else:
+                data = b""
+        except Exception as e:
+            print(f"Ошибка загрузки изображения: {e}")
+            data = b""
+        if data is None:  # 304 Not Modified
+            with stats_lock:
+                stats["unchanged"] += 1
+            images_queue.put((item, None))
+            continue
+        if not data:
+            print(f"Пропущено: нет изображения для {item.name} ({item.url})")
+            with stats_lock:
+                stats["skipped"] += 1
+            continue  # Пропустить товар, если картинка не скачалась
+        images_queue.put((item, data))
+
+
+def _normalize_stage(images_queue, rows_queue, stats, stats_lock):
+    while True:
+        entry = images_queue.get()
+        if entry is _DONE:
+            return
+        item, data = entry
+        try:
+            # data=None — картинка не менялась, в БД обновятся только цена и метаданные
+            if data is None:
+                item.image_bytes = item.thumbnail_base64 = item.image_attributes = None
+            else:
+                (
+                    item.image_bytes,
+                    item.thumbnail_base64,
+                    item.image_attributes,
+                ) = normalize_image(data)
+        except Exception as e:
+            print(f"Пропущено: не удалось обработать изображение {item.url}: {e}")
+            with stats_lock:
+                stats["skipped"] += 1
+            continue
+        rows_queue.put(item)
+
+
+def _start_stage(target, args, workers, out_queue, next_workers):
+    """Запускает workers потоков этапа и поток, который после их завершения
+    отправляет next_workers маркеров _DONE следующему этапу."""
+    threads = [threading.Thread(target=target, args=args) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    def close():
+        for thread in threads:
+            thread.join()
+        for _ in range(next_workers):
+            out_queue.put(_DONE)
+
+    closer = threading.Thread(target=close)
+    closer.start()
+    return threads + [closer]
+
+
+def run_ingest_pipeline(
+    html,
+    fetch_workers=INGEST_FETCH_WORKERS,
+    normalize_workers=INGEST_NORMALIZE_WORKERS,
+    batch_size=INGEST_BATCH_SIZE,
+    queue_size=INGEST_QUEUE_SIZE,
+    items=None,
+    incremental=False,
+):
+    """
+    Прогоняет страницу категории через потоковый конвейер и пишет товары в БД пачками.
+
+    items — готовый итератор ClothingItem (по умолчанию извлекается из html).
+    incremental=True — для известных товаров картинка не скачивается заново:
+    либо условный запрос по ETag/Last-Modified, либо только обновление цены.
+    Возвращает {"saved", "skipped", "unchanged", "inserted", "updated"}.
+    """
+    started = time.perf_counter()
+    tiles_queue = queue.Queue(maxsize=queue_size)
+    images_queue = queue.Queue(maxsize=queue_size)
+    rows_queue = queue.Queue(maxsize=queue_size)
+    stats = {"saved": 0, "skipped": 0, "unchanged": 0, "inserted": 0, "updated": 0}
+    stats_lock = threading.Lock()
+
+    if items is None:
+        items = iter_clothing_items(html)
+    if incremental:
+        items = _mark_known(items)
+
+    threads = [
+        threading.Thread(
+            target=_extract_stage, args=(items, tiles_queue, fetch_workers)
+        )
+    ]
+    threads[0].start()
+    threads += _start_stage(
+        _fetch_stage,
+        (tiles_queue, images_queue, stats, stats_lock),
+        fetch_workers,
+        images_queue,
+        normalize_workers,
+    )
+    threads += _start_stage(
+        _normalize_stage,
+        (images_queue, rows_queue, stats, stats_lock),
+        normalize_workers,
+        rows_queue,
+        1,
+    )
+
+    def flush(batch):
+        result = save_clothing_items(_item_to_row(item) for item in batch)
+        stats["saved"] += len(batch)
+        stats["inserted"] += result["inserted"]
+        stats["updated"] += result["updated"]
+
+    # Запись идёт в вызывающем потоке, пока предыдущие этапы ещё работают.
+    # При ошибке записи очередь всё равно вычитывается, чтобы этапы не зависли.
+    batch = []
+    write_error = None
+    while True:
+        item = rows_queue.get()
+        if item is _DONE:
+            break
+        if write_error:
+            continue
+        print(
+            f"Name: {item.name}, Price: {item.price}, URL: {item.url}, Image: {item.image_url}, Category: {item.category}"
+        )
+        batch.append(item)
+        if len(batch) >= batch_size:
+            try:
+                flush(batch)
+            except Exception as e:
+                write_error = e
+            batch = []
+    if batch and not write_error:
+        try:
+            flush(batch)
+        except Exception as e:
+            write_error = e
+
+    for thread in threads:
+        thread.join()
+    if write_error:
+        raise write_error
+    print(
+        f"Конвейер: сохранено {stats['saved']}, пропущено {stats['skipped']}, "
+        f"картинок без изменений {stats['unchanged']} "
+        f"за {time.perf_counter() - started:.1f} с"
+    )
+    return stats
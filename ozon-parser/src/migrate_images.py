@@ -0,0 +1,105 @@
+"""
+Переносит картинки из clothing_items.image_blob (base64) в clothing_images.
+
+Байты картинки кладутся в clothing_images по sha256 (одинаковые картинки —
+одна запись), в строке товара остаётся image_hash, а image_blob обнуляется.
+После переноса база сжимается VACUUM.
+
+Запуск: python src/migrate_images.py path/to/ozon_clothing_items.db
+"""
+import argparse
+import base64
+import binascii
+import os
+import sys
+import time
+
+MIGRATE_CHUNK = 500
+
+
+def migrate(chunk_size=MIGRATE_CHUNK, vacuum=True):
+    from sqlalchemy import text
+
+    import db
+
+    started = time.perf_counter()
+    migrated = deduplicated = broken = 0
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, image_blob FROM clothing_items "
+                    "WHERE id > :last_id AND image_blob IS NOT NULL AND image_blob != '' "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": chunk_size},
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            images = {}
+            updates = []
+            for item_id, blob in rows:
+                try:
+                    data = base64.b64decode(blob, validate=True)
+                except (binascii.Error, ValueError):
+                    broken += 1  # оставляем как есть, чтобы не потерять данные
+                    continue
+                hash_ = db.image_hash(data)
+                if hash_ in images:
+                    deduplicated += 1
+                images[hash_] = data
+                updates.append({"id": item_id, "hash": hash_})
+
+            if not updates:
+                continue
+            before = conn.execute(text("SELECT COUNT(*) FROM clothing_images")).scalar()
+            conn.execute(
+                text(
+                    "INSERT OR IGNORE INTO clothing_images (hash, data, size) "
+                    "VALUES (:hash, :data, :size)"
+                ),
+                [{"hash": h, "data": d, "size": len(d)} for h, d in images.items()],
+            )
+            after = conn.execute(text("SELECT COUNT(*) FROM clothing_images")).scalar()
+            deduplicated += len(images) - (after - before)
+            conn.execute(
+                text(
+                    "UPDATE clothing_items SET image_hash = :hash, image_blob = NULL "
+                    "WHERE id = :id"
+                ),
+                updates,
+            )
+            migrated += len(updates)
+        print(f"Перенесено: {migrated}")
+
+    if vacuum:
+        # VACUUM нельзя выполнять внутри транзакции
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    print(
+        f"Готово: строк {migrated}, дублей картинок {deduplicated}, "
+        f"битых base64 {broken}, время {time.perf_counter() - started:.1f} с"
+    )
+    return {"migrated": migrated, "deduplicated": deduplicated, "broken": broken}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Перенос base64 image_blob в контентно-адресуемое хранилище"
+    )
+    arg_parser.add_argument("database", help="путь к ozon_clothing_items.db")
+    arg_parser.add_argument("--no-vacuum", action="store_true")
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.database):
+        sys.exit(f"Файл не найден: {args.database}")
+    size_before = os.path.getsize(args.database)
+    # db.py берёт путь к базе из окружения при импорте
+    os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    migrate(vacuum=not args.no_vacuum)
+    print(f"Размер файла: {size_before} -> {os.path.getsize(args.database)} байт")
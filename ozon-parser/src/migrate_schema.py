@@ -0,0 +1,210 @@
+"""
+Переводит базу каталога на текущую схему (см. ozon-fashion-app/catalog_schema.py):
+справочник categories, числовая цена price_value, ценовые корзины,
+счётчики фасетов category_facets и индексы под фильтры, плюс FTS-индекс
+и уникальный индекс по url.
+
+Базы без уникального индекса по url сначала чистятся от дублей: url
+приводятся к каноническому виду, из товаров с одним url остаётся самый
+свежий. Перед этим база копируется в <база>.before-dedupe, удалённые строки
+печатаются; db.py такую базу не откроет, пока дубли не убраны.
+
+Схема обновляется при импорте db парсера; приложение базу не мигрирует,
+для его базы нужен этот скрипт. Скрипт дополнительно определяет цвет
+товаров, сохранённых до появления фасетов (по картинке), собирает
+статистику для планировщика (ANALYZE) и показывает план запроса с фильтром
+по категории до и после перехода.
+
+Запуск: python src/migrate_schema.py path/to/ozon_clothing_items.db
+"""
+import argparse
+import base64
+import binascii
+import io
+import os
+import sqlite3
+import sys
+import time
+
+OLD_QUERY = "SELECT id FROM clothing_items WHERE category = 'Юбки женские' LIMIT 30"
+NEW_QUERY = (
+    "SELECT id FROM clothing_items WHERE category_id = 1 AND color = 'черный' "
+    "AND price_value BETWEEN 0 AND 3000 LIMIT 30"
+)
+# Сколько товаров обрабатывать за одну транзакцию при определении цвета
+COLOR_CHUNK = 200
+
+
+def _canonical_url(url):
+    # Как db.normalize_product_url: db импортировать нельзя, пока в базе дубли
+    return url.split("?", 1)[0].split("#", 1)[0] if url else url
+
+
+def _query_plan(path, query):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+    except sqlite3.OperationalError as e:
+        return f"недоступен ({e})"
+    finally:
+        conn.close()
+    return "; ".join(row[-1] for row in rows)
+
+
+def _dedupe_urls(path):
+    """
+    Приводит url к каноническому виду и удаляет дубли (остаётся запись с
+    наибольшим id), если уникального индекса по url ещё нет. Возвращает
+    число удалённых товаров.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        has_table, has_index = conn.execute(
+            "SELECT "
+            "EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' "
+            "AND name = 'clothing_items'), "
+            "EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'index' "
+            "AND name = 'ux_clothing_items_url')"
+        ).fetchone()
+        if not has_table or has_index:
+            return 0
+        rows = conn.execute(
+            "SELECT id, url, name FROM clothing_items ORDER BY id"
+        ).fetchall()
+        latest = {}
+        for item_id, url, _ in rows:
+            if url is not None:
+                latest[_canonical_url(url)] = item_id
+        removed = [
+            (item_id, url, name)
+            for item_id, url, name in rows
+            if url is not None and latest[_canonical_url(url)] != item_id
+        ]
+        renamed = [
+            (_canonical_url(url), item_id)
+            for item_id, url, _ in rows
+            if url != _canonical_url(url) and latest[_canonical_url(url)] == item_id
+        ]
+        if not removed and not renamed:
+            return 0
+
+        backup_path = f"{path}.before-dedupe"
+        backup = sqlite3.connect(backup_path)
+        try:
+            conn.backup(backup)
+        finally:
+            backup.close()
+        print(f"Копия базы до удаления дублей: {backup_path}")
+
+        with conn:
+            conn.executemany(
+                "DELETE FROM clothing_items WHERE id = ?",
+                [(item_id,) for item_id, _, _ in removed],
+            )
+            conn.executemany(
+                "UPDATE clothing_items SET url = ? WHERE id = ?", renamed
+            )
+        for item_id, url, name in removed:
+            print(
+                f"Удалён дубль {item_id} ({name}): {url} -> "
+                f"оставлен {latest[_canonical_url(url)]}"
+            )
+        print(
+            f"url приведено к каноническому виду: {len(renamed)}, "
+            f"удалено дублей: {len(removed)}"
+        )
+        return len(removed)
+    finally:
+        conn.close()
+
+
+def _backfill_colors(db):
+    """Определяет цвет товаров без color; счётчики фасетов обновят триггеры."""
+    from PIL import Image
+    from sqlalchemy import text
+
+    from utils.colors import dominant_color
+
+    last_id = done = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT clothing_items.id, clothing_images.data, "
+                    "clothing_items.image_blob FROM clothing_items "
+                    "LEFT JOIN clothing_images "
+                    "ON clothing_images.hash = clothing_items.image_hash "
+                    "WHERE clothing_items.color IS NULL AND clothing_items.id > :last_id "
+                    "ORDER BY clothing_items.id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": COLOR_CHUNK},
+            ).all()
+            if not rows:
+                break
+            colors = []
+            for item_id, data, blob in rows:
+                try:
+                    if data is None and blob:
+                        data = base64.b64decode(blob)
+                    if not data:
+                        continue
+                    with Image.open(io.BytesIO(data)) as img:
+                        colors.append({"id": item_id, "color": dominant_color(img)})
+                except (OSError, ValueError, binascii.Error) as e:
+                    print(f"Пропущен товар {item_id}: {e}")
+            if colors:
+                conn.execute(
+                    text("UPDATE clothing_items SET color = :color WHERE id = :id"),
+                    colors,
+                )
+            last_id = rows[-1][0]
+            done += len(colors)
+    return done
+
+
+def migrate(path):
+    print(f"План до:    {_query_plan(path, OLD_QUERY)}")
+    _dedupe_urls(path)
+    # db.py берёт путь к базе из окружения при импорте и там же обновляет схему
+    os.environ["OZON_DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+    started = time.perf_counter()
+    from sqlalchemy import text
+
+    import db
+
+    colored = _backfill_colors(db)
+    with db.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+        categories = conn.execute(text("SELECT COUNT(*) FROM categories")).scalar()
+        total, with_category, with_price, with_color = conn.execute(
+            text(
+                "SELECT COUNT(*), COUNT(category_id), COUNT(price_value), COUNT(color) "
+                "FROM clothing_items"
+            )
+        ).one()
+        facets = conn.execute(text("SELECT COUNT(*) FROM category_facets")).scalar()
+    # Переносим WAL в основной файл: базу можно копировать и коммитить одним файлом
+    with db.engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    db.engine.dispose()
+
+    print(f"План после: {_query_plan(path, NEW_QUERY)}")
+    print(
+        f"Готово: версия схемы {version}, категорий {categories}, товаров {total}, "
+        f"без категории {total - with_category}, без числовой цены {total - with_price}, "
+        f"цвет определён у {colored} (без цвета {total - with_color}), "
+        f"счётчиков фасетов {facets}, время {time.perf_counter() - started:.1f} с"
+    )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Переход базы каталога на текущую схему"
+    )
+    arg_parser.add_argument("database", help="путь к ozon_clothing_items.db")
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.database):
+        sys.exit(f"Файл не найден: {args.database}")
+    migrate(args.database)
@@ -1,15 +1,55 @@
+import argparse
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import undetected_chromedriver as uc
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from db import save_clothing_item
-from models.clothing_item import ClothingItem
+from db import mark_category_done, mark_category_started, start_crawl_run
+from ingest_pipeline import run_ingest_pipeline
+from utils.browser_pool import crawl_with_browser_pool
+from utils.ozon_scraper import BrowserRequired, fetch_category_pages
 
+# Параллельный обход категорий пулом браузеров
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "2"))
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", "10"))
+# browser — всё через Chrome; http — сначала без браузера, Chrome только как fallback
+CRAWL_BACKEND = os.getenv("CRAWL_BACKEND", "browser")
 
-def fetch_html(url, min_items=100):
+CATEGORY_LINKS = [
+    "https://www.ozon.ru/category/bryuki-zhenskie-7512/",
+    "https://www.ozon.ru/category/zhenskie-bluzy-i-rubashki-7511/",
+    "https://www.ozon.ru/category/zhakety-i-zhilety-zhenskie-7535/",
+    "https://www.ozon.ru/category/futbolki-i-topy-zhenskie-7505/",
+    "https://www.ozon.ru/category/yubki-zhenskie-7504/",
+]
+
+
+# Параметры бесконечной прокрутки
+MAX_SCROLLS = 50
+SCROLL_POLL_INTERVAL = 0.25  # как часто спрашивать браузер о числе плиток, с
+SCROLL_MIN_WAIT = 1.0  # нижняя граница ожидания новых плиток, с
+SCROLL_MAX_WAIT = 4.0  # верхняя граница ожидания новых плиток, с
+
+# Считаем плитки прямо в браузере, не вытягивая page_source
+COUNT_TILES_JS = "return document.querySelectorAll('div.tile-root').length;"
+
+
+def _wait_for_more_tiles(driver, last_count, max_wait):
+    """Опрашивает DOM, пока число плиток не вырастет или не истечёт max_wait."""
+    start = time.monotonic()
+    while True:
+        time.sleep(SCROLL_POLL_INTERVAL)
+        count = driver.execute_script(COUNT_TILES_JS)
+        waited = time.monotonic() - start
+        if count > last_count or waited >= max_wait:
+            return count, waited
+
+
+def create_driver():
     options = uc.ChromeOptions()
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-gpu")
@@ -20,129 +60,179 @@ def fetch_html(url, min_items=100):
         "Chrome/114.0.0.0 Safari/537.36"
     )
 
-    driver = uc.Chrome(options=options)
+    return uc.Chrome(options=options)
+
+
+def load_page(driver, url, min_items=100):
+    """Открывает страницу в готовом браузере и догружает товары прокруткой."""
     driver.get(url)
 
+    scrolls = 0
+    total_wait = 0.0
+    count = 0
     try:
         WebDriverWait(driver, 20).until(
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, '[data-widget="searchResultsV2"]')
             )
         )
-        last_count = 0
-        for _ in range(50):  # максимум 30 скроллов
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            # Проверяем, сколько товаров загружено
-            html = driver.page_source
-            soup = BeautifulSoup(html, "html.parser")
-            items = soup.select("div.tile-root")
-            if len(items) >= min_items:
+        last_count = driver.execute_script(COUNT_TILES_JS)
+        count = last_count
+        # Ожидание подстраивается под то, как быстро страница догружает товары
+        max_wait = SCROLL_MAX_WAIT
+        for _ in range(MAX_SCROLLS):
+            if count >= min_items:
                 break
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            scrolls += 1
+            count, waited = _wait_for_more_tiles(driver, last_count, max_wait)
+            total_wait += waited
             # Если больше не грузится — выходим
-            if len(items) == last_count:
+            if count == last_count:
                 break
-            last_count = len(items)
+            max_wait = min(SCROLL_MAX_WAIT, max(SCROLL_MIN_WAIT, 3 * waited))
+            last_count = count
     except Exception as e:
         print("Timeout or error while loading page:", e)
 
+    # HTML целиком забираем из браузера один раз, после прокрутки
+    extract_started = time.perf_counter()
     html = driver.page_source
-    driver.quit()
+    print(
+        f"Скроллов: {scrolls}, плиток: {count}, ожидание: {total_wait:.1f} с, "
+        f"извлечение HTML: {time.perf_counter() - extract_started:.2f} с "
+        f"({len(html) // 1024} КБ)"
+    )
     return html
 
 
-import base64
-import requests
-
-
-def download_image_as_base64(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return base64.b64encode(response.content).decode("utf-8")
-    except Exception as e:
-        print(f"Ошибка загрузки изображения: {e}")
-        return ""
-
-
-def parse_clothing_items(html):
-    soup = BeautifulSoup(html, "html.parser")
-    # Парсим категорию
-    category_tag = soup.select_one("h1.qb61_3_0-a1")
-    category = category_tag.text.strip() if category_tag else ""
-
-    items = []
-    for item in soup.select("div.tile-root"):
-        name_tag = item.select_one("span.tsBody500Medium")
-        price_tag = item.select_one("span.tsHeadline500Medium")
-        link_tag = item.select_one("a.tile-clickable-element")
-        img_tag = item.select_one("img")
-
-        if not price_tag:
-            price_tag = item.select_one("span.c35_3_1-a1.tsHeadline500Medium")
-
-        if name_tag and price_tag and link_tag and img_tag:
-            name = name_tag.text.strip()
-            price_str = (
-                price_tag.text.strip()
-                .replace("\u2009", "")
-                .replace("₽", "")
-                .replace(" ", "")
-            )
-            try:
-                price = float(price_str)
-            except ValueError:
-                print(f"Ошибка конвертации цены: {price_str}")
-                continue
-
-            url = "https://www.ozon.ru" + link_tag.get("href", "")
-            image_url = img_tag.get("src", "")
-            image_blob = download_image_as_base64(image_url)
-            if not image_blob:
-                print(f"Пропущено: нет изображения для {name} ({url})")
-                continue  # Пропустить товар, если картинка не скачалась
-
-            clothing_item = ClothingItem(name, price, "", url, image_url)
-            clothing_item.image_blob = image_blob
-            clothing_item.category = category
-            items.append(clothing_item)
-    return items
-
-
-def main():
+def save_page(html, incremental=False):
+    """Прогоняет страницу категории через потоковый конвейер. Возвращает число товаров."""
+    stats = run_ingest_pipeline(html, incremental=incremental)
+    print(
+        f"Добавлено: {stats['inserted']}, обновлено: {stats['updated']}, "
+        f"картинок без изменений: {stats['unchanged']}."
+    )
+    return stats["saved"]
+
+
+def crawl_over_http(links, handle_page, workers=CRAWL_WORKERS):
+    """
+    Обходит категории без браузера. Возвращает ссылки, которым нужен Selenium
+    (страница требует JavaScript или доступ ограничен).
+    """
+    fallback = []
+    fallback_lock = threading.Lock()
+
+    def crawl_category(url):
+        mark_category_started(url)
+        try:
+            pages = fetch_category_pages(url)
+        except BrowserRequired as e:
+            print(f"[http] {url}: нужен браузер ({e})")
+            pages = None
+        except Exception as e:
+            print(f"[http] {url}: ошибка загрузки, пробуем браузер ({e})")
+            pages = None
+        if pages is None:
+            with fallback_lock:
+                fallback.append(url)
+            return
+        print(f"[http] {url}: {len(pages)} страниц")
+        handle_page(url, pages)
+
+    def crawl_category_safely(url):
+        # Как в пуле браузеров: ошибка одной категории не прерывает обход,
+        # категория остаётся незавершённой и продолжится с --resume
+        try:
+            crawl_category(url)
+        except Exception as e:
+            print(f"[http] Ошибка обработки {url}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(crawl_category_safely, links))
+    return fallback
+
+
+def main(
+    workers=CRAWL_WORKERS,
+    recycle_after=BROWSER_RECYCLE_AFTER,
+    resume=False,
+    incremental=False,
+    backend=CRAWL_BACKEND,
+):
     print("Начинаем парсинг одежды с Ozon...")
-    links = [
-        "https://www.ozon.ru/category/bryuki-zhenskie-7512/",
-        "https://www.ozon.ru/category/zhenskie-bluzy-i-rubashki-7511/",
-        "https://www.ozon.ru/category/zhakety-i-zhilety-zhenskie-7535/",
-        "https://www.ozon.ru/category/futbolki-i-topy-zhenskie-7505/",
-        "https://www.ozon.ru/category/yubki-zhenskie-7504/",
-    ]
+    print(f"Движок: {backend}, воркеров: {workers}, перезапуск каждые {recycle_after} страниц")
+    started = time.perf_counter()
     total = 0
-    for url in links:
+    total_lock = threading.Lock()
+
+    links = start_crawl_run(CATEGORY_LINKS, resume=resume)
+    if len(links) < len(CATEGORY_LINKS):
+        print(f"Продолжаем прерванный обход: осталось {len(links)} категорий")
+
+    def load_category(driver, url):
+        mark_category_started(url)
+        return load_page(driver, url, min_items=100)
+
+    def handle_category(url, pages):
+        nonlocal total
         print(f"Парсим: {url}")
-        html = fetch_html(url, min_items=100)
-        if "Доступ ограничен" in html:
-            print("Доступ ограничен! Пропускаем ссылку.")
-            continue
-        clothing_items = parse_clothing_items(html)
-        print(f"Найдено {len(clothing_items)} товаров.")
-        total += len(clothing_items)
-        for item in clothing_items:
-            print(
-                f"Name: {item.name}, Price: {item.price}, URL: {item.url}, Image: {item.image_url}, Category: {item.category}"
-            )
-            save_clothing_item(
-                item.name,
-                item.price,
-                " ",
-                item.url,
-                item.image_url,
-                item.image_blob,
-                item.category,
-            )
+        saved = sum(save_page(html, incremental=incremental) for html in pages)
+        mark_category_done(url, saved)
+        with total_lock:
+            total += saved
+
+    if backend == "http":
+        links = crawl_over_http(links, handle_category, workers=workers)
+        if links:
+            print(f"Через браузер: {len(links)} категорий")
+
+    if links:
+        crawl_with_browser_pool(
+            links,
+            driver_factory=create_driver,
+            page_loader=load_category,
+            handle_page=lambda url, html: handle_category(url, [html]),
+            workers=workers,
+            recycle_after=recycle_after,
+        )
     print(f"Всего сохранено: {total} товаров.")
+    print(f"Время обхода: {time.perf_counter() - started:.1f} с")
 
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser(description="Парсер женской одежды с Ozon")
+    arg_parser.add_argument(
+        "--workers", type=int, default=CRAWL_WORKERS, help="число браузеров"
+    )
+    arg_parser.add_argument(
+        "--recycle-after",
+        type=int,
+        default=BROWSER_RECYCLE_AFTER,
+        help="перезапускать браузер после N страниц (0 — никогда)",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="пропустить категории, завершённые в прерванном запуске",
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="не скачивать заново картинки уже известных товаров",
+    )
+    arg_parser.add_argument(
+        "--backend",
+        choices=("browser", "http"),
+        default=CRAWL_BACKEND,
+        help="http — без браузера, Chrome только для страниц с JS или блокировкой",
+    )
+    args = arg_parser.parse_args()
+    main(
+        workers=args.workers,
+        recycle_after=args.recycle_after,
+        resume=args.resume,
+        incremental=args.incremental,
+        backend=args.backend,
+    )
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+BLOCKED_MARKER = "Доступ ограничен"
+
+# undetected_chromedriver патчит бинарник chromedriver при запуске —
+# одновременный старт нескольких браузеров из разных потоков ломает патч.
+_driver_start_lock = threading.Lock()
+
+
+class BrowserWorker:
+    """Один переиспользуемый браузер, который перезапускается после N страниц или блокировки."""
+
+    def __init__(self, name, driver_factory, recycle_after):
+        self.name = name
+        self.driver_factory = driver_factory
+        self.recycle_after = recycle_after
+        self.driver = None
+        self.pages_loaded = 0
+
+    def get_driver(self):
+        if self.driver is None:
+            with _driver_start_lock:
+                self.driver = self.driver_factory()
+            self.pages_loaded = 0
+        return self.driver
+
+    def page_done(self, blocked=False):
+        self.pages_loaded += 1
+        if blocked:
+            print(f"[{self.name}] {BLOCKED_MARKER} — перезапускаю браузер.")
+            self.recycle()
+        elif self.recycle_after and self.pages_loaded >= self.recycle_after:
+            print(f"[{self.name}] {self.pages_loaded} страниц — перезапускаю браузер.")
+            self.recycle()
+
+    def recycle(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"[{self.name}] Ошибка при закрытии браузера: {e}")
+            self.driver = None
+
+
+def crawl_with_browser_pool(
+    urls,
+    driver_factory,
+    page_loader,
+    handle_page,
+    workers=2,
+    recycle_after=10,
+    retries_on_block=1,
+):
+    """
+    Раскидывает URL по пулу браузеров.
+
+    driver_factory() создаёт драйвер, page_loader(driver, url) возвращает HTML,
+    handle_page(url, html) обрабатывает страницу (вызывается в потоке воркера).
+    Заблокированная страница повторяется на свежем браузере до retries_on_block раз.
+    """
+    tasks = queue.Queue()
+    for url in urls:
+        tasks.put((url, 0))
+
+    def run(worker):
+        try:
+            while True:
+                try:
+                    url, attempt = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                started = time.perf_counter()
+                try:
+                    html = page_loader(worker.get_driver(), url)
+                except Exception as e:
+                    print(f"[{worker.name}] Ошибка загрузки {url}: {e}")
+                    worker.recycle()
+                    continue
+
+                blocked = BLOCKED_MARKER in html
+                worker.page_done(blocked=blocked)
+                print(f"[{worker.name}] {url}: {time.perf_counter() - started:.1f} с")
+                if blocked:
+                    if attempt < retries_on_block:
+                        tasks.put((url, attempt + 1))
+                    else:
+                        print(f"[{worker.name}] Доступ ограничен! Пропускаем ссылку.")
+                    continue
+
+                try:
+                    handle_page(url, html)
+                except Exception as e:
+                    print(f"[{worker.name}] Ошибка обработки {url}: {e}")
+        finally:
+            worker.recycle()
+
+    pool = [
+        BrowserWorker(f"browser-{i + 1}", driver_factory, recycle_after)
+        for i in range(max(1, min(workers, len(urls))))
+    ]
+    threads = [threading.Thread(target=run, args=(w,), name=w.name) for w in pool]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
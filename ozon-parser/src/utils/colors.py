@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+# Палитра для фильтра по цвету: название -> опорный RGB.
+# Названия без «ё» — так же их нормализует разбор запроса в приложении.
+PALETTE = {
+    "черный": (25, 25, 25),
+    "белый": (240, 240, 240),
+    "серый": (128, 128, 128),
+    "бежевый": (215, 195, 160),
+    "коричневый": (115, 70, 40),
+    "красный": (190, 30, 40),
+    "розовый": (235, 150, 180),
+    "оранжевый": (235, 125, 35),
+    "желтый": (235, 215, 70),
+    "зеленый": (55, 130, 65),
+    "голубой": (125, 180, 225),
+    "синий": (35, 55, 140),
+    "фиолетовый": (115, 60, 150),
+}
+
+# Картинка уменьшается до COLOR_SAMPLE_SIDE^2 пикселей — этого хватает для цвета
+COLOR_SAMPLE_SIDE = int(os.getenv("COLOR_SAMPLE_SIDE", "48"))
+# Насколько пиксель должен отличаться от фона (сумма |dR|+|dG|+|dB|)
+BACKGROUND_TOLERANCE = 60
+
+_NAMES = list(PALETTE)
+_PALETTE_RGB = np.array([PALETTE[name] for name in _NAMES], dtype=np.int32)
+# Глаз чувствительнее к зелёному — взвешиваем каналы при сравнении с палитрой
+_CHANNEL_WEIGHTS = np.array([2, 4, 3], dtype=np.int32)
+
+
+def dominant_color(img):
+    """
+    Преобладающий цвет товара на картинке PIL — название из PALETTE.
+
+    Фон оценивается по медиане пикселей рамки и отбрасывается; оставшиеся
+    пиксели квантуются к ближайшему цвету палитры, побеждает самый частый.
+    """
+    small = img.convert("RGB").resize(
+        (COLOR_SAMPLE_SIDE, COLOR_SAMPLE_SIDE), Image.BILINEAR
+    )
+    pixels = np.asarray(small, dtype=np.int32)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+
+    pixels = pixels.reshape(-1, 3)
+    foreground = np.abs(pixels - background).sum(axis=1) > BACKGROUND_TOLERANCE
+    if foreground.mean() > 0.05:
+        # Иначе товар того же цвета, что и фон, — считаем по всей картинке
+        pixels = pixels[foreground]
+
+    diff = pixels[:, None, :] - _PALETTE_RGB[None, :, :]
+    distances = (diff * diff * _CHANNEL_WEIGHTS).sum(axis=2)
+    counts = np.bincount(distances.argmin(axis=1), minlength=len(_NAMES))
+    return _NAMES[int(counts.argmax())]
@@ -0,0 +1,93 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Параметры загрузки картинок (можно переопределить через переменные окружения)
+PER_HOST_CONCURRENCY = int(os.getenv("IMAGE_PER_HOST_CONCURRENCY", "8"))
+CONNECT_TIMEOUT = float(os.getenv("IMAGE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("IMAGE_READ_TIMEOUT", "15"))
+MAX_RETRIES = int(os.getenv("IMAGE_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("IMAGE_RETRY_BACKOFF", "0.5"))
+MAX_IMAGE_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+_CHUNK_SIZE = 64 * 1024
+
+_thread_local = threading.local()
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+class ImageTooLargeError(Exception):
+    pass
+
+
+def _get_session():
+    """requests.Session на поток: keep-alive соединения переиспользуются между загрузками."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=PER_HOST_CONCURRENCY,
+            pool_maxsize=PER_HOST_CONCURRENCY,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+
+def _host_semaphore(url):
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(PER_HOST_CONCURRENCY)
+            _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def fetch_image(url, etag=None, last_modified=None, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Скачивает картинку потоково, обрывая загрузку после max_bytes.
+
+    С etag/last_modified делает условный запрос. Возвращает
+    (bytes или None, если картинка не изменилась (304), etag, last_modified).
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    with _host_semaphore(url):
+        with _get_session().get(
+            url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        ) as response:
+            if response.status_code == 304:
+                return None, etag, last_modified
+            response.raise_for_status()
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise ImageTooLargeError(f"{declared} байт > {max_bytes}")
+
+            buffer = bytearray()
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise ImageTooLargeError(f"больше {max_bytes} байт")
+            return (
+                bytes(buffer),
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+
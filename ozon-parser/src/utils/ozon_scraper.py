@@ -1,26 +1,102 @@
-def fetch_html(url):
-    import requests
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Лёгкий движок без браузера: обычные HTTP-запросы к страницам категорий.
+# Если страница требует JavaScript или заблокирована — её нужно отдать Selenium.
+HTTP_PAGES_PER_CATEGORY = int(os.getenv("HTTP_PAGES_PER_CATEGORY", "5"))
+HTTP_PAGE_WORKERS = int(os.getenv("HTTP_PAGE_WORKERS", "4"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+
+BLOCKED_MARKER = "Доступ ограничен"
+TILE_MARKER = "tile-root"
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/114.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9",
+}
+
+_thread_local = threading.local()
+
+
+class BrowserRequired(Exception):
+    """Страницу нельзя получить без браузера (нужен JS или доступ ограничен)."""
 
-    response = requests.get(url)
+
+def _get_session():
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        retry = Retry(
+            total=2,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_PAGE_WORKERS,
+            pool_maxsize=HTTP_PAGE_WORKERS,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+
+def page_url(url, page):
+    """URL n-й страницы выдачи категории (?page=n)."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "page"]
+    if page > 1:
+        query.append(("page", str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def needs_browser(html):
+    return BLOCKED_MARKER in html or TILE_MARKER not in html
+
+
+def fetch_html(url):
+    response = _get_session().get(url, timeout=HTTP_TIMEOUT)
+    if response.status_code in (403, 429):
+        raise BrowserRequired(f"HTTP {response.status_code}")
     response.raise_for_status()  # Raise an error for bad responses
-    return response.text
+    html = response.text
+    if needs_browser(html):
+        raise BrowserRequired("нет товаров в HTML или доступ ограничен")
+    return html
 
-def parse_clothing_items(html):
-    from bs4 import BeautifulSoup
 
-    soup = BeautifulSoup(html, 'html.parser')
-    items = []
+def fetch_category_pages(url, pages=HTTP_PAGES_PER_CATEGORY, workers=HTTP_PAGE_WORKERS):
+    """
+    Параллельно скачивает страницы 1..pages категории.
 
-    # Example parsing logic (this will need to be adjusted based on actual HTML structure)
-    for item in soup.select('.clothing-item'):
-        name = item.select_one('.item-name').get_text(strip=True)
-        price = item.select_one('.item-price').get_text(strip=True)
-        description = item.select_one('.item-description').get_text(strip=True)
+    Если первая страница требует браузер — пробрасывает BrowserRequired.
+    Последующие страницы без товаров просто отбрасываются (выдача кончилась).
+    """
+    first = fetch_html(page_url(url, 1))
+    if pages <= 1:
+        return [first]
 
-        items.append({
-            'name': name,
-            'price': price,
-            'description': description
-        })
+    def fetch_optional(page):
+        try:
+            return fetch_html(page_url(url, page))
+        except Exception as e:
+            print(f"Страница {page} ({url}) пропущена: {e}")
+            return None
 
-    return items
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        rest = list(pool.map(fetch_optional, range(2, pages + 1)))
+    return [first] + [html for html in rest if html]
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+# Сетка 16x16 -> 256 бит. Классические 64 бита (8x8) на студийных фото
+# с одинаковым фоном и позой путают разные товары одной модели
+HASH_SIDE = 16
+HASH_BITS = HASH_SIDE * HASH_SIDE
+# Картинки, dHash которых отличается не больше чем на столько бит, считаются
+# одной фотографией (пересжатие, уменьшение, шаблон продавца для разных цветов)
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "20"))
+
+
+def dhash(img):
+    """
+    Разностный хэш картинки PIL (int, HASH_BITS бит): яркость 17x16, бит —
+    «пиксель светлее соседа справа». Устойчив к масштабу, сжатию и яркости.
+    """
+    small = img.convert("L").resize((HASH_SIDE + 1, HASH_SIDE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_db(value):
+    """Хэш -> байты для BLOB-колонки clothing_items.dhash."""
+    return value.to_bytes(HASH_BITS // 8, "big")
+
+
+def from_db(value):
+    return int.from_bytes(value, "big")
+
+
+if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+
+    def _popcount_rows(bits):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+
+    def _popcount_rows(bits):
+        return _POPCOUNT[bits.view(np.uint8)].sum(axis=1)
+
+
+def _words(value):
+    return np.frombuffer(to_db(value), dtype=np.uint64)
+
+
+class HammingIndex:
+    """
+    Поиск хэшей на расстоянии Хэмминга не больше max_distance
+    (multi-index hashing). Хэш режется на max_distance + 1 кусков, и по
+    принципу Дирихле у близкого хэша хотя бы один кусок совпадает точно:
+    кандидаты берутся из словарей по кускам, а расстояния до них считаются
+    разом на NumPy по матрице хэшей (64-битные слова).
+    """
+
+    def __init__(self, max_distance=DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        parts = max_distance + 1
+        bounds = [HASH_BITS * i // parts for i in range(parts + 1)]
+        self._chunks = [
+            (lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])
+        ]
+        self._tables = [{} for _ in self._chunks]
+        self._rows = {}  # ключ -> строка матрицы
+        self._keys = []  # строка -> ключ (None, если удалён)
+        self._values = []
+        self._matrix = np.zeros((1024, HASH_BITS // 64), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def get(self, key):
+        row = self._rows.get(key)
+        return None if row is None else self._values[row]
+
+    def add(self, key, value):
+        self.remove(key)
+        row = len(self._keys)
+        if row == len(self._matrix):
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[row] = _words(value)
+        self._rows[key] = row
+        self._keys.append(key)
+        self._values.append(value)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, []).append(row)
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        value = self._values[row]
+        self._keys[row] = None
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table[(value >> shift) & mask].remove(row)
+
+    def nearest(self, value):
+        """(ключ, расстояние) ближайшего хэша в пределах max_distance или None."""
+        candidates = []
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            rows = table.get((value >> shift) & mask)
+            if rows:
+                candidates.extend(rows)
+        if not candidates:
+            return None
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = _popcount_rows(self._matrix[rows] ^ _words(value))
+        best = int(distances.argmin())
+        if distances[best] > self.max_distance:
+            return None
+        return self._keys[rows[best]], int(distances[best])
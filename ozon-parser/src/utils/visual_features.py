@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Вектор сравнивается с фото пользователя в приложении, поэтому функция
+# общая с ним (ozon-fashion-app/visual_features.py), как и схема базы в db.py
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "ozon-fashion-app"
+    )
+)
+from visual_features import features_to_bytes, image_features  # noqa: E402,F401